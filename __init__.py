@@ -0,0 +1,6 @@
+"""Reference optimizers and their tooling.
+
+The modules import each other relatively (``from .utils import ...``), so they must be imported as a package, e.g.
+``python -m <package>.optimizer_registry`` from the parent directory. Only ``generate_schema.py`` also runs as a plain
+script. Nothing is imported here, importing the package stays free of torch.
+"""
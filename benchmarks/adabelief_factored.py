@@ -0,0 +1,36 @@
+"""Memory and step time of AdaBelief with the full vs. the factored belief variance."""
+
+import torch
+
+from ..optimizer_memory import estimate_state_bytes
+from ..ref_opt_adabelief import AdaBelief
+from .common import DEFAULT_SHAPES, base_parser, format_mib, make_grads, make_params, print_table, state_bytes, time_steps
+
+CONFIGS = [
+    ('full', {}),
+    ('factored', {'factored': True}),
+    ('full + ams_bound', {'ams_bound': True}),
+    ('factored + ams_bound', {'factored': True, 'ams_bound': True}),
+]
+
+
+def main():
+    args = base_parser(__doc__).parse_args()
+    dtype = getattr(torch, args.dtype)
+
+    rows = []
+    for name, kwargs in CONFIGS:
+        params = make_params(DEFAULT_SHAPES, dtype, args.device)
+        grads = make_grads(params)
+        optimizer = AdaBelief(params, lr=1e-4, **kwargs)
+
+        ms = time_steps(optimizer, params, grads, args.steps, args.warmup)
+        estimate = estimate_state_bytes('AdaBelief', kwargs, DEFAULT_SHAPES, dtype=args.dtype)
+        rows.append((name, format_mib(state_bytes(optimizer)), format_mib(estimate), f"{ms:.2f}"))
+
+    print(f"AdaBelief on {args.device}, {args.dtype}, {sum(torch.Size(s).numel() for s in DEFAULT_SHAPES):,} params")
+    print_table(('config', 'state', 'estimated', 'ms/step'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Training-loop stall of synchronous vs. asynchronous optimizer state checkpoints."""
+
+import os
+import tempfile
+import time
+
+import torch
+
+from ..optimizer_checkpoint import AsyncCheckpointer
+from ..ref_opt_adabelief import AdaBelief
+from .common import DEFAULT_SHAPES, base_parser, format_mib, make_grads, make_params, print_table, state_bytes, synchronize
+
+
+def run(mode: str, args, directory: str):
+    dtype = getattr(torch, args.dtype)
+    params = make_params(DEFAULT_SHAPES, dtype, args.device)
+    grads = make_grads(params)
+    optimizer = AdaBelief(params, lr=1e-4)
+    checkpointer = AsyncCheckpointer(optimizer, max_in_flight=args.max_in_flight) if mode == 'async' else None
+
+    for p, g in zip(params, grads):
+        p.grad = g
+    optimizer.step()
+
+    stalls = []
+    start = time.perf_counter()
+    for step in range(1, args.steps + 1):
+        optimizer.step()
+        if mode != 'none' and step % args.save_every == 0:
+            synchronize(args.device)
+            save_start = time.perf_counter()
+            path = os.path.join(directory, f"{mode}-{step}.pt")
+            if checkpointer is not None:
+                checkpointer.save(path, extra={'step': step})
+            else:
+                torch.save(optimizer.state_dict(), path)
+            stalls.append(time.perf_counter() - save_start)
+    synchronize(args.device)
+    loop_seconds = time.perf_counter() - start
+
+    if checkpointer is not None:
+        checkpointer.close()
+
+    max_stall = max(stalls) * 1000 if stalls else 0.0
+    mean_stall = sum(stalls) / len(stalls) * 1000 if stalls else 0.0
+    return mode, format_mib(state_bytes(optimizer)), f"{loop_seconds * 1000 / args.steps:.2f}", f"{mean_stall:.1f}", f"{max_stall:.1f}"
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--save-every', type=int, default=5)
+    parser.add_argument('--max-in-flight', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        rows = [run(mode, args, directory) for mode in ('none', 'sync', 'async')]
+
+    print(f"AdaBelief on {args.device}, {args.dtype}, save every {args.save_every} steps, {args.steps} steps")
+    print_table(('mode', 'state', 'ms/step', 'mean stall ms', 'max stall ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Memory, step time and accuracy of 16-bit params updated with stochastic rounding, Kahan summation or fp32 masters.
+
+Step time and memory (weights plus optimizer state) are measured on a transformer block with fixed gradients. Accuracy
+comes from fitting a 16-bit student MLP to a random teacher: the final loss, and how far the student's weights ended up
+from the fp32 master run, relative to how far that run moved them.
+"""
+
+import torch
+
+from ..optimizer_registry import create_optimizer
+from .common import (
+    DEFAULT_SHAPES, base_parser, format_mib, make_grads, make_params, mlp, print_table, relative_error, state_bytes,
+    time_steps,
+)
+
+MODES = ('fp32 master', 'stochastic', 'kahan')
+
+
+class MasterWeights:
+    r"""Keep fp32 copies of 16-bit params: the optimizer steps the copies, which are then rounded into the params."""
+
+    def __init__(self, params, make_optimizer):
+        self.params = list(params)
+        self.masters = [p.detach().float().requires_grad_() for p in self.params]
+        self.optimizer = make_optimizer(self.masters)
+
+    @torch.no_grad()
+    def step(self):
+        for p, master in zip(self.params, self.masters):
+            master.grad = p.grad.float()
+        self.optimizer.step()
+        for p, master in zip(self.params, self.masters):
+            p.copy_(master)
+
+    def zero_grad(self, set_to_none: bool = True):
+        for p in self.params:
+            p.grad = None
+
+
+def make_optimizer(optimizer_id: str, mode: str, params, args):
+    kwargs = {'lr': args.lr}
+    if optimizer_id == 'OCGOpt':
+        kwargs['spectral_clip_compile'] = args.compile
+    if mode == 'fp32 master':
+        return MasterWeights(params, lambda masters: create_optimizer(optimizer_id, masters, **kwargs))
+    return create_optimizer(optimizer_id, params, bf16_mode=mode, **kwargs)
+
+
+def memory_bytes(optimizer, params) -> int:
+    r"""Bytes of the weights the training loop keeps, plus the optimizer state."""
+    total = sum(p.numel() * p.element_size() for p in params)
+    if isinstance(optimizer, MasterWeights):
+        total += sum(m.numel() * m.element_size() for m in optimizer.masters)
+        optimizer = optimizer.optimizer
+    return total + state_bytes(optimizer)
+
+
+def fit_teacher(optimizer_id: str, mode: str, args, dtype):
+    r"""Train a 16-bit student on a fixed data stream. Returns the loss over the last tenth of the steps and the weights."""
+    teacher = mlp(args.quality_width, 3, seed=0).to(args.device)
+    student = mlp(args.quality_width, 3, seed=1).to(device=args.device, dtype=dtype)
+    optimizer = make_optimizer(optimizer_id, mode, list(student.parameters()), args)
+
+    generator = torch.Generator().manual_seed(2)
+    losses = []
+    for _ in range(args.quality_steps):
+        x = torch.randn(256, args.quality_width, generator=generator).to(args.device)
+        with torch.no_grad():
+            target = teacher(x)
+        loss = torch.nn.functional.mse_loss(student(x.to(dtype)).float(), target)
+        optimizer.zero_grad(set_to_none=True)
+        loss.backward()
+        optimizer.step()
+        losses.append(loss.item())
+
+    tail = losses[-max(1, len(losses) // 10):]
+    return sum(tail) / len(tail), [p.detach().float() for p in student.parameters()]
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.set_defaults(dtype='bfloat16')
+    parser.add_argument('--optimizers', nargs='+', default=['AdaBelief', 'CAME', 'OCGOpt'])
+    parser.add_argument('--lr', type=float, default=1e-4)
+    parser.add_argument('--quality-width', type=int, default=128)
+    parser.add_argument('--quality-steps', type=int, default=500)
+    parser.add_argument('--compile', action='store_true', help="Compile OCGOpt's Newton-Schulz iteration")
+    args = parser.parse_args()
+    dtype = getattr(torch, args.dtype)
+    if dtype == torch.float32:
+        parser.error("--dtype must be a 16-bit dtype")
+
+    initial = [p.detach().float() for p in mlp(args.quality_width, 3, seed=1).parameters()]
+
+    rows = []
+    for optimizer_id in args.optimizers:
+        reference = None
+        for mode in MODES:
+            params = make_params(DEFAULT_SHAPES, dtype, args.device)
+            optimizer = make_optimizer(optimizer_id, mode, params, args)
+            ms = time_steps(optimizer, params, make_grads(params), args.steps, args.warmup)
+
+            loss, weights = fit_teacher(optimizer_id, mode, args, dtype)
+            if reference is None:
+                reference, error = weights, '-'
+            else:
+                error = f"{relative_error(weights, reference, initial):.2e}"
+
+            rows.append((
+                optimizer_id, mode, format_mib(memory_bytes(optimizer, params)), f"{ms:.2f}", f"{loss:.4e}", error
+            ))
+
+    print(f"Step time and memory on a transformer block ({sum(torch.Size(s).numel() for s in DEFAULT_SHAPES):,} params), "
+          f"{args.device}, {args.dtype}, lr {args.lr}; accuracy of a width-{args.quality_width} MLP after "
+          f"{args.quality_steps} steps")
+    print_table(('optimizer', 'mode', 'weights + state', 'ms/step', 'final loss', 'error vs fp32'), rows)
+
+
+if __name__ == '__main__':
+    main()
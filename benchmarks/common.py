@@ -0,0 +1,97 @@
+"""Shared helpers for the optimizer benchmarks.
+
+Benchmarks import the reference optimizers relatively, so run them as modules of the package, e.g.
+``python -m <package>.benchmarks.adabelief_factored``.
+"""
+
+import argparse
+import time
+
+import torch
+
+# A small transformer block: attention and MLP weights, their biases and a norm
+DEFAULT_SHAPES = [(1024, 1024)] * 4 + [(4096, 1024), (1024, 4096)] + [(1024,)] * 6 + [(4096,)]
+
+
+def base_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--device', default='cuda' if torch.cuda.is_available() else 'cpu')
+    parser.add_argument('--dtype', default='float32', choices=['float32', 'bfloat16', 'float16'])
+    parser.add_argument('--steps', type=int, default=20, help="Timed steps per configuration")
+    parser.add_argument('--warmup', type=int, default=3, help="Untimed steps before timing")
+    return parser
+
+
+def make_params(shapes, dtype, device, seed: int = 0):
+    generator = torch.Generator().manual_seed(seed)
+    return [
+        torch.randn(shape, generator=generator).div_(shape[-1] ** 0.5).to(device=device, dtype=dtype).requires_grad_()
+        for shape in shapes
+    ]
+
+
+def make_grads(params, seed: int = 1):
+    generator = torch.Generator().manual_seed(seed)
+    return [torch.randn(p.shape, generator=generator).to(device=p.device, dtype=p.dtype) for p in params]
+
+
+def mlp(width: int, depth: int, seed: int):
+    r"""A GELU MLP of depth square layers, with seeded random weights and zero biases."""
+    generator = torch.Generator().manual_seed(seed)
+    layers = []
+    for _ in range(depth):
+        layer = torch.nn.Linear(width, width)
+        with torch.no_grad():
+            layer.weight.copy_(torch.randn(layer.weight.shape, generator=generator) / width ** 0.5)
+            layer.bias.zero_()
+        layers += [layer, torch.nn.GELU()]
+    return torch.nn.Sequential(*layers[:-1])
+
+
+def relative_error(weights, reference, initial) -> float:
+    r"""Distance of weights from reference, relative to the distance reference moved from initial."""
+    error = sum((w - r).pow(2).sum() for w, r in zip(weights, reference))
+    moved = sum((r - i).pow(2).sum() for r, i in zip(reference, initial))
+    return (error / moved).sqrt().item()
+
+
+def synchronize(device):
+    if torch.device(device).type == 'cuda':
+        torch.cuda.synchronize(device)
+
+
+def state_bytes(optimizer) -> int:
+    r"""Bytes of optimizer state, counting storages shared by several views (flat_state) once."""
+    storages = {}
+    for state in optimizer.state.values():
+        for value in state.values():
+            if isinstance(value, torch.Tensor):
+                storage = value.untyped_storage()
+                storages[storage.data_ptr()] = storage.nbytes()
+    return sum(storages.values())
+
+
+def time_steps(optimizer, params, grads, steps: int, warmup: int) -> float:
+    r"""Average milliseconds per optimizer step, with fixed gradients so only the optimizer is measured."""
+    for p, g in zip(params, grads):
+        p.grad = g
+
+    for _ in range(warmup):
+        optimizer.step()
+    synchronize(params[0].device)
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        optimizer.step()
+    synchronize(params[0].device)
+    return (time.perf_counter() - start) * 1000 / steps
+
+
+def format_mib(num_bytes: int) -> str:
+    return f"{num_bytes / 2 ** 20:.1f} MiB"
+
+
+def print_table(header, rows):
+    widths = [max(len(str(row[i])) for row in [header] + rows) for i in range(len(header))]
+    for row in [header] + rows:
+        print("  ".join(str(cell).rjust(width) for cell, width in zip(row, widths)))
@@ -0,0 +1,82 @@
+"""Iteration time and final loss of synchronous vs. one-step-delayed optimizer steps (DelayedStep).
+
+A student MLP is fitted to a random teacher. With 'delayed' each optimizer step runs on a background thread while the
+next forward and backward pass proceeds, and its update reaches the params one step late. The table shows the time
+per iteration, the mean background step and barrier wait, the fraction of step time that was hidden, and the loss
+over the last tenth of the iterations. On CPU the step and the forward pass share cores, so expect less overlap.
+"""
+
+import time
+
+import torch
+
+from ..optimizer_delayed import DelayedStep
+from ..optimizer_registry import create_optimizer
+from .common import base_parser, mlp, print_table, synchronize
+
+MODES = ('sync', 'delayed')
+
+
+def run(optimizer_id: str, mode: str, args):
+    teacher = mlp(args.width, args.depth, seed=0).to(args.device)
+    student = mlp(args.width, args.depth, seed=1).to(args.device)
+    kwargs = {'lr': args.lr}
+    if optimizer_id == 'OCGOpt':
+        kwargs['spectral_clip_compile'] = args.compile
+    optimizer = create_optimizer(optimizer_id, list(student.parameters()), **kwargs)
+    delayed = DelayedStep(optimizer) if mode == 'delayed' else None
+
+    generator = torch.Generator().manual_seed(2)
+    batches = [torch.randn(args.batch, args.width, generator=generator) for _ in range(8)]
+    losses = []
+    for step in range(args.warmup + args.steps):
+        if step == args.warmup:
+            synchronize(args.device)
+            start = time.perf_counter()
+        x = batches[step % len(batches)].to(args.device)
+        with torch.no_grad():
+            target = teacher(x)
+        loss = torch.nn.functional.mse_loss(student(x), target)
+        loss.backward()
+        if delayed is not None:
+            delayed.step()
+            delayed.zero_grad()
+        else:
+            optimizer.step()
+            optimizer.zero_grad(set_to_none=True)
+        losses.append(loss.item())
+    if delayed is not None:
+        delayed.close()
+    synchronize(args.device)
+    ms = (time.perf_counter() - start) * 1000 / args.steps
+
+    tail = losses[-max(1, len(losses) // 10):]
+    row = [optimizer_id, mode, f"{ms:.2f}"]
+    if delayed is None:
+        return row + ['-', '-', '-', f"{sum(tail) / len(tail):.4e}"]
+    step_ms = sum(delayed.step_times[args.warmup:]) * 1000 / args.steps
+    wait_ms = sum(delayed.waits[args.warmup:]) * 1000 / args.steps
+    overlap = 1.0 - min(wait_ms / step_ms, 1.0)
+    return row + [f"{step_ms:.2f}", f"{wait_ms:.2f}", f"{overlap:.0%}", f"{sum(tail) / len(tail):.4e}"]
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.set_defaults(steps=50)
+    parser.add_argument('--optimizers', nargs='+', default=['AdaBelief', 'OCGOpt'])
+    parser.add_argument('--width', type=int, default=1024)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--batch', type=int, default=512)
+    parser.add_argument('--lr', type=float, default=1e-3)
+    parser.add_argument('--compile', action='store_true', help="Compile OCGOpt's Newton-Schulz iteration")
+    args = parser.parse_args()
+
+    rows = [run(optimizer_id, mode, args) for optimizer_id in args.optimizers for mode in MODES]
+
+    print(f"Width-{args.width} depth-{args.depth} MLP, batch {args.batch}, {args.device}, {args.steps} iterations "
+          f"after {args.warmup} warmup")
+    print_table(('optimizer', 'mode', 'ms/iter', 'step ms', 'wait ms', 'overlap', 'final loss'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Step time of K optimizer configurations as one batched SweepOptimizer vs. K separate optimizers."""
+
+import time
+
+import torch
+
+from ..optimizer_registry import create_optimizer
+from ..optimizer_sweep import SweepOptimizer
+from .common import DEFAULT_SHAPES, base_parser, make_grads, make_params, print_table, synchronize, time_steps
+
+# Rank-16 LoRA adapters (down and up projection) for the weight matrices of the default transformer block
+LORA_SHAPES = [shape for out, inp in (s for s in DEFAULT_SHAPES if len(s) == 2) for shape in ((16, inp), (out, 16))]
+
+CONFIGS = {
+    'AdaBelief': lambda i: {'lr': 1e-4 * (i + 1), 'cautious': i % 2 == 1},
+    'CAME': lambda i: {'lr': 1e-4 * (i + 1), 'update_strategy': ('unmodified', 'cautious', 'grams')[i % 3]},
+    'OCGOpt': lambda i: {'lr': 1e-4 * (i + 1), 'cautious_min': 0.1 * (i % 5)},
+}
+COMMON = {'OCGOpt': {'spectral_clip_compile': False}}
+
+
+def time_sweep(sweep: SweepOptimizer, grads, steps: int, warmup: int) -> float:
+    for replica, grad in zip(sweep.replicas, grads):
+        replica.grad = grad.unsqueeze(0).repeat(len(sweep), *([1] * grad.ndim))
+
+    for _ in range(warmup):
+        sweep.step()
+    synchronize(sweep.replicas[0].device)
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        sweep.step()
+    synchronize(sweep.replicas[0].device)
+    return (time.perf_counter() - start) * 1000 / steps
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--replicas', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--optimizers', nargs='+', default=list(CONFIGS))
+    args = parser.parse_args()
+    dtype = getattr(torch, args.dtype)
+
+    rows = []
+    for optimizer_id in args.optimizers:
+        common = COMMON.get(optimizer_id, {})
+        for k in args.replicas:
+            configs = [CONFIGS[optimizer_id](i) for i in range(k)]
+
+            separate_ms = 0.0
+            for config in configs:
+                params = make_params(LORA_SHAPES, dtype, args.device)
+                optimizer = create_optimizer(optimizer_id, params, **common, **config)
+                separate_ms += time_steps(optimizer, params, make_grads(params), args.steps, args.warmup)
+
+            params = make_params(LORA_SHAPES, dtype, args.device)
+            sweep = SweepOptimizer([(str(i), p) for i, p in enumerate(params)], optimizer_id, configs, **common)
+            sweep_ms = time_sweep(sweep, make_grads(params), args.steps, args.warmup)
+
+            rows.append((optimizer_id, k, f"{separate_ms:.2f}", f"{sweep_ms:.2f}", f"{separate_ms / sweep_ms:.2f}x"))
+
+    print(f"{sum(torch.Size(s).numel() for s in LORA_SHAPES):,} LoRA params per replica on {args.device}, {args.dtype}")
+    print_table(('optimizer', 'configs', 'separate ms', 'sweep ms', 'speedup'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Optimizer step time over a converging run, with and without LayerFreezer.
+
+A student MLP is fit to a random teacher while the learning rate decays linearly to a small fraction of its start.
+The run is split into phases; for each phase the table shows the average optimizer step time and the fraction of
+parameter elements that were frozen at its end, plus the final loss of both runs.
+"""
+
+import time
+
+import torch
+
+from ..optimizer_freezing import LayerFreezer
+from ..optimizer_registry import create_optimizer
+from .common import base_parser, mlp, print_table, synchronize
+
+
+def train(optimizer_id: str, args, freeze: bool):
+    r"""Returns the optimizer milliseconds and frozen fraction per phase, and the loss over the last tenth of the steps."""
+    teacher = mlp(args.width, args.depth, seed=0).to(args.device)
+    student = mlp(args.width, args.depth, seed=1).to(args.device)
+    kwargs = {'lr': args.lr}
+    if optimizer_id == 'OCGOpt':
+        kwargs['spectral_clip_compile'] = False
+    optimizer = create_optimizer(optimizer_id, list(student.parameters()), **kwargs)
+    freezer = None
+    if freeze:
+        freezer = LayerFreezer(
+            threshold=args.threshold, window=args.window, reprobe_every=args.reprobe_every, interval=args.interval
+        )
+        freezer.attach(optimizer)
+    schedule = torch.optim.lr_scheduler.LinearLR(optimizer, 1.0, args.final_lr_ratio, total_iters=args.steps)
+
+    generator = torch.Generator().manual_seed(2)
+    phase_steps = args.steps // args.phases
+    phases, losses = [], []
+    elapsed = 0.0
+    for step in range(1, phase_steps * args.phases + 1):
+        x = torch.randn(256, args.width, generator=generator).to(args.device)
+        with torch.no_grad():
+            target = teacher(x)
+        loss = torch.nn.functional.mse_loss(student(x), target)
+        optimizer.zero_grad(set_to_none=True)
+        # Once every layer is frozen nothing in the graph requires grad
+        if loss.requires_grad:
+            loss.backward()
+
+        synchronize(args.device)
+        start = time.perf_counter()
+        optimizer.step()
+        synchronize(args.device)
+        elapsed += time.perf_counter() - start
+
+        schedule.step()
+        losses.append(loss.item())
+        if step % phase_steps == 0:
+            phases.append((elapsed * 1000 / phase_steps, freezer.frozen_fraction if freezer else 0.0))
+            elapsed = 0.0
+
+    tail = losses[-max(1, len(losses) // 10):]
+    return phases, sum(tail) / len(tail)
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.set_defaults(steps=3000)
+    parser.add_argument('--optimizers', nargs='+', default=['AdaBelief', 'CAME', 'OCGOpt'])
+    parser.add_argument('--width', type=int, default=256)
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('--lr', type=float, default=1e-3)
+    parser.add_argument('--final-lr-ratio', type=float, default=0.01)
+    parser.add_argument('--threshold', type=float, default=1e-3)
+    parser.add_argument('--window', type=int, default=100)
+    parser.add_argument('--reprobe-every', type=int, default=1000)
+    parser.add_argument('--interval', type=int, default=10, help="Measure every interval-th step")
+    parser.add_argument('--phases', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = []
+    for optimizer_id in args.optimizers:
+        base, base_loss = train(optimizer_id, args, freeze=False)
+        frozen, frozen_loss = train(optimizer_id, args, freeze=True)
+        for phase, ((base_ms, _), (ms, fraction)) in enumerate(zip(base, frozen)):
+            last = phase == len(base) - 1
+            rows.append((
+                optimizer_id, phase + 1, f"{base_ms:.2f}", f"{ms:.2f}", f"{fraction:.0%}",
+                f"{base_loss:.3e}" if last else '', f"{frozen_loss:.3e}" if last else '',
+            ))
+
+    print(f"Width-{args.width} depth-{args.depth} MLP on {args.device}, {args.steps} steps in {args.phases} phases, "
+          f"lr {args.lr} decaying to {args.lr * args.final_lr_ratio:g}, threshold {args.threshold}")
+    print_table(('optimizer', 'phase', 'ms/step', 'frozen ms/step', 'frozen', 'final loss', 'frozen final loss'), rows)
+
+
+if __name__ == '__main__':
+    main()
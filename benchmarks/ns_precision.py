@@ -0,0 +1,78 @@
+"""Time and accuracy of OCGOpt's Newton-Schulz iteration with mixed-precision schedules (spectral_clip_refine_steps).
+
+Each schedule runs the early iterations in a low precision dtype and the last `refine` ones in fp32. The inputs are
+random matrices with singular values spread over two decades, roughly like a momentum buffer. For each size the
+table shows the time per call, the speedup over all-fp32, and the error relative to the all-fp32 result: the distance
+from it relative to its norm, and the largest deviation of the singular values from its singular values.
+"""
+
+import time
+
+import torch
+
+from ..ref_opt_ocgopt import NS_COEFFS, orthogonalize, orthogonalize_compiled_func, orthogonalize_func
+from .common import base_parser, print_table, synchronize
+
+
+def make_matrix(rows: int, cols: int, device, seed: int = 0) -> torch.Tensor:
+    generator = torch.Generator().manual_seed(seed)
+    n = min(rows, cols)
+    u, _ = torch.linalg.qr(torch.randn(rows, n, generator=generator))
+    v, _ = torch.linalg.qr(torch.randn(cols, n, generator=generator))
+    s = torch.logspace(0, -2, n)
+    return (u * s @ v.T).to(device)
+
+
+def spectrum_error(O: torch.Tensor, reference: torch.Tensor) -> float:
+    r"""Largest deviation of O's singular values from those of the reference result, relative to its largest one."""
+    s, s_ref = torch.linalg.svdvals(O.float()), torch.linalg.svdvals(reference)
+    return ((s - s_ref).abs().max() / s_ref.max()).item()
+
+
+def time_calls(func, M, dtype, refine, steps: int, warmup: int) -> float:
+    for _ in range(warmup):
+        func(M, ortho_dtype=dtype, refine_steps=refine)
+    synchronize(M.device)
+    start = time.perf_counter()
+    for _ in range(steps):
+        func(M, ortho_dtype=dtype, refine_steps=refine)
+    synchronize(M.device)
+    return (time.perf_counter() - start) * 1000 / steps
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.set_defaults(steps=10)
+    parser.add_argument('--sizes', nargs='+', default=['512x512', '1024x1024', '4096x1024', '2048x2048', '4096x4096'],
+                        help="Matrix sizes as ROWSxCOLS")
+    parser.add_argument('--low', default='bfloat16', choices=['bfloat16', 'float16'],
+                        help="Dtype of the early iterations")
+    parser.add_argument('--refine', type=int, nargs='+', default=[1, 2, 3], help="fp32 refinement iterations to try")
+    parser.add_argument('--compile', action='store_true', help="Compile the iteration, as spectral_clip_compile does")
+    args = parser.parse_args()
+    low = getattr(torch, args.low)
+    func = orthogonalize_compiled_func if args.compile else orthogonalize_func
+
+    schedules = [('fp32', torch.float32, 0), (args.low, low, 0)]
+    schedules += [(f"{args.low} + {refine} fp32", low, refine) for refine in args.refine if refine < len(NS_COEFFS)]
+
+    rows = []
+    for size in args.sizes:
+        m, n = (int(x) for x in size.split('x'))
+        M = make_matrix(m, n, args.device)
+        reference = orthogonalize(M, ortho_dtype=torch.float32)
+        fp32_ms = None
+        for name, dtype, refine in schedules:
+            ms = time_calls(func, M, dtype, refine, args.steps, args.warmup)
+            fp32_ms = fp32_ms or ms
+            O = orthogonalize(M, ortho_dtype=dtype, refine_steps=refine)
+            distance = (torch.linalg.norm(O.float() - reference) / torch.linalg.norm(reference)).item()
+            rows.append((size, name, f"{ms:.2f}", f"{fp32_ms / ms:.2f}x", f"{distance:.2e}",
+                         f"{spectrum_error(O, reference):.2e}"))
+
+    print(f"Newton-Schulz ({len(NS_COEFFS)} iterations) on {args.device}" + (", compiled" if args.compile else ""))
+    print_table(('size', 'schedule', 'ms', 'speedup', 'error vs fp32', 'spectrum error'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Step time vs. training quality of refreshing CAME's and OCGOpt's preconditioners only every k steps.
+
+Step time is measured on a transformer block with fixed gradients. Quality is the final loss of a small MLP fitted to a
+random teacher MLP, trained from the same initialization with every configuration.
+"""
+
+import torch
+
+from ..ref_opt_came import CAME
+from ..ref_opt_ocgopt import OCGOpt
+from .common import base_parser, format_mib, make_grads, make_params, mlp, print_table, state_bytes, time_steps
+
+
+def block_shapes(width: int):
+    r"""The shapes of common.DEFAULT_SHAPES, for a model width other than 1024."""
+    return [(width, width)] * 4 + [(4 * width, width), (width, 4 * width)] + [(width,)] * 6 + [(4 * width,)]
+
+
+def fit_teacher(make_optimizer, args, device) -> float:
+    r"""Final loss of a student MLP fitted to a random teacher, averaged over the last tenth of the steps."""
+    teacher = mlp(args.quality_width, 3, seed=0).to(device)
+    student = mlp(args.quality_width, 3, seed=1).to(device)
+    optimizer = make_optimizer(list(student.parameters()))
+
+    generator = torch.Generator().manual_seed(2)
+    losses = []
+    for _ in range(args.quality_steps):
+        x = torch.randn(256, args.quality_width, generator=generator).to(device)
+        with torch.no_grad():
+            target = teacher(x)
+        loss = torch.nn.functional.mse_loss(student(x), target)
+        optimizer.zero_grad(set_to_none=True)
+        loss.backward()
+        optimizer.step()
+        losses.append(loss.item())
+
+    tail = losses[-max(1, len(losses) // 10):]
+    return sum(tail) / len(tail)
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--width', type=int, default=1024, help="Model width of the timed transformer block")
+    parser.add_argument('--intervals', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--min-numel', type=int, default=0, help="precondition_min_numel")
+    parser.add_argument('--quality-width', type=int, default=128)
+    parser.add_argument('--quality-steps', type=int, default=300)
+    parser.add_argument('--compile', action='store_true', help="Compile OCGOpt's Newton-Schulz iteration")
+    args = parser.parse_args()
+    dtype = getattr(torch, args.dtype)
+    shapes = block_shapes(args.width)
+
+    optimizers = [
+        ('CAME', lambda params, **kwargs: CAME(params, lr=1e-3, **kwargs)),
+        ('OCGOpt', lambda params, **kwargs: OCGOpt(params, lr=1e-3, spectral_clip_compile=args.compile, **kwargs)),
+    ]
+
+    rows = []
+    for name, factory in optimizers:
+        baseline_ms = None
+        for interval in args.intervals:
+            kwargs = {'precondition_interval': interval, 'precondition_min_numel': args.min_numel}
+
+            params = make_params(shapes, dtype, args.device)
+            optimizer = factory(params, **kwargs)
+            if name == 'OCGOpt' and args.compile:
+                optimizer.warmup()
+            # Warm up for a full interval, so every param has refreshed its cache at least once
+            ms = time_steps(optimizer, params, make_grads(params), args.steps, max(args.warmup, interval))
+            baseline_ms = baseline_ms or ms
+
+            loss = fit_teacher(lambda p: factory(p, **kwargs), args, args.device)
+            rows.append((
+                name, interval, format_mib(state_bytes(optimizer)), f"{ms:.2f}", f"{baseline_ms / ms:.2f}x", f"{loss:.4e}"
+            ))
+
+    print(f"Step time on a width-{args.width} block ({sum(torch.Size(s).numel() for s in shapes):,} params), "
+          f"{args.device}, {args.dtype}; loss of a width-{args.quality_width} MLP after {args.quality_steps} steps")
+    print_table(('optimizer', 'interval', 'state', 'ms/step', 'speedup', 'final loss'), rows)
+
+
+if __name__ == '__main__':
+    main()
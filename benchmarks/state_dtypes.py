@@ -0,0 +1,114 @@
+"""State memory, step time and accuracy of state dtype policies (the optimizers' state_dtypes arg).
+
+Memory and step time are measured on a transformer block with fixed gradients. Accuracy comes from fitting a student
+MLP to a random teacher: the final loss, and how far the student's weights ended up from the run with the default
+policy, relative to how far that run moved them.
+"""
+
+import torch
+
+from ..optimizer_memory import measure_state_bytes
+from ..optimizer_registry import create_optimizer
+from .common import (
+    DEFAULT_SHAPES, base_parser, format_mib, make_grads, make_params, mlp, print_table, relative_error, state_bytes,
+    time_steps,
+)
+
+POLICIES = {
+    'AdaBelief': {
+        'default': None,
+        'bf16 exp_avg': {'exp_avg': 'bfloat16'},
+        'bf16': {'exp_avg': 'bfloat16', 'exp_avg_var': 'bfloat16'},
+    },
+    'CAME': {
+        'default': None,
+        'bf16 exp_avg': {'exp_avg': 'bfloat16'},
+        'bf16': {key: 'bfloat16' for key in ('exp_avg', 'exp_avg_sq', 'exp_avg_sq_row', 'exp_avg_sq_col',
+                                             'exp_avg_res_row', 'exp_avg_res_col')},
+    },
+    'OCGOpt': {
+        'default': None,
+        'bf16 value_momentum': {'value_momentum': 'bfloat16'},
+        'bf16': {'value_momentum': 'bfloat16', 'centralized_momentum': 'bfloat16', 'denom': 'bfloat16'},
+    },
+}
+
+
+def make_optimizer(optimizer_id: str, params, policy, args):
+    kwargs = {'lr': args.lr, 'state_dtypes': policy}
+    if optimizer_id == 'OCGOpt':
+        kwargs['spectral_clip_compile'] = args.compile
+    return create_optimizer(optimizer_id, params, **kwargs)
+
+
+def fit_teacher(optimizer_id: str, policy, args, dtype):
+    r"""Train a student on a fixed data stream. Returns the loss over the last tenth of the steps and the weights."""
+    teacher = mlp(args.quality_width, 3, seed=0).to(args.device)
+    student = mlp(args.quality_width, 3, seed=1).to(device=args.device, dtype=dtype)
+    optimizer = make_optimizer(optimizer_id, list(student.parameters()), policy, args)
+
+    generator = torch.Generator().manual_seed(2)
+    losses = []
+    for _ in range(args.quality_steps):
+        x = torch.randn(256, args.quality_width, generator=generator).to(args.device)
+        with torch.no_grad():
+            target = teacher(x)
+        loss = torch.nn.functional.mse_loss(student(x.to(dtype)).float(), target)
+        optimizer.zero_grad(set_to_none=True)
+        loss.backward()
+        optimizer.step()
+        losses.append(loss.item())
+
+    tail = losses[-max(1, len(losses) // 10):]
+    return sum(tail) / len(tail), [p.detach().float() for p in student.parameters()]
+
+
+def format_breakdown(optimizer) -> str:
+    r"""State MiB per key and dtype, e.g. 'exp_avg bfloat16 8.0'."""
+    parts = []
+    for key, by_dtype in measure_state_bytes(optimizer).items():
+        for name, num_bytes in by_dtype.items():
+            parts.append(f"{key} {name} {num_bytes / 2 ** 20:.1f}")
+    return ', '.join(parts)
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--optimizers', nargs='+', default=list(POLICIES))
+    parser.add_argument('--lr', type=float, default=1e-3)
+    parser.add_argument('--quality-width', type=int, default=128)
+    parser.add_argument('--quality-steps', type=int, default=500)
+    parser.add_argument('--compile', action='store_true', help="Compile OCGOpt's Newton-Schulz iteration")
+    args = parser.parse_args()
+    dtype = getattr(torch, args.dtype)
+
+    initial = [p.detach().float() for p in mlp(args.quality_width, 3, seed=1).parameters()]
+
+    rows, breakdowns = [], []
+    for optimizer_id in args.optimizers:
+        reference = None
+        for name, policy in POLICIES[optimizer_id].items():
+            params = make_params(DEFAULT_SHAPES, dtype, args.device)
+            optimizer = make_optimizer(optimizer_id, params, policy, args)
+            ms = time_steps(optimizer, params, make_grads(params), args.steps, args.warmup)
+
+            loss, weights = fit_teacher(optimizer_id, policy, args, dtype)
+            if reference is None:
+                reference, error = weights, '-'
+            else:
+                error = f"{relative_error(weights, reference, initial):.2e}"
+
+            rows.append((optimizer_id, name, format_mib(state_bytes(optimizer)), f"{ms:.2f}", f"{loss:.4e}", error))
+            breakdowns.append(f"{optimizer_id} {name}: {format_breakdown(optimizer)}")
+
+    print(f"State and step time on a transformer block ({sum(torch.Size(s).numel() for s in DEFAULT_SHAPES):,} "
+          f"params), {args.device}, {args.dtype}, lr {args.lr}; accuracy of a width-{args.quality_width} MLP after "
+          f"{args.quality_steps} steps")
+    print_table(('optimizer', 'policy', 'state', 'ms/step', 'final loss', 'error vs default'), rows)
+    print("\nState MiB per key and dtype:")
+    for line in breakdowns:
+        print(f"  {line}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Device-resident optimizer state and step time when part of the model stops training (hibernate_after).
+
+Two transformer blocks stand in for a text encoder and a UNet. Both get gradients at first, the encoder's stop for a
+while, as when its training ends early or it is frozen mid-run, and then resume. For each phase the table shows the
+state left on the device at its end and the average and slowest step, the slowest including the step that hibernates
+or wakes the encoder's state. With --device cpu, 'cpu' hibernation leaves the state where it is.
+"""
+
+import time
+
+import torch
+
+from ..optimizer_registry import create_optimizer
+from .common import (
+    DEFAULT_SHAPES, base_parser, format_mib, make_grads, make_params, print_table, state_bytes, synchronize,
+)
+
+TARGETS = {'off': {}, 'cpu': {'hibernate_to': 'cpu'}, 'disk': {'hibernate_to': 'disk'}}
+
+
+def run(optimizer_id: str, target: str, args, dtype):
+    r"""Returns (phase, resident state bytes at its end, mean ms/step, max ms/step) per phase."""
+    encoder = make_params(DEFAULT_SHAPES, dtype, args.device, seed=0)
+    unet = make_params(DEFAULT_SHAPES * 2, dtype, args.device, seed=2)
+    encoder_grads, unet_grads = make_grads(encoder, seed=1), make_grads(unet, seed=3)
+
+    kwargs = {'lr': args.lr, **TARGETS[target]}
+    if target != 'off':
+        kwargs['hibernate_after'] = args.hibernate_after
+    if optimizer_id == 'OCGOpt':
+        kwargs['spectral_clip_compile'] = args.compile
+    optimizer = create_optimizer(optimizer_id, encoder + unet, **kwargs)
+    hibernation = getattr(optimizer, 'hibernation', None)
+
+    phases = [('both', args.steps, True), ('unet only', args.idle_steps, False), ('both again', args.steps, True)]
+    results = []
+    for name, steps, train_encoder in phases:
+        times = []
+        for _ in range(steps):
+            for p, g in zip(encoder, encoder_grads):
+                p.grad = g if train_encoder else None
+            for p, g in zip(unet, unet_grads):
+                p.grad = g
+
+            synchronize(args.device)
+            start = time.perf_counter()
+            optimizer.step()
+            synchronize(args.device)
+            times.append((time.perf_counter() - start) * 1000)
+
+        resident = state_bytes(optimizer) - (hibernation.hibernated_bytes if hibernation else 0)
+        results.append((name, resident, sum(times) / len(times), max(times)))
+    return results
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--optimizers', nargs='+', default=['AdaBelief', 'CAME', 'OCGOpt'])
+    parser.add_argument('--targets', nargs='+', default=list(TARGETS), choices=list(TARGETS))
+    parser.add_argument('--lr', type=float, default=1e-4)
+    parser.add_argument('--hibernate-after', type=int, default=10)
+    parser.add_argument('--idle-steps', type=int, default=40, help="Steps the encoder gets no gradients")
+    parser.add_argument('--compile', action='store_true', help="Compile OCGOpt's Newton-Schulz iteration")
+    args = parser.parse_args()
+    dtype = getattr(torch, args.dtype)
+
+    rows = []
+    for optimizer_id in args.optimizers:
+        for target in args.targets:
+            for name, resident, mean_ms, max_ms in run(optimizer_id, target, args, dtype):
+                rows.append((optimizer_id, target, name, format_mib(resident), f"{mean_ms:.2f}", f"{max_ms:.2f}"))
+
+    print(f"Encoder and UNet of {len(DEFAULT_SHAPES)} and {2 * len(DEFAULT_SHAPES)} tensors on {args.device}, "
+          f"{args.dtype}, hibernate after {args.hibernate_after} steps without a gradient")
+    print_table(('optimizer', 'hibernation', 'phase', 'device state', 'ms/step', 'max ms/step'), rows)
+
+
+if __name__ == '__main__':
+    main()
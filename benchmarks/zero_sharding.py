@@ -0,0 +1,76 @@
+"""Per-rank optimizer state and step time of ZeRO-1 sharding, on gloo processes of this machine.
+
+Every rank steps with the same (already averaged) gradients and its final params are compared with an unsharded run,
+so the table also checks that sharding leaves the training result unchanged.
+"""
+
+import json
+import socket
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from ..optimizer_registry import create_optimizer
+from ..optimizer_sharding import ShardedOptimizer
+from .common import DEFAULT_SHAPES, base_parser, format_mib, make_grads, make_params, print_table, state_bytes, time_steps
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def worker(rank: int, world_size: int, port: int, args, results):
+    dist.init_process_group('gloo', init_method=f"tcp://127.0.0.1:{port}", rank=rank, world_size=world_size)
+    try:
+        dtype = getattr(torch, args.dtype)
+        kwargs = json.loads(args.kwargs)
+
+        params = make_params(DEFAULT_SHAPES, dtype, 'cpu')
+        optimizer = ShardedOptimizer(params, args.optimizer, **kwargs)
+        ms = time_steps(optimizer, params, make_grads(params), args.steps, args.warmup)
+
+        reference_params = make_params(DEFAULT_SHAPES, dtype, 'cpu')
+        reference = create_optimizer(args.optimizer, reference_params, **kwargs)
+        time_steps(reference, reference_params, make_grads(reference_params), args.steps, args.warmup)
+        max_diff = max((p.float() - r.float()).abs().max().item() for p, r in zip(params, reference_params))
+
+        results.put((rank, state_bytes(optimizer), state_bytes(reference), ms, max_diff))
+    finally:
+        dist.destroy_process_group()
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--optimizer', default='AdaBelief', help="Optimizer id in optimizer_registry")
+    parser.add_argument('--kwargs', default='{"lr": 1e-4}', help="JSON arguments of the optimizer")
+    parser.add_argument('--world-sizes', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    context = mp.get_context('spawn')
+    rows = []
+    for world_size in args.world_sizes:
+        results = context.SimpleQueue()
+        mp.spawn(worker, args=(world_size, free_port(), args, results), nprocs=world_size)
+        ranks = sorted(results.get() for _ in range(world_size))
+
+        per_rank = [r[1] for r in ranks]
+        rows.append((
+            world_size,
+            format_mib(ranks[0][2]),
+            format_mib(max(per_rank)),
+            format_mib(min(per_rank)),
+            f"{max(per_rank) / ranks[0][2]:.2f}",
+            f"{max(r[3] for r in ranks):.2f}",
+            f"{max(r[4] for r in ranks):.1e}",
+        ))
+
+    print(f"{args.optimizer} {args.kwargs} on gloo/cpu, {args.dtype}, "
+          f"{sum(torch.Size(s).numel() for s in DEFAULT_SHAPES):,} params")
+    print_table(('ranks', 'unsharded', 'max rank', 'min rank', 'fraction', 'ms/step', 'max diff'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,30 @@
+import argparse
 import ast
+import concurrent.futures
+import hashlib
+import importlib.util
+import io
 import json
 import os
+import queue
 import re
+import tempfile
+import threading
+import time
+
+if __package__:
+    from .optimizer_memory import STATE_COST_FORMULAS
+    from .optimizer_registry import available as registered_optimizers
+else:
+    # Run as a script, python generate_schema.py
+    from optimizer_memory import STATE_COST_FORMULAS
+    from optimizer_registry import available as registered_optimizers
+
+# Bump whenever parse_optimizer_file changes its output, so stale cache entries are discarded
+GENERATOR_VERSION = '5'
+CACHE_FILENAME = '.schema_cache.json'
+# Below this many uncached files, parsing serially beats starting a process pool
+POOL_MIN_FILES = 8
 
 # Mapping of Python types to our Schema types
 TYPE_MAPPING = {
@@ -9,225 +32,533 @@ TYPE_MAPPING = {
     'int': 'int',
     'bool': 'bool',
     'str': 'string',
+    'dict': 'dict',
 }
 
-def parse_optimizer_file(filepath):
+# Values of a state_dtypes policy, its keys come from the module's STATE_DTYPE_KEYS
+STATE_DTYPE_OPTIONS = ['float32', 'bfloat16', 'float16']
+
+OPTIMIZER_BASES = {'Optimizer', 'BaseOptimizer'}
+
+# Bounds implied by BaseOptimizer's self.validate_*(arg) calls in __init__
+VALIDATOR_BOUNDS = {
+    'validate_learning_rate': {'min': 0},
+    'validate_non_negative': {'min': 0},
+    'validate_positive': {'min': 0, 'exclusiveMin': True},
+}
+# validate_betas checks beta1 and beta2 against [0, 1) and beta3 against [0, 1]
+BETA_BOUNDS = [{'min': 0.0, 'exclusiveMax': True}, {'min': 0.0, 'exclusiveMax': True}, {'min': 0.0}]
+
+def base_name(node):
+    """Last segment of a base class expression, e.g. 'Optimizer' for torch.optim.Optimizer."""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
+def parse_validated_args(init_method):
+    """Names of the __init__ args passed to self.validate_*(), mapped to the validator's name."""
+    validated = {}
+    for node in ast.walk(init_method):
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                and isinstance(node.func.value, ast.Name) and node.func.value.id == 'self'
+                and node.func.attr.startswith('validate_') and node.args and isinstance(node.args[0], ast.Name)):
+            validated.setdefault(node.args[0].id, node.func.attr)
+    return validated
+
+def apply_bounds(arg_def, bounds):
+    if arg_def['type'] == 'int' and bounds.get('exclusiveMin'):
+        # An int above min is at least min + 1
+        bounds = {'min': bounds['min'] + 1}
+    for key, value in bounds.items():
+        arg_def[key] = float(value) if key == 'min' and arg_def['type'] == 'float' else value
+
+def parse_init_args(init_method, state_dtype_keys=None):
+    parsed_args = []
+    validated = parse_validated_args(init_method)
+
+    # Parse arguments
+    # defaults are aligned to the end of args
+    defaults = init_method.args.defaults
+    args = init_method.args.args
+    
+    # Skip 'self' and 'params'
+    start_idx = 0
+    if args and args[0].arg == 'self':
+        start_idx += 1
+    if len(args) > start_idx and args[start_idx].arg in ['params', 'params_group']:
+        start_idx += 1
+        
+    relevant_args = args[start_idx:]
+    # Calculate offset for defaults
+    default_offset = len(relevant_args) - len(defaults)
+    
+    for i, arg in enumerate(relevant_args):
+        arg_name = arg.arg
+        
+        # Skip generic kwargs
+        if arg_name == 'kwargs':
+            continue
+
+        # Determine default value
+        default_val = None
+        if i >= default_offset:
+            default_node = defaults[i - default_offset]
+            try:
+                default_val = ast.literal_eval(default_node)
+            except ValueError:
+                # Handle simple constant access or negative numbers
+                if isinstance(default_node, ast.UnaryOp) and isinstance(default_node.op, ast.USub):
+                     if isinstance(default_node.operand, ast.Constant):
+                         default_val = -default_node.operand.value
+                else:
+                    # Fallback for complex defaults (like function calls), just use null or string representation
+                    default_val = None
+
+        # Determine type annotation
+        arg_type = 'string' # Default
+        options = None
+        
+        if arg.annotation:
+            if isinstance(arg.annotation, ast.Name):
+                arg_type = TYPE_MAPPING.get(arg.annotation.id, 'string')
+            elif isinstance(arg.annotation, ast.Subscript): # e.g. Optional[float]
+                # Naive handling
+                if isinstance(arg.annotation.slice, ast.Name):
+                     arg_type = TYPE_MAPPING.get(arg.annotation.slice.id, 'string')
+        
+        # Infer type from default value if annotation missing or generic
+        if default_val is not None:
+            if isinstance(default_val, bool):
+                arg_type = 'bool'
+            elif isinstance(default_val, int):
+                arg_type = 'int'
+            elif isinstance(default_val, float):
+                arg_type = 'float'
+            elif isinstance(default_val, str):
+                arg_type = 'string' # Could be enum
+        
+        # Special handling for 'betas' tuple
+        if arg_name == 'betas':
+            if isinstance(default_val, tuple) or isinstance(default_val, list):
+                for b_idx, beta_val in enumerate(default_val):
+                    beta_def = {
+                        'name': f'beta{b_idx+1}',
+                        'label': f'Beta {b_idx+1}',
+                        'type': 'float',
+                        'default': beta_val,
+                        'step': 0.01 if b_idx == 0 else 0.001,
+                        'max': 1.0
+                    }
+                    if validated.get('betas') == 'validate_betas' and b_idx < len(BETA_BOUNDS):
+                        apply_bounds(beta_def, BETA_BOUNDS[b_idx])
+                    parsed_args.append(beta_def)
+            continue
+            
+        # Special handling for enums (detected by name or specific logic)
+        if arg_name == 'update_strategy':
+            arg_type = 'enum'
+            options = ['unmodified', 'cautious', 'grams'] # Hardcoded for CAME based on docstring analysis? 
+            # Ideally we parse docstrings but that's complex. For now, we can infer or leave empty.
+            # Let's try to extract from docstring if possible?
+            # For this script, I'll stick to basic extraction.
+        
+        if arg_name == 'bf16_mode':
+            arg_type = 'enum'
+            options = ['stochastic', 'kahan']
+
+        if arg_name == 'hibernate_to':
+            arg_type = 'enum'
+            options = ['cpu', 'disk']
+
+        if arg_name == 'spectral_clip_dtype':
+             arg_type = 'enum'
+             options = ['float32', 'float16', 'bfloat16', 'float64']
+
+        keys = None
+        if arg_name == 'state_dtypes':
+            arg_type = 'dict'
+            keys = list(state_dtype_keys or [])
+            options = STATE_DTYPE_OPTIONS
+
+        arg_def = {
+            'name': arg_name,
+            'label': arg_name.replace('_', ' ').title(),
+            'type': arg_type,
+            'default': default_val
+        }
+        
+        if keys is not None:
+            arg_def['keys'] = keys
+        if options:
+            arg_def['options'] = options
+
+        if validated.get(arg_name) in VALIDATOR_BOUNDS:
+            apply_bounds(arg_def, VALIDATOR_BOUNDS[validated[arg_name]])
+            
+        # Add reasonable steps for floats
+        if arg_type == 'float':
+            if 'decay' in arg_name:
+                arg_def['step'] = 0.001
+            elif 'lr' in arg_name or 'eps' in arg_name:
+                arg_def['step'] = default_val if default_val and default_val > 0 else 1e-8
+            else:
+                arg_def['step'] = 0.1
+
+        parsed_args.append(arg_def)
+
+    return parsed_args
+
+def parse_module_classes(filepath):
+    """Summarize every top-level class of a module: its name, base class names and __init__ args (None without __init__)."""
     with open(filepath, 'r', encoding='utf-8') as f:
         tree = ast.parse(f.read())
 
-    optimizers = []
+    classes = []
+    state_dtype_keys = None
+    for node in tree.body:
+        if (isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name)
+                and node.targets[0].id == 'STATE_DTYPE_KEYS'):
+            state_dtype_keys = ast.literal_eval(node.value)
 
     for node in tree.body:
         if isinstance(node, ast.ClassDef):
-            # Check if it looks like an optimizer (inherits from Optimizer or BaseOptimizer)
-            is_optimizer = any(
-                (isinstance(base, ast.Name) and base.id in ['Optimizer', 'BaseOptimizer']) 
-                for base in node.bases
-            )
-            
-            if is_optimizer:
-                opt_def = {
-                    'id': node.name,
-                    'name': node.name,
-                    'args': []
-                }
-                
-                # Find __init__
-                init_method = next((n for n in node.body if isinstance(n, ast.FunctionDef) and n.name == '__init__'), None)
-                
-                if init_method:
-                    # Parse arguments
-                    # defaults are aligned to the end of args
-                    defaults = init_method.args.defaults
-                    args = init_method.args.args
-                    
-                    # Skip 'self' and 'params'
-                    start_idx = 0
-                    if args and args[0].arg == 'self':
-                        start_idx += 1
-                    if len(args) > start_idx and args[start_idx].arg in ['params', 'params_group']:
-                        start_idx += 1
-                        
-                    relevant_args = args[start_idx:]
-                    # Calculate offset for defaults
-                    default_offset = len(relevant_args) - len(defaults)
-                    
-                    for i, arg in enumerate(relevant_args):
-                        arg_name = arg.arg
-                        
-                        # Skip generic kwargs
-                        if arg_name == 'kwargs':
-                            continue
-
-                        # Determine default value
-                        default_val = None
-                        if i >= default_offset:
-                            default_node = defaults[i - default_offset]
-                            try:
-                                default_val = ast.literal_eval(default_node)
-                            except ValueError:
-                                # Handle simple constant access or negative numbers
-                                if isinstance(default_node, ast.UnaryOp) and isinstance(default_node.op, ast.USub):
-                                     if isinstance(default_node.operand, ast.Constant):
-                                         default_val = -default_node.operand.value
-                                else:
-                                    # Fallback for complex defaults (like function calls), just use null or string representation
-                                    default_val = None
-
-                        # Determine type annotation
-                        arg_type = 'string' # Default
-                        options = None
-                        
-                        if arg.annotation:
-                            if isinstance(arg.annotation, ast.Name):
-                                arg_type = TYPE_MAPPING.get(arg.annotation.id, 'string')
-                            elif isinstance(arg.annotation, ast.Subscript): # e.g. Optional[float]
-                                # Naive handling
-                                if isinstance(arg.annotation.slice, ast.Name):
-                                     arg_type = TYPE_MAPPING.get(arg.annotation.slice.id, 'string')
-                        
-                        # Infer type from default value if annotation missing or generic
-                        if default_val is not None:
-                            if isinstance(default_val, bool):
-                                arg_type = 'bool'
-                            elif isinstance(default_val, int):
-                                arg_type = 'int'
-                            elif isinstance(default_val, float):
-                                arg_type = 'float'
-                            elif isinstance(default_val, str):
-                                arg_type = 'string' # Could be enum
-                        
-                        # Special handling for 'betas' tuple
-                        if arg_name == 'betas':
-                            if isinstance(default_val, tuple) or isinstance(default_val, list):
-                                for b_idx, beta_val in enumerate(default_val):
-                                    opt_def['args'].append({
-                                        'name': f'beta{b_idx+1}',
-                                        'label': f'Beta {b_idx+1}',
-                                        'type': 'float',
-                                        'default': beta_val,
-                                        'step': 0.01 if b_idx == 0 else 0.001,
-                                        'max': 1.0
-                                    })
-                            continue
-                            
-                        # Special handling for enums (detected by name or specific logic)
-                        if arg_name == 'update_strategy':
-                            arg_type = 'enum'
-                            options = ['unmodified', 'cautious', 'grams'] # Hardcoded for CAME based on docstring analysis? 
-                            # Ideally we parse docstrings but that's complex. For now, we can infer or leave empty.
-                            # Let's try to extract from docstring if possible?
-                            # For this script, I'll stick to basic extraction.
-                        
-                        if arg_name == 'spectral_clip_dtype':
-                             arg_type = 'enum'
-                             options = ['float32', 'float16', 'bfloat16', 'float64']
-
-                        arg_def = {
-                            'name': arg_name,
-                            'label': arg_name.replace('_', ' ').title(),
-                            'type': arg_type,
-                            'default': default_val
-                        }
-                        
-                        if options:
-                            arg_def['options'] = options
-                            
-                        # Add reasonable steps for floats
-                        if arg_type == 'float':
-                            if 'decay' in arg_name:
-                                arg_def['step'] = 0.001
-                            elif 'lr' in arg_name or 'eps' in arg_name:
-                                arg_def['step'] = default_val if default_val and default_val > 0 else 1e-8
-                            else:
-                                arg_def['step'] = 0.1
-
-                        opt_def['args'].append(arg_def)
-                
-                optimizers.append(opt_def)
-                
+            # Find __init__
+            init_method = next((n for n in node.body if isinstance(n, ast.FunctionDef) and n.name == '__init__'), None)
+
+            classes.append({
+                'name': node.name,
+                'bases': [name for name in map(base_name, node.bases) if name],
+                'args': parse_init_args(init_method, state_dtype_keys) if init_method else None,
+            })
+
+    return classes
+
+def resolve_optimizers(classes):
+    """Pick out the optimizers among class summaries, following base classes across modules.
+
+    A class is an optimizer if any of its bases is Optimizer/BaseOptimizer or another optimizer. Classes without
+    their own __init__ inherit the args of the nearest base that has one. When a name is defined more than once,
+    the first definition wins.
+    """
+    by_name = {}
+    for cls in classes:
+        by_name.setdefault(cls['name'], cls)
+
+    def is_optimizer(name, seen):
+        if name in OPTIMIZER_BASES:
+            return True
+        cls = by_name.get(name)
+        if cls is None or name in seen:
+            return False
+        seen.add(name)
+        return any(is_optimizer(base, seen) for base in cls['bases'])
+
+    def find_args(name, seen):
+        cls = by_name.get(name)
+        if cls is None or name in seen:
+            return None
+        if cls['args'] is not None:
+            return cls['args']
+        seen.add(name)
+        return next((args for args in (find_args(base, seen) for base in cls['bases']) if args is not None), None)
+
+    optimizers = []
+    for name, cls in by_name.items():
+        if name in OPTIMIZER_BASES or name.startswith('_') or not is_optimizer(name, set()):
+            continue
+        optimizers.append({
+            'id': name,
+            'name': name,
+            'args': find_args(name, set()) or [],
+        })
+
     return optimizers
 
-def generate_typescript_schema(optimizers, output_path):
-    ts_content = """
+def parse_optimizer_file(filepath):
+    return resolve_optimizers(parse_module_classes(filepath))
+
+
+def file_hash(filepath):
+    h = hashlib.sha256(GENERATOR_VERSION.encode('utf-8'))
+    with open(filepath, 'rb') as f:
+        h.update(f.read())
+    return h.hexdigest()
+
+def load_cache(cache_path):
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get('version') != GENERATOR_VERSION:
+        return {}
+    return cache.get('files', {})
+
+def save_cache(cache_path, cache):
+    atomic_write(cache_path, json.dumps({'version': GENERATOR_VERSION, 'files': cache}, indent=1, sort_keys=True))
+
+def parse_module_classes_cached(filepath, cache):
+    """Parse a module's classes, reusing the cached result if its content hash is unchanged. Returns (classes, hit)."""
+    key = os.path.abspath(filepath)
+    digest = file_hash(filepath)
+    entry = cache.get(key)
+    if entry is not None and entry['hash'] == digest:
+        return entry['classes'], True
+
+    classes = _parse_module_classes_json(filepath)
+    cache[key] = {'hash': digest, 'classes': classes}
+    return classes, False
+
+def _parse_module_classes_json(filepath):
+    # Round-trip through JSON so fresh and cached results render identically
+    return json.loads(json.dumps(parse_module_classes(filepath)))
+
+def parse_files(paths, cache, workers=None):
+    """Parse many modules, fanning cache misses out over a process pool. Returns ({path: classes}, misses).
+
+    Files that fail to parse are reported and skipped.
+    """
+    results = {}
+    misses = []
+    for path in paths:
+        digest = file_hash(path)
+        entry = cache.get(os.path.abspath(path))
+        if entry is not None and entry['hash'] == digest:
+            results[path] = entry['classes']
+        else:
+            misses.append((path, digest))
+
+    def store(path, digest, classes):
+        results[path] = classes
+        cache[os.path.abspath(path)] = {'hash': digest, 'classes': classes}
+
+    # Spawning workers costs more than parsing a handful of files
+    if len(misses) < POOL_MIN_FILES or workers == 1:
+        for path, digest in misses:
+            try:
+                store(path, digest, _parse_module_classes_json(path))
+            except (SyntaxError, UnicodeDecodeError) as e:
+                print(f"Skipping {path}: {e}")
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_parse_module_classes_json, path): (path, digest) for path, digest in misses}
+            for future in concurrent.futures.as_completed(futures):
+                path, digest = futures[future]
+                try:
+                    store(path, digest, future.result())
+                except (SyntaxError, UnicodeDecodeError) as e:
+                    print(f"Skipping {path}: {e}")
+
+    return results, len(misses)
+
+# Standard fallbacks, added manually
+STANDARD_OPTIMIZERS = [
+    {
+        'id': 'AdamW',
+        'name': 'AdamW',
+        'args': [
+            {'name': 'weight_decay', 'label': 'Weight Decay', 'type': 'float', 'default': 0.01, 'step': 0.001, 'min': 0.0},
+            {'name': 'beta1', 'label': 'Beta 1', 'type': 'float', 'default': 0.9, 'step': 0.01, 'min': 0.0, 'max': 1.0, 'exclusiveMax': True},
+            {'name': 'beta2', 'label': 'Beta 2', 'type': 'float', 'default': 0.999, 'step': 0.001, 'min': 0.0, 'max': 1.0, 'exclusiveMax': True},
+            {'name': 'epsilon', 'kwarg': 'eps', 'label': 'Epsilon', 'type': 'float', 'default': 1e-8, 'step': 1e-9, 'min': 0.0},
+        ]
+    },
+    {
+        'id': 'AdamW8bit',
+        'name': 'AdamW 8-bit',
+        'args': [
+            {'name': 'weight_decay', 'label': 'Weight Decay', 'type': 'float', 'default': 0.01, 'step': 0.001, 'min': 0.0},
+            {'name': 'beta1', 'label': 'Beta 1', 'type': 'float', 'default': 0.9, 'step': 0.01, 'min': 0.0, 'max': 1.0, 'exclusiveMax': True},
+            {'name': 'beta2', 'label': 'Beta 2', 'type': 'float', 'default': 0.999, 'step': 0.001, 'min': 0.0, 'max': 1.0, 'exclusiveMax': True},
+            {'name': 'epsilon', 'kwarg': 'eps', 'label': 'Epsilon', 'type': 'float', 'default': 1e-8, 'step': 1e-9, 'min': 0.0},
+        ]
+    },
+     {
+        'id': 'Adafactor',
+        'name': 'Adafactor',
+        'args': [
+            {'name': 'scale_parameter', 'label': 'Scale Parameter', 'type': 'bool', 'default': True},
+            {'name': 'relative_step', 'label': 'Relative Step', 'type': 'bool', 'default': True},
+            {'name': 'warmup_init', 'label': 'Warmup Init', 'type': 'bool', 'default': True},
+        ]
+    },
+    {
+        'id': 'Prodigy',
+        'name': 'Prodigy',
+        'args': [
+            {'name': 'weight_decay', 'label': 'Weight Decay', 'type': 'float', 'default': 0.0, 'step': 0.01},
+            {'name': 'decouple', 'label': 'Decouple', 'type': 'bool', 'default': True},
+            {'name': 'use_bias_correction', 'label': 'Bias Correction', 'type': 'bool', 'default': True},
+            {'name': 'safeguard_warmup', 'label': 'Safeguard Warmup', 'type': 'bool', 'default': True},
+            {'name': 'd_coef', 'label': 'D Coefficient', 'type': 'float', 'default': 1.0, 'step': 0.1},
+        ]
+    }
+]
+
+def with_standard_optimizers(optimizers):
+    # The standard optimizers are what the trainer runs under these ids, so they replace same-named parsed classes
+    standard_ids = {opt['id'] for opt in STANDARD_OPTIMIZERS}
+    return [opt for opt in optimizers if opt['id'] not in standard_ids] + STANDARD_OPTIMIZERS
+
+def registry_problems(optimizers, local_names):
+    """Where optimizer_registry.py and the schema disagree: local or standard optimizers the registry can't create, and
+    registered ids the schema doesn't have (typos, removed classes). local_names are the classes of the ref_opt_*.py files.
+    """
+    schema_ids = {opt['id'] for opt in with_standard_optimizers(optimizers)}
+    required = {opt['id'] for opt in optimizers if opt['id'] in local_names} | {opt['id'] for opt in STANDARD_OPTIMIZERS}
+    registered = set(registered_optimizers())
+    return ([f"{optimizer_id} is in the schema but not registered" for optimizer_id in sorted(required - registered)]
+            + [f"{optimizer_id} is registered but not in the schema" for optimizer_id in sorted(registered - schema_ids)])
+
+def state_cost_terms(optimizer_id):
+    """State cost formula of an optimizer with the frontend's camelCase keys, or None."""
+    formula = STATE_COST_FORMULAS.get(optimizer_id)
+    if not formula:
+        return None
+    keys = {
+        'min_ndim': 'minNdim',
+        'max_ndim': 'maxNdim',
+        'at_least': 'atLeast',
+        'numel_at_least': 'numelAtLeast',
+        'param_dtypes': 'paramDtypes',
+        'dtype_arg': 'dtypeArg',
+        'upcast_at_least': 'upcastAtLeast',
+    }
+    return [{keys.get(k, k): v for k, v in term.items()} for term in formula]
+
+class AtomicWriter:
+    """Stream text into a temp file next to the target and rename it over on close, so readers never see a
+    half-written file. With only_if_changed, identical content is discarded and the target's mtime is left alone.
+    """
+
+    def __init__(self, output_path, only_if_changed=True):
+        self.output_path = output_path
+        self.only_if_changed = only_if_changed
+        self.changed = False
+
+    def __enter__(self):
+        fd, self._tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(self.output_path)), prefix='.tmp-', suffix=os.path.basename(self.output_path)
+        )
+        self._file = os.fdopen(fd, 'w', encoding='utf-8', newline='')
+        self._hash = hashlib.sha256()
+        return self
+
+    def write(self, text):
+        self._file.write(text)
+        self._hash.update(text.encode('utf-8'))
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        if exc_type is not None:
+            os.unlink(self._tmp_path)
+            return False
+
+        if self.only_if_changed and os.path.exists(self.output_path):
+            existing = hashlib.sha256()
+            with open(self.output_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    existing.update(chunk)
+            if existing.digest() == self._hash.digest():
+                os.unlink(self._tmp_path)
+                return False
+
+        try:
+            os.chmod(self._tmp_path, os.stat(self.output_path).st_mode)
+        except OSError:
+            os.chmod(self._tmp_path, 0o644)
+        os.replace(self._tmp_path, self.output_path)
+        self.changed = True
+        return False
+
+def write_if_changed(output_path, content):
+    """Write content only if it differs from what is on disk, leaving the mtime untouched otherwise."""
+    with AtomicWriter(output_path) as f:
+        f.write(content)
+    return f.changed
+
+def atomic_write(output_path, content):
+    with AtomicWriter(output_path, only_if_changed=False) as f:
+        f.write(content)
+
+def write_typescript_schema(optimizers, out, bundled=True):
+    """Write the schema types and SCHEDULER_OPTIONS, plus the whole catalog as OPTIMIZER_SCHEMAS if bundled.
+
+    Without bundled the UI loads the catalog from the JSON files of generate_json_schema, so the page bundle doesn't
+    grow with every optimizer.
+    """
+    out.write("""
 export interface OptimizerArgDef {
     name: string;
     label: string;
-    type: 'float' | 'int' | 'bool' | 'string' | 'enum';
+    type: 'float' | 'int' | 'bool' | 'string' | 'enum' | 'dict';
     default: any;
     min?: number;
     max?: number;
+    exclusiveMin?: boolean; // min itself is invalid
+    exclusiveMax?: boolean; // max itself is invalid
     step?: number;
-    options?: string[]; // For enum
+    options?: string[]; // For enum, and the values of a dict
+    keys?: string[]; // For dict: the keys it may set
+    kwarg?: string; // Constructor keyword the arg is passed as, when it differs from name
     description?: string;
     visible?: boolean; // Defaults to true
 }
 
+export interface OptimizerStateTerm {
+    key: string;
+    size: 'numel' | 'rows' | 'cols' | 'gram' | 'one' | 'projector';
+    dtype: string; // 'param', 'grad' (param dtype upcast to fp32) or an explicit dtype name
+    dtypeArg?: string; // Dtype arg the state is kept in when set, dtype is the default
+    upcastAtLeast?: [string, number]; // 16-bit dtypes are upcast to fp32 when this numeric arg is at least this value
+    when?: string | string[]; // Boolean arg(s) that must be enabled for this state to exist
+    unless?: string; // Boolean arg that must be disabled for this state to exist
+    atLeast?: [string, number]; // Numeric arg that must be at least this value for this state to exist
+    numelAtLeast?: string; // Numeric arg, the state only exists for params with at least that many elements
+    equals?: [string, any]; // Arg that must be set to this value (e.g. an enum option) for this state to exist
+    paramDtypes?: string[]; // The state only exists for params of one of these dtypes
+    minNdim?: number;
+    maxNdim?: number;
+    projectable?: boolean; // Sized by the low-rank projected shape for params with projected state
+    projected?: boolean; // The state only exists for params with projected state
+}
+
 export interface OptimizerDef {
     id: string;
     name: string;
     args: OptimizerArgDef[];
+    stateCost?: OptimizerStateTerm[]; // Per-parameter state layout, see optimizer_memory.py
 }
 
-export const OPTIMIZER_SCHEMAS: OptimizerDef[] = [
-"""
-    
-    # Add standard fallbacks manually
-    standard_optimizers = [
-        {
-            'id': 'AdamW',
-            'name': 'AdamW',
-            'args': [
-                {'name': 'weight_decay', 'label': 'Weight Decay', 'type': 'float', 'default': 0.01, 'step': 0.001},
-                {'name': 'beta1', 'label': 'Beta 1', 'type': 'float', 'default': 0.9, 'step': 0.01, 'max': 1.0},
-                {'name': 'beta2', 'label': 'Beta 2', 'type': 'float', 'default': 0.999, 'step': 0.001, 'max': 1.0},
-                {'name': 'epsilon', 'label': 'Epsilon', 'type': 'float', 'default': 1e-8, 'step': 1e-9},
-            ]
-        },
-        {
-            'id': 'AdamW8bit',
-            'name': 'AdamW 8-bit',
-            'args': [
-                {'name': 'weight_decay', 'label': 'Weight Decay', 'type': 'float', 'default': 0.01, 'step': 0.001},
-                {'name': 'beta1', 'label': 'Beta 1', 'type': 'float', 'default': 0.9, 'step': 0.01, 'max': 1.0},
-                {'name': 'beta2', 'label': 'Beta 2', 'type': 'float', 'default': 0.999, 'step': 0.001, 'max': 1.0},
-                {'name': 'epsilon', 'label': 'Epsilon', 'type': 'float', 'default': 1e-8, 'step': 1e-9},
-            ]
-        },
-         {
-            'id': 'Adafactor',
-            'name': 'Adafactor',
-            'args': [
-                {'name': 'scale_parameter', 'label': 'Scale Parameter', 'type': 'bool', 'default': True},
-                {'name': 'relative_step', 'label': 'Relative Step', 'type': 'bool', 'default': True},
-                {'name': 'warmup_init', 'label': 'Warmup Init', 'type': 'bool', 'default': True},
-            ]
-        },
-        {
-            'id': 'Prodigy',
-            'name': 'Prodigy',
-            'args': [
-                {'name': 'weight_decay', 'label': 'Weight Decay', 'type': 'float', 'default': 0.0, 'step': 0.01},
-                {'name': 'decouple', 'label': 'Decouple', 'type': 'bool', 'default': True},
-                {'name': 'use_bias_correction', 'label': 'Bias Correction', 'type': 'bool', 'default': True},
-                {'name': 'safeguard_warmup', 'label': 'Safeguard Warmup', 'type': 'bool', 'default': True},
-                {'name': 'd_coef', 'label': 'D Coefficient', 'type': 'float', 'default': 1.0, 'step': 0.1},
-            ]
-        }
-    ]
-    
-    optimizers.extend(standard_optimizers)
+""")
+    if bundled:
+        write_bundled_schemas(optimizers, out)
+
+    out.write("""export const SCHEDULER_OPTIONS = [
+    { value: 'cosine', label: 'Cosine' },
+    { value: 'cosine_with_restarts', label: 'Cosine with Restarts' },
+    { value: 'linear', label: 'Linear' },
+    { value: 'polynomial', label: 'Polynomial' },
+    { value: 'constant', label: 'Constant' },
+    { value: 'constant_with_warmup', label: 'Constant with Warmup' },
+    { value: 'adafactor', label: 'Adafactor' },
+];
+""")
 
-    for opt in optimizers:
-        ts_content += "    {\n"
-        ts_content += f"        id: '{opt['id']}',\n"
-        ts_content += f"        name: '{opt['name']}',\n"
-        ts_content += "        args: [\n"
+def write_bundled_schemas(optimizers, out):
+    out.write("export const OPTIMIZER_SCHEMAS: OptimizerDef[] = [\n")
+    for opt in with_standard_optimizers(optimizers):
+        out.write("    {\n")
+        out.write(f"        id: '{opt['id']}',\n")
+        out.write(f"        name: '{opt['name']}',\n")
+        out.write("        args: [\n")
         for arg in opt['args']:
-            ts_content += "            { "
-            ts_content += f"name: '{arg['name']}', "
-            ts_content += f"label: '{arg['label']}', "
-            ts_content += f"type: '{arg['type']}', "
+            out.write("            { ")
+            out.write(f"name: '{arg['name']}', ")
+            out.write(f"label: '{arg['label']}', ")
+            out.write(f"type: '{arg['type']}', ")
             
             # Handle default value formatting
             default_val = arg['default']
@@ -240,38 +571,511 @@ export const OPTIMIZER_SCHEMAS: OptimizerDef[] = [
             else:
                 default_str = str(default_val)
             
-            ts_content += f"default: {default_str}"
+            out.write(f"default: {default_str}")
             
             if 'step' in arg:
-                ts_content += f", step: {arg['step']}"
+                out.write(f", step: {arg['step']}")
+            if 'min' in arg:
+                out.write(f", min: {arg['min']}")
             if 'max' in arg:
-                ts_content += f", max: {arg['max']}"
+                out.write(f", max: {arg['max']}")
+            for key in ('exclusiveMin', 'exclusiveMax'):
+                if arg.get(key):
+                    out.write(f", {key}: true")
             if 'options' in arg:
                 options_str = "[" + ", ".join([f"'{o}'" for o in arg['options']]) + "]"
-                ts_content += f", options: {options_str}"
+                out.write(f", options: {options_str}")
+            if 'keys' in arg:
+                keys_str = "[" + ", ".join([f"'{k}'" for k in arg['keys']]) + "]"
+                out.write(f", keys: {keys_str}")
                 
-            ts_content += " },\n"
-        ts_content += "        ]\n"
-        ts_content += "    },\n"
+            out.write(" },\n")
+        out.write("        ],\n")
 
-    # Add standard fallbacks manually if needed, or rely on parsing
-    ts_content += "];\n\n"
-    
-    ts_content += """export const SCHEDULER_OPTIONS = [
-    { value: 'cosine', label: 'Cosine' },
-    { value: 'cosine_with_restarts', label: 'Cosine with Restarts' },
-    { value: 'linear', label: 'Linear' },
-    { value: 'polynomial', label: 'Polynomial' },
-    { value: 'constant', label: 'Constant' },
-    { value: 'constant_with_warmup', label: 'Constant with Warmup' },
-    { value: 'adafactor', label: 'Adafactor' },
-];
+        state_cost = state_cost_terms(opt['id'])
+        if state_cost:
+            out.write("        stateCost: [\n")
+            for term in state_cost:
+                out.write("            { " + ", ".join(
+                    f"{k}: '{v}'" if isinstance(v, str) else f"{k}: {str(v).lower()}" if isinstance(v, bool)
+                    else f"{k}: {v}" for k, v in term.items()
+                ) + " },\n")
+            out.write("        ],\n")
+
+        out.write("    },\n")
+
+    out.write("];\n\n")
+
+def render_typescript_schema(optimizers):
+    out = io.StringIO()
+    write_typescript_schema(optimizers, out)
+    return out.getvalue()
+
+def generate_typescript_schema(optimizers, output_path, bundled=True):
+    with AtomicWriter(output_path) as out:
+        write_typescript_schema(optimizers, out, bundled=bundled)
+    return out.changed
+
+def generate_json_schema(optimizers, output_dir):
+    """Write one JSON file per optimizer plus a small index.json, for the UI to load on demand.
+
+    The index only carries id, name, arg count and a content hash, so its size barely grows with the catalog.
+    Returns whether anything on disk changed.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    changed = False
+    written = {'index.json'}
+
+    with AtomicWriter(os.path.join(output_dir, 'index.json')) as index:
+        index.write('[\n')
+        for i, opt in enumerate(with_standard_optimizers(optimizers)):
+            definition = {'id': opt['id'], 'name': opt['name'], 'args': opt['args']}
+            state_cost = state_cost_terms(opt['id'])
+            if state_cost:
+                definition['stateCost'] = state_cost
+            body = json.dumps(definition) + '\n'
+
+            filename = f"{opt['id']}.json"
+            written.add(filename)
+            with AtomicWriter(os.path.join(output_dir, filename)) as f:
+                f.write(body)
+            changed |= f.changed
+
+            entry = {
+                'id': opt['id'],
+                'name': opt['name'],
+                'argCount': len(opt['args']),
+                'hash': hashlib.sha256(body.encode('utf-8')).hexdigest()[:12],
+            }
+            index.write((',\n' if i else '') + json.dumps(entry))
+        index.write('\n]\n')
+    changed |= index.changed
+
+    # Remove files of optimizers that are gone
+    for filename in os.listdir(output_dir):
+        if filename.endswith('.json') and filename not in written:
+            os.unlink(os.path.join(output_dir, filename))
+            changed = True
+
+    return changed
+
+VALIDATORS_PREAMBLE = '''"""Validators and coercers of optimizer args. Generated by generate_schema.py from the optimizer schema, do not edit.
+
+``validate_optimizer_args`` checks a config like the optimizer constructors would (types, bounds, enum options, unknown
+names) and turns it into constructor kwargs: beta1/beta2/beta3 become a ``betas`` tuple, args with a ``kwarg`` in the
+schema are renamed to it (AdamW's epsilon is passed as eps), numeric strings become numbers and dtype names lose any
+``torch.`` prefix. It imports neither torch nor the optimizers, so a queue of sweep configs can be checked at
+submission time instead of failing after the job has loaded the model::
+
+    kwargs = validate_optimizer_args('CAME', {'lr': '1e-4', 'beta1': 0.9, 'update_strategy': 'grams'})
+    optimizer = create_optimizer('CAME', model.parameters(), **kwargs)
+
+Args that are left out are left out of the kwargs too, so constructor defaults apply. A missing beta is filled in with
+its schema default, as ``betas`` is only passed whole.
 """
 
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(ts_content)
+import math
+
+
+class OptimizerConfigError(ValueError):
+    """All problems found in one optimizer config, in ``errors``."""
+
+    def __init__(self, optimizer_id, errors):
+        super().__init__(f"Invalid {optimizer_id} config: " + '; '.join(errors))
+        self.optimizer_id = optimizer_id
+        self.errors = errors
+
+
+def _number(args, name, kind, errors, low=None, high=None, low_exclusive=False, high_exclusive=False, nullable=False):
+    value = args[name]
+    if value is None and nullable:
+        return None
+    if isinstance(value, str):
+        try:
+            value = kind(value.strip())
+        except ValueError:
+            errors.append(f"{name}: {value!r} is not a valid {kind.__name__}")
+            return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        errors.append(f"{name}: expected {kind.__name__}, got {type(value).__name__}")
+        return None
+
+    if kind is int:
+        if isinstance(value, float) and not value.is_integer():
+            errors.append(f"{name}: expected int, got {value!r}")
+            return None
+        value = int(value)
+    else:
+        value = float(value)
+        if not math.isfinite(value):
+            errors.append(f"{name}: {value} is not finite")
+            return None
+
+    if low is not None and (value <= low if low_exclusive else value < low):
+        errors.append(f"{name}: {value} must be {'>' if low_exclusive else '>='} {low}")
+    elif high is not None and (value >= high if high_exclusive else value > high):
+        errors.append(f"{name}: {value} must be {'<' if high_exclusive else '<='} {high}")
+    return value
+
+
+def _bool(args, name, errors, nullable=False):
+    value = args[name]
+    if value is None and nullable or isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ('true', 'false'):
+        return value.strip().lower() == 'true'
+    errors.append(f"{name}: expected bool, got {value!r}")
+    return None
+
+
+def _string(args, name, errors, nullable=False):
+    value = args[name]
+    if value is None and nullable or isinstance(value, str):
+        return value
+    errors.append(f"{name}: expected str, got {type(value).__name__}")
+    return None
+
+
+def _choice(args, name, options, errors, nullable=False, dtype=False):
+    value = args[name]
+    if value is None and nullable:
+        return None
+    if isinstance(value, str):
+        # Like the constructors, accept dtypes written as 'torch.bfloat16'
+        value = value.strip().split('.')[-1] if dtype else value.strip()
+        if value in options:
+            return value
+    errors.append(f"{name}: {value!r} is not one of {list(options)}")
+    return None
+
+
+_DTYPE_ALIASES = {'fp32': 'float32', 'bf16': 'bfloat16', 'fp16': 'float16'}
+
+
+def _mapping(args, name, keys, options, errors, nullable=False, dtype=False):
+    value = args[name]
+    if value is None and nullable:
+        return None
+    if not isinstance(value, dict):
+        errors.append(f"{name}: expected dict, got {type(value).__name__}")
+        return None
+
+    mapping = {}
+    for key, item in value.items():
+        if key not in keys:
+            errors.append(f"{name}: {key!r} is not one of {list(keys)}")
+            continue
+        if dtype:
+            # Like the constructors, accept torch dtypes, 'torch.bfloat16' and short names like 'bf16'
+            item = str(item).strip().split('.')[-1]
+            item = _DTYPE_ALIASES.get(item, item)
+        if item not in options:
+            errors.append(f"{name}: {key}={item!r} is not one of {list(options)}")
+            continue
+        mapping[key] = item
+    return mapping
+
+
+def _unknown(args, known, kwargs, errors, strict):
+    for name in sorted(args.keys() - known):
+        if strict:
+            errors.append(f"{name}: unknown argument")
+        else:
+            kwargs[name] = args[name]
+'''
+
+VALIDATORS_API = '''
+
+OPTIMIZER_IDS = tuple(_VALIDATORS)
+
+
+def validate_optimizer_args(optimizer_id, args, strict=True):
+    """Check one config and return it as constructor kwargs, raising OptimizerConfigError with every problem found.
+
+    With strict=False, args missing from the schema (e.g. an lr passed to a standard optimizer) are passed through
+    unchecked instead of being rejected.
+    """
+    if optimizer_id not in _VALIDATORS:
+        raise KeyError(f"Unknown optimizer: {optimizer_id}")
+    kwargs, errors = _VALIDATORS[optimizer_id](args, strict)
+    if errors:
+        raise OptimizerConfigError(optimizer_id, errors)
+    return kwargs
+
+
+def validate_configs(configs, strict=True):
+    """Check many (optimizer_id, args) pairs. Returns {index: errors} of the invalid ones, empty if all are valid."""
+    invalid = {}
+    for index, (optimizer_id, args) in enumerate(configs):
+        validate = _VALIDATORS.get(optimizer_id)
+        if validate is None:
+            invalid[index] = [f"unknown optimizer: {optimizer_id}"]
+            continue
+        errors = validate(args, strict)[1]
+        if errors:
+            invalid[index] = errors
+    return invalid
+
+
+def create_validated_optimizer(optimizer_id, params, args, strict=True):
+    """Validate a config, then construct the optimizer through optimizer_registry."""
+    from .optimizer_registry import create_optimizer
+
+    return create_optimizer(optimizer_id, params, **validate_optimizer_args(optimizer_id, args, strict=strict))
+'''
+
+
+def python_identifier(name):
+    identifier = re.sub(r'\W', '_', name)
+    return '_' + identifier if identifier[:1].isdigit() else identifier
+
+def python_arg_check(arg):
+    """Expression that validates and coerces args[arg['name']], appending to `errors`."""
+    name = arg['name']
+    options = {'nullable': True} if arg['default'] is None else {}
+
+    if arg['type'] in ('float', 'int'):
+        bounds = {
+            'low': arg.get('min'),
+            'high': arg.get('max'),
+            'low_exclusive': arg.get('exclusiveMin'),
+            'high_exclusive': arg.get('exclusiveMax'),
+        }
+        options = {**{k: v for k, v in bounds.items() if v is not None and v is not False}, **options}
+        call = f"_number(args, {name!r}, {arg['type']}, errors"
+    elif arg['type'] == 'bool':
+        call = f"_bool(args, {name!r}, errors"
+    elif arg['type'] == 'enum':
+        if name.endswith('_dtype'):
+            options['dtype'] = True
+        call = f"_choice(args, {name!r}, {tuple(arg.get('options', ()))!r}, errors"
+    elif arg['type'] == 'dict':
+        if name.endswith('_dtypes'):
+            options['dtype'] = True
+        call = f"_mapping(args, {name!r}, {tuple(arg.get('keys', ()))!r}, {tuple(arg.get('options', ()))!r}, errors"
+    else:
+        call = f"_string(args, {name!r}, errors"
+    return call + ''.join(f", {k}={v!r}" for k, v in options.items()) + ')'
+
+def write_python_validators(optimizers, out):
+    out.write(VALIDATORS_PREAMBLE)
+    functions = {}
+
+    for opt in with_standard_optimizers(optimizers):
+        identifier = python_identifier(opt['id'])
+        function = f"_validate_{identifier}"
+        known = f"_{identifier.upper()}_ARGS"
+        functions[opt['id']] = function
+        args = opt['args']
+        betas = [arg for arg in args if re.fullmatch(r'beta\d+', arg['name'])]
+
+        out.write(f"\n\n{known} = frozenset({sorted(arg['name'] for arg in args)!r})\n")
+        out.write(f"\n\ndef {function}(args, strict):\n")
+        out.write("    errors = []\n")
+        out.write("    kwargs = {}\n")
+        for arg in args:
+            if arg in betas:
+                continue
+            out.write(f"    if {arg['name']!r} in args:\n")
+            out.write(f"        kwargs[{arg.get('kwarg', arg['name'])!r}] = {python_arg_check(arg)}\n")
+        if betas:
+            # betas is only passed whole, so a missing beta takes its default
+            out.write("    if " + ' or '.join(f"{beta['name']!r} in args" for beta in betas) + ":\n")
+            out.write("        kwargs['betas'] = (\n")
+            for beta in betas:
+                out.write(f"            {python_arg_check(beta)} if {beta['name']!r} in args else {beta['default']!r},\n")
+            out.write("        )\n")
+        out.write(f"    _unknown(args, {known}, kwargs, errors, strict)\n")
+        out.write("    return kwargs, errors\n")
+
+    out.write("\n\n_VALIDATORS = {\n")
+    for optimizer_id, function in functions.items():
+        out.write(f"    {optimizer_id!r}: {function},\n")
+    out.write("}\n")
+    out.write(VALIDATORS_API)
+
+def render_python_validators(optimizers):
+    out = io.StringIO()
+    write_python_validators(optimizers, out)
+    return out.getvalue()
+
+def generate_python_validators(optimizers, output_path):
+    with AtomicWriter(output_path) as out:
+        write_python_validators(optimizers, out)
+    return out.changed
+
+SKIP_DIRS = {'__pycache__', 'node_modules', 'build', 'dist'}
+
+def resolve_source(spec):
+    """Turn a --source argument (directory, file or importable package name) into a path, without importing it."""
+    if os.path.exists(spec):
+        return os.path.abspath(spec)
+    module_spec = importlib.util.find_spec(spec)
+    if module_spec is None:
+        raise SystemExit(f"Source not found: {spec}")
+    if module_spec.submodule_search_locations:
+        return os.path.abspath(list(module_spec.submodule_search_locations)[0])
+    return os.path.abspath(module_spec.origin)
+
+def is_optimizer_source(path, source):
+    """Whether path belongs to a (root, recursive) source. Non-recursive sources only pick up ref_opt_*.py files."""
+    root, recursive = source
+    filename = os.path.basename(path)
+    if not filename.endswith('.py'):
+        return False
+    if os.path.isfile(root):
+        return path == root
+    if not recursive:
+        return os.path.dirname(path) == root and filename.startswith('ref_opt_')
+    return os.path.commonpath([root, path]) == root
+
+def discover_optimizer_files(source):
+    root, recursive = source
+    if os.path.isfile(root):
+        return [root]
+    if not recursive:
+        return sorted(os.path.join(root, f) for f in os.listdir(root) if is_optimizer_source(os.path.join(root, f), source))
+
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS and not d.startswith('.'))
+        files.extend(os.path.join(dirpath, f) for f in sorted(filenames) if f.endswith('.py'))
+    return files
+
+def discover_all(sources):
+    """All source files in priority order (earlier sources win on duplicate class names), without duplicates."""
+    files = []
+    seen = set()
+    for source in sources:
+        for path in discover_optimizer_files(source):
+            if path not in seen:
+                seen.add(path)
+                files.append(path)
+    return files
+
+def start_polling_watcher(sources, on_change, poll_interval):
+    def snapshot():
+        result = {}
+        for path in discover_all(sources):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            result[path] = (st.st_mtime_ns, st.st_size)
+        return result
+
+    stop_event = threading.Event()
+
+    def run():
+        previous = snapshot()
+        while not stop_event.wait(poll_interval):
+            current = snapshot()
+            for path in previous.keys() | current.keys():
+                if previous.get(path) != current.get(path):
+                    on_change(path)
+            previous = current
+
+    threading.Thread(target=run, name='schema-poller', daemon=True).start()
+    return stop_event.set
+
+def start_watcher(sources, on_change, poll_interval=0.5, force_poll=False):
+    """Watch the sources for optimizer file changes. Uses inotify (through watchdog) when available, polling otherwise.
+
+    Returns a callable that stops the watcher.
+    """
+    if not force_poll:
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            Observer = None
+
+        if Observer is not None:
+            class Handler(FileSystemEventHandler):
+                def on_any_event(self, event):
+                    # Ignore opened/closed events, including the ones caused by our own reads
+                    if event.is_directory or event.event_type not in {'created', 'modified', 'deleted', 'moved'}:
+                        return
+                    for path in (event.src_path, getattr(event, 'dest_path', '')):
+                        path = os.path.abspath(path) if path else ''
+                        if path and any(is_optimizer_source(path, source) for source in sources):
+                            on_change(path)
+
+            observer = Observer()
+            for root, recursive in sources:
+                watch_dir = os.path.dirname(root) if os.path.isfile(root) else root
+                observer.schedule(Handler(), watch_dir, recursive=recursive and not os.path.isfile(root))
+            try:
+                observer.start()
+            except OSError as e: # e.g. inotify watch limit reached
+                print(f"File system events unavailable ({e}), falling back to polling.")
+            else:
+                print(f"Watching {len(sources)} source(s) with {type(observer).__name__}.")
+                return observer.stop
+
+    print(f"Watching {len(sources)} source(s) by polling every {poll_interval}s.")
+    return start_polling_watcher(sources, on_change, poll_interval)
+
+def collect_classes(files, parsed):
+    return [cls for path in files if path in parsed for cls in parsed[path]]
+
+def watch(sources, emit, cache_path, debounce=0.25, poll_interval=0.5, force_poll=False, workers=None):
+    cache = load_cache(cache_path)
+    files = discover_all(sources)
+    parsed, _ = parse_files(files, cache, workers=workers)
+    save_cache(cache_path, cache)
+    emit(resolve_optimizers(collect_classes(files, parsed)))
+
+    events = queue.Queue()
+    stop = start_watcher(sources, events.put, poll_interval=poll_interval, force_poll=force_poll)
+
+    try:
+        while True:
+            # Wait for the first change, then keep collecting until saves go quiet for `debounce` seconds
+            changed = {events.get()}
+            while True:
+                try:
+                    changed.add(events.get(timeout=debounce))
+                except queue.Empty:
+                    break
+
+            start = time.perf_counter()
+            for path in sorted(changed):
+                if not os.path.exists(path):
+                    parsed.pop(path, None)
+                    cache.pop(os.path.abspath(path), None)
+                    continue
+                try:
+                    parsed[path], _ = parse_module_classes_cached(path, cache)
+                except SyntaxError as e:
+                    # Most likely a save in the middle of an edit, keep the last good result
+                    print(f"Skipping {os.path.basename(path)}: {e}")
+
+            files = discover_all(sources)
+            save_cache(cache_path, cache)
+            wrote = emit(resolve_optimizers(collect_classes(files, parsed)))
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            names = ', '.join(os.path.basename(p) for p in sorted(changed))
+            print(f"{'Regenerated' if wrote else 'Unchanged'} after {names} in {elapsed_ms:.1f} ms")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop()
 
 def main():
+    parser = argparse.ArgumentParser(description='Generate web/lib/optimizer-schema.ts and optimizer_validators.py from ref_opt_*.py files.')
+    parser.add_argument('--source', action='append', default=[],
+                        help='extra directory, file or installed package (e.g. pytorch_optimizer) to scan recursively; repeatable')
+    parser.add_argument('--format', choices=['ts', 'json'], default='json',
+                        help="'json' writes an index plus one file per optimizer for on-demand loading and only the types to web/lib/optimizer-schema.ts, "
+                             "'ts' bundles the whole catalog into web/lib/optimizer-schema.ts")
+    parser.add_argument('--workers', type=int, default=None, help='parser processes for uncached files (default: CPU count)')
+    parser.add_argument('--watch', action='store_true', help='regenerate whenever an optimizer file changes')
+    parser.add_argument('--poll', action='store_true', help='poll for changes instead of using file system events')
+    parser.add_argument('--poll-interval', type=float, default=0.5, help='seconds between polls (default: 0.5)')
+    parser.add_argument('--debounce', type=float, default=0.25, help='seconds of quiet before regenerating (default: 0.25)')
+    cli_args = parser.parse_args()
+
     root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # Assuming scripts/generate_schema.py
     # Adjust root_dir to be the project root d:\Projects\trainer_ui\kuro_trainer
     # If this script is written to d:\Projects\trainer_ui\kuro_trainer\scripts\generate_schema.py
@@ -280,16 +1084,63 @@ def main():
     # However, I will write it to the root for simplicity in running: generate_schema.py
     root_dir = os.getcwd()
     
-    files = [f for f in os.listdir(root_dir) if f.startswith('ref_opt_') and f.endswith('.py')]
-    
-    all_optimizers = []
-    for f in files:
-        print(f"Parsing {f}...")
-        all_optimizers.extend(parse_optimizer_file(os.path.join(root_dir, f)))
-        
-    output_path = os.path.join(root_dir, 'web', 'lib', 'optimizer-schema.ts')
-    print(f"Generating schema to {output_path}...")
-    generate_typescript_schema(all_optimizers, output_path)
+    cache_path = os.path.join(root_dir, CACHE_FILENAME)
+    ts_path = os.path.join(root_dir, 'web', 'lib', 'optimizer-schema.ts')
+    if cli_args.format == 'json':
+        json_dir = os.path.join(root_dir, 'web', 'public', 'optimizers')
+        output_path = f"{json_dir}, {ts_path}"
+        write_schema = lambda optimizers: (generate_json_schema(optimizers, json_dir)
+                                           | generate_typescript_schema(optimizers, ts_path, bundled=False))
+    else:
+        output_path = ts_path
+        write_schema = lambda optimizers: generate_typescript_schema(optimizers, ts_path)
+    validators_path = os.path.join(root_dir, 'optimizer_validators.py')
+    # The backend validates submitted configs against the same schema the UI is built from
+    emit = lambda optimizers: write_schema(optimizers) | generate_python_validators(optimizers, validators_path)
+
+    # The local ref_opt_*.py files come first, so they win over same-named classes from other sources
+    sources = [(root_dir, False)] + [(resolve_source(spec), True) for spec in cli_args.source]
+
+    if cli_args.watch:
+        watch(sources, emit, cache_path, debounce=cli_args.debounce,
+              poll_interval=cli_args.poll_interval, force_poll=cli_args.poll, workers=cli_args.workers)
+        return
+
+    timings = {}
+    start = time.perf_counter()
+    files = discover_all(sources)
+    timings['discover'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cache = load_cache(cache_path)
+    parsed, misses = parse_files(files, cache, workers=cli_args.workers)
+    # Drop entries for files that no longer exist
+    live = {os.path.abspath(path) for path in files}
+    cache = {k: v for k, v in cache.items() if k in live}
+    save_cache(cache_path, cache)
+    timings['parse'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    all_optimizers = resolve_optimizers(collect_classes(files, parsed))
+    timings['resolve'] = time.perf_counter() - start
+
+    # Optimizers are created by id through the registry, so every id the UI can submit must resolve to a class
+    local_names = {cls['name'] for path in files if is_optimizer_source(path, sources[0]) for cls in parsed.get(path, [])}
+    problems = registry_problems(all_optimizers, local_names)
+    if problems:
+        raise SystemExit("optimizer_registry.py is out of sync with the schema:\n  " + '\n  '.join(problems))
+
+    start = time.perf_counter()
+    wrote = emit(all_optimizers)
+    timings['render'] = time.perf_counter() - start
+
+    print(f"Found {len(all_optimizers)} optimizers in {len(files)} files ({misses} parsed, {len(files) - misses} cached).")
+    print("Timing: " + ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in timings.items())
+          + f", total {sum(timings.values()) * 1000:.1f} ms")
+    if wrote:
+        print(f"Generated schema to {output_path} and {validators_path}.")
+    else:
+        print(f"Schema unchanged, not touching {output_path} or {validators_path}.")
     print("Done.")
 
 if __name__ == '__main__':
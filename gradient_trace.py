@@ -0,0 +1,249 @@
+"""Record per-step gradients of a real run and replay them through optimizers without a model.
+
+A trace is a directory holding ``trace.json`` (param names, shapes, dtype), ``params.bin`` (the fp32 params at the
+start of recording) and ``grads.bin``, one flat block of gradients per recorded step. ``grads.bin`` is memory-mapped
+on replay, so traces larger than RAM replay at disk speed. ``trace.json`` is rewritten every ``flush_every`` recorded
+steps and lists how many steps it covers, so a trace cut short by a crash is still readable up to its last flush.
+
+Recording::
+
+    recorder = GradientRecorder('traces/run1', model.named_parameters(), dtype=torch.bfloat16, every=2)
+    ...
+    loss.backward()
+    recorder.record()
+    optimizer.step()
+    ...
+    recorder.close()
+
+Replaying, with the first variant as the baseline the others are compared against::
+
+    python -m <package>.gradient_trace traces/run1 --variant base=AdaBelief --variant factored='AdaBelief:{"factored": true}'
+"""
+
+import argparse
+import json
+import os
+import time
+
+import torch
+
+from .optimizer_registry import create_optimizer
+
+TRACE_VERSION = 1
+
+
+class GradientRecorder:
+    r"""Append the gradients of a set of parameters to a trace.
+
+    :param path: str. trace directory, created if needed. an existing trace in it is overwritten.
+    :param named_parameters: iterable of (name, param), e.g. model.named_parameters().
+    :param dtype: torch.dtype. storage dtype of the gradients, bfloat16 halves the trace size.
+    :param every: int. only record every every-th call to record(), to downsample long runs.
+    :param flush_every: int. flush the gradients and rewrite trace.json every this many recorded steps, which bounds
+        the steps a crashed run loses.
+    """
+
+    def __init__(self, path: str, named_parameters, dtype: torch.dtype = torch.float32, every: int = 1,
+                 flush_every: int = 100):
+        self.path = path
+        self.dtype = dtype
+        self.every = every
+        self.flush_every = flush_every
+
+        named_parameters = [(name, p) for name, p in named_parameters if p.requires_grad]
+        self.params = [p for _, p in named_parameters]
+        self._calls = 0
+        self._missing = {}
+
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'params.bin'), 'wb') as f:
+            for p in self.params:
+                f.write(_tensor_bytes(p.detach().to(device='cpu', dtype=torch.float32)))
+
+        self._meta = {
+            'version': TRACE_VERSION,
+            'dtype': str(dtype).split('.')[-1],
+            'every': every,
+            'names': [name for name, _ in named_parameters],
+            'shapes': [list(p.shape) for p in self.params],
+            'missing': self._missing,
+            'steps': 0,
+        }
+        self._write_meta()
+        self._file = open(os.path.join(path, 'grads.bin'), 'wb')
+        self.steps = 0
+
+    def record(self):
+        r"""Append the current .grad of every parameter. Missing gradients are stored as zeros and flagged."""
+        self._calls += 1
+        if (self._calls - 1) % self.every:
+            return
+
+        for i, p in enumerate(self.params):
+            grad = p.grad
+            if grad is None:
+                self._missing.setdefault(str(self.steps), []).append(i)
+                grad = torch.zeros_like(p)
+            elif grad.is_sparse:
+                grad = grad.to_dense()
+            self._file.write(_tensor_bytes(grad.detach().to(device='cpu', dtype=self.dtype)))
+        self.steps += 1
+        if self.steps % self.flush_every == 0:
+            self.flush()
+
+    def flush(self):
+        r"""Make the steps recorded so far, and which of their gradients were missing, readable from disk."""
+        # Gradients first, trace.json must never cover steps that aren't written yet
+        self._file.flush()
+        self._meta['steps'] = self.steps
+        self._write_meta()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def _write_meta(self):
+        tmp_path = os.path.join(self.path, 'trace.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self._meta, f)
+        os.replace(tmp_path, os.path.join(self.path, 'trace.json'))
+
+
+def _tensor_bytes(tensor: torch.Tensor) -> bytes:
+    tensor = tensor.contiguous()
+    if tensor.dtype in {torch.bfloat16, torch.float16}:
+        # numpy has no bfloat16, the bits are the same
+        tensor = tensor.view(torch.int16)
+    return tensor.numpy().tobytes()
+
+
+class GradientTrace:
+    r"""Read side of a trace: initial params and memory-mapped per-step gradients."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, 'trace.json')) as f:
+            meta = json.load(f)
+        if meta['version'] != TRACE_VERSION:
+            raise ValueError(f"Unsupported trace version: {meta['version']}")
+
+        self.names = meta['names']
+        self.shapes = [torch.Size(shape) for shape in meta['shapes']]
+        self.dtype = getattr(torch, meta['dtype'])
+        self.missing = {int(step): set(indices) for step, indices in meta['missing'].items()}
+
+        self.numels = [shape.numel() for shape in self.shapes]
+        step_numel = sum(self.numels)
+
+        grads_path = os.path.join(path, 'grads.bin')
+        element_size = torch.empty((), dtype=self.dtype).element_size()
+        # Steps after the last flush of a crashed run (and a partially written last step) are ignored, trace.json
+        # doesn't know which of their gradients were missing
+        self.steps = os.path.getsize(grads_path) // (step_numel * element_size) if step_numel else 0
+        self.steps = min(self.steps, meta.get('steps', self.steps))
+        self._grads = torch.from_file(grads_path, shared=False, size=self.steps * step_numel, dtype=self.dtype)
+        self._grads = self._grads.view(self.steps, step_numel)
+
+        self._params = torch.from_file(
+            os.path.join(path, 'params.bin'), shared=False, size=step_numel, dtype=torch.float32
+        )
+
+    def initial_params(self, device='cpu', dtype: torch.dtype = torch.float32):
+        return [
+            chunk.view(shape).to(device=device, dtype=dtype, copy=True).requires_grad_()
+            for chunk, shape in zip(self._params.split(self.numels), self.shapes)
+        ]
+
+    def grads(self, step: int):
+        r"""Views of the gradients of a recorded step, None where the param had no gradient."""
+        missing = self.missing.get(step, ())
+        return [
+            None if i in missing else chunk.view(shape)
+            for i, (chunk, shape) in enumerate(zip(self._grads[step].split(self.numels), self.shapes))
+        ]
+
+
+def parse_variant(spec: str):
+    r"""'name=OptimizerId:{json kwargs}' -> (name, optimizer id, kwargs). Name and kwargs are optional."""
+    name = None
+    if '=' in spec.split(':', 1)[0]:
+        name, spec = spec.split('=', 1)
+    optimizer_id, _, kwargs = spec.partition(':')
+    return name or spec, optimizer_id, json.loads(kwargs) if kwargs else {}
+
+
+def replay(trace: GradientTrace, variants, steps: int = None, device='cpu', dtype: torch.dtype = torch.float32,
+           compare_every: int = 10):
+    r"""Step every variant through the trace in lockstep.
+
+    :param variants: list of (name, optimizer id, kwargs). the first one is the baseline.
+    :returns: {name: {'ms_per_step', 'steps_per_s', 'divergence': [(step, relative L2 distance to the baseline)]}}.
+    """
+    steps = min(steps or trace.steps, trace.steps)
+    runs = []
+    for name, optimizer_id, kwargs in variants:
+        params = trace.initial_params(device, dtype)
+        runs.append((name, params, create_optimizer(optimizer_id, params, **kwargs)))
+
+    seconds = {name: 0.0 for name, _, _ in runs}
+    divergence = {name: [] for name, _, _ in runs}
+    sync = torch.cuda.synchronize if torch.device(device).type == 'cuda' else (lambda: None)
+
+    for step in range(steps):
+        grads = trace.grads(step)
+        for name, params, optimizer in runs:
+            for p, grad in zip(params, grads):
+                # Copies, optimizers may modify gradients in place
+                p.grad = None if grad is None else grad.to(device=device, dtype=p.dtype, copy=True)
+            sync()
+            start = time.perf_counter()
+            optimizer.step()
+            sync()
+            seconds[name] += time.perf_counter() - start
+
+        if (step + 1) % compare_every == 0 or step + 1 == steps:
+            _, baseline, _ = runs[0]
+            with torch.no_grad():
+                reference = torch.stack([p.float().pow(2).sum() for p in baseline]).sum().sqrt()
+                for name, params, _ in runs:
+                    distance = torch.stack([(p.float() - b.float()).pow(2).sum() for p, b in zip(params, baseline)])
+                    divergence[name].append((step + 1, (distance.sum().sqrt() / reference.clamp_min(1e-30)).item()))
+
+    return {
+        name: {
+            'ms_per_step': seconds[name] * 1000 / max(steps, 1),
+            'steps_per_s': steps / seconds[name] if seconds[name] else float('inf'),
+            'divergence': divergence[name],
+        }
+        for name, _, _ in runs
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a gradient trace through optimizer variants.")
+    parser.add_argument('trace', help="Trace directory written by GradientRecorder")
+    parser.add_argument('--variant', action='append', required=True,
+                        help="name=OptimizerId:{json kwargs}, repeatable; the first is the baseline")
+    parser.add_argument('--steps', type=int, help="Replay only the first N recorded steps")
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--dtype', default='float32', choices=['float32', 'bfloat16', 'float16'])
+    parser.add_argument('--compare-every', type=int, default=10, help="Steps between divergence measurements")
+    parser.add_argument('--json', action='store_true', help="Print the full results as JSON")
+    args = parser.parse_args()
+
+    trace = GradientTrace(args.trace)
+    variants = [parse_variant(spec) for spec in args.variant]
+    results = replay(trace, variants, args.steps, args.device, getattr(torch, args.dtype), args.compare_every)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{trace.steps} recorded steps, {sum(trace.numels):,} params ({trace.dtype}), replayed on {args.device}")
+    print(f"{'variant':>16}  {'ms/step':>9}  {'steps/s':>9}  {'final div':>10}  {'max div':>10}")
+    for name, result in results.items():
+        values = [d for _, d in result['divergence']] or [0.0]
+        print(f"{name:>16}  {result['ms_per_step']:9.2f}  {result['steps_per_s']:9.1f}  {values[-1]:10.3e}  {max(values):10.3e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Asynchronous optimizer state checkpointing.
+
+``torch.save(optimizer.state_dict(), path)`` blocks training while every state tensor is copied off the device,
+pickled and written. ``AsyncCheckpointer.save`` only copies the state into reusable staging buffers at the step
+boundary (asynchronously for CUDA tensors, into pinned memory) and hands serialization and the write to a background
+thread, so training continues while the file is written.
+
+At most ``max_in_flight`` snapshots are pending at once, each with its own staging buffers. A save that finds all of
+them busy waits for the oldest one (backpressure) instead of allocating more memory, and that wait is reported as
+part of the stall. Files are written to a temp name and renamed, and load with the usual
+``optimizer.load_state_dict(torch.load(path))``.
+"""
+
+import copy
+import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+
+class _StagingSet:
+    r"""Host copies of every state tensor of an optimizer, reused across snapshots."""
+
+    def __init__(self):
+        self.buffers = {}
+        self.event = None
+
+    def stage(self, key, tensor: torch.Tensor) -> torch.Tensor:
+        buffer = self.buffers.get(key)
+        if buffer is None or buffer.shape != tensor.shape or buffer.dtype != tensor.dtype:
+            buffer = torch.empty(tensor.shape, dtype=tensor.dtype, device='cpu', pin_memory=tensor.is_cuda)
+            self.buffers[key] = buffer
+        buffer.copy_(tensor, non_blocking=tensor.is_cuda)
+        return buffer
+
+
+class AsyncCheckpointer:
+    r"""Save optimizer state dicts on a background thread.
+
+    :param optimizer: the optimizer to checkpoint.
+    :param max_in_flight: int. number of snapshots that may be pending at once (and staging buffer sets kept).
+    """
+
+    def __init__(self, optimizer, max_in_flight: int = 1):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be >= 1")
+
+        self.optimizer = optimizer
+        self.max_in_flight = max_in_flight
+
+        self._free = queue.Queue()
+        for _ in range(max_in_flight):
+            self._free.put(_StagingSet())
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='optimizer-checkpoint')
+        self._pending = []
+
+        # Seconds the training loop spent inside save(), per call, and seconds spent writing in the background
+        self.stalls = []
+        self.write_times = []
+
+    def save(self, path: str, extra=None):
+        r"""Snapshot the optimizer state and write it to path in the background. Returns a Future.
+
+        Call it between steps: the snapshot reflects the state at this point, later steps don't affect it. `extra` is
+        stored under 'extra' in the saved dict (e.g. the step or epoch).
+        """
+        start = time.perf_counter()
+
+        # Backpressure: wait for a staging set to come back from the writer
+        staging = self._free.get()
+        self._raise_failed()
+
+        state_dict = self.optimizer.state_dict()
+        snapshot = {
+            'state': {
+                index: {
+                    key: staging.stage((index, key), value) if isinstance(value, torch.Tensor) else copy.deepcopy(value)
+                    for key, value in param_state.items()
+                }
+                for index, param_state in state_dict['state'].items()
+            },
+            'param_groups': copy.deepcopy(state_dict['param_groups']),
+        }
+        # Wrappers add their own entries (e.g. the shard of a ShardedOptimizer)
+        for key, value in state_dict.items():
+            if key not in snapshot:
+                snapshot[key] = copy.deepcopy(value)
+        if extra is not None:
+            snapshot['extra'] = extra
+
+        staging.event = None
+        if torch.cuda.is_available() and any(b.is_pinned() for b in staging.buffers.values()):
+            staging.event = torch.cuda.Event()
+            staging.event.record()
+
+        future = self._writer.submit(self._write, path, snapshot, staging)
+        self._pending.append(future)
+        self.stalls.append(time.perf_counter() - start)
+        return future
+
+    def wait(self):
+        r"""Block until every pending snapshot is written, re-raising the first write error."""
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            self._writer.shutdown()
+
+    def _raise_failed(self):
+        done = [future for future in self._pending if future.done()]
+        self._pending = [future for future in self._pending if not future.done()]
+        for future in done:
+            future.result()
+
+    def _write(self, path: str, snapshot, staging: _StagingSet):
+        start = time.perf_counter()
+        try:
+            if staging.event is not None:
+                staging.event.synchronize()
+
+            tmp_path = f"{path}.tmp"
+            torch.save(snapshot, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            self._free.put(staging)
+            self.write_times.append(time.perf_counter() - start)
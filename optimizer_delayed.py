@@ -0,0 +1,142 @@
+"""One-step-delayed optimizer steps, overlapped with the next forward and backward pass.
+
+Normally ``optimizer.step()`` runs between two backward passes and nothing else happens meanwhile, which hurts most with
+heavy steps such as OCGOpt's Newton-Schulz iteration. ``DelayedStep`` moves the step to a background thread (and a
+side CUDA stream): ``step()`` snapshots the gradients into one half of a double buffer and starts the optimizer on them
+while the training loop runs the next micro-batch. The optimizer updates shadow copies of the params, and its results
+are only written to the model's params at the barrier in the next ``step()`` (or ``flush()``), so forward and backward
+never see a half-written param. Every update is therefore applied one step late: the gradients of step t are computed
+on params that lack the update of step t - 1.
+
+Usage::
+
+    delayed = DelayedStep(optimizer)
+    for batch in loader:
+        loss = model(batch)
+        loss.backward()
+        delayed.step()
+        delayed.zero_grad()
+    delayed.close()  # applies the last update
+
+Clear gradients through ``delayed.zero_grad()`` or the model, ``optimizer.zero_grad()`` would clear the snapshot the
+background step is reading. Call ``flush()`` before evaluating, saving ``optimizer.state_dict()`` or changing the
+param groups; learning rate changes in between take effect on the next step that starts. Plain CPU threads work too
+(torch releases the GIL in its kernels), so the mode can be tested without a GPU, although there the step competes
+with the forward pass for cores.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+
+class DelayedStep:
+    r"""Run an optimizer one step late on a background thread.
+
+    :param optimizer: the optimizer to run. Its param groups are switched to shadow copies of the params, which cost one
+        extra copy of the params in memory.
+
+    `step_times` holds the seconds each background step took, `waits` the seconds step() and flush() blocked on it at the
+    barrier and `stalls` the seconds spent in each step() call, including the snapshot and the param writes.
+    """
+
+    def __init__(self, optimizer):
+        self.optimizer = optimizer
+        self.params = [p for group in optimizer.param_groups for p in group['params']]
+        self.shadows = [p.detach().clone() for p in self.params]
+
+        # The optimizer and its state move over to the shadows, the background step must not write the model's params
+        shadow_of = dict(zip(self.params, self.shadows))
+        for group in optimizer.param_groups:
+            group['params'] = [shadow_of[p] for p in group['params']]
+        for p, shadow in shadow_of.items():
+            if p in optimizer.state:
+                optimizer.state[shadow] = optimizer.state.pop(p)
+
+        self._buffers = ([None] * len(self.params), [None] * len(self.params))
+        self._index = 0
+        self._pending = None
+        self._stream = torch.cuda.Stream() if any(p.is_cuda for p in self.params) else None
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='optimizer-step')
+
+        self.step_times = []
+        self.waits = []
+        self.stalls = []
+
+    @property
+    def overlap_efficiency(self) -> float:
+        r"""Fraction of the background step time that was hidden behind other work, 1.0 means none was waited for."""
+        total = sum(self.step_times)
+        return 1.0 - min(sum(self.waits) / total, 1.0) if total > 0 else 0.0
+
+    def step(self):
+        r"""Snapshot the gradients, apply the previous step's update to the params and start the next step."""
+        start = time.perf_counter()
+
+        # Fill the half of the double buffer the running step isn't reading
+        buffers = self._buffers[self._index]
+        self._index ^= 1
+        for i, p in enumerate(self.params):
+            grad = p.grad
+            if grad is None:
+                buffers[i] = None
+            elif grad.is_sparse:
+                buffers[i] = grad.clone()
+            else:
+                if buffers[i] is None or buffers[i].shape != grad.shape or buffers[i].dtype != grad.dtype:
+                    buffers[i] = torch.empty_like(grad, memory_format=torch.contiguous_format)
+                buffers[i].copy_(grad, non_blocking=True)
+
+        self.flush()
+        for shadow, buffer in zip(self.shadows, buffers):
+            shadow.grad = buffer
+
+        event = None
+        if self._stream is not None:
+            event = torch.cuda.Event()
+            event.record()
+        self._pending = self._worker.submit(self._run, event)
+        self.stalls.append(time.perf_counter() - start)
+
+    @torch.no_grad()
+    def flush(self):
+        r"""Barrier: wait for the running step and write its update to the params."""
+        if self._pending is None:
+            return
+        start = time.perf_counter()
+        pending, self._pending = self._pending, None
+        pending.result()
+        self.waits.append(time.perf_counter() - start)
+
+        for p, shadow in zip(self.params, self.shadows):
+            p.copy_(shadow)
+
+    def zero_grad(self, set_to_none: bool = True):
+        r"""Clear the gradients of the model's params, leaving the snapshot of the running step alone."""
+        for p in self.params:
+            if p.grad is None:
+                continue
+            if set_to_none:
+                p.grad = None
+            else:
+                p.grad.detach_().zero_()
+
+    def close(self):
+        r"""Apply the last update and stop the background thread."""
+        try:
+            self.flush()
+        finally:
+            self._worker.shutdown()
+
+    def _run(self, event):
+        start = time.perf_counter()
+        if self._stream is None:
+            self.optimizer.step()
+        else:
+            with torch.cuda.stream(self._stream):
+                # After the snapshot, and after the params read the shadows at the barrier
+                self._stream.wait_event(event)
+                self.optimizer.step()
+            self._stream.synchronize()
+        self.step_times.append(time.perf_counter() - start)
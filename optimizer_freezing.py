@@ -0,0 +1,151 @@
+"""Automatic freezing of parameters that stopped moving.
+
+Late in a run many layers barely change, yet the optimizer still reads and writes their full state every step.
+``LayerFreezer`` hooks into an optimizer's telemetry path (see optimizer_telemetry) and tracks each parameter's
+relative update size, ``update_rms / param_rms``, as a running max on device. Every ``window`` steps it reads the
+maxima back in one transfer and freezes the parameters that stayed below ``threshold`` for the whole window: their
+``requires_grad`` is dropped, so backward produces no gradient for them and every optimizer skips them. Frozen
+parameters are thawed again after ``reprobe_every`` steps and refrozen at the end of the next window if they are
+still converged.
+
+Usage::
+
+    freezer = LayerFreezer(threshold=1e-5, window=200, reprobe_every=2000, interval=10)
+    freezer.attach(optimizer)  # after OptimizerTelemetry.attach, if both are used
+
+Frozen parameters keep their state and don't receive weight decay. Toggling ``requires_grad`` isn't compatible with
+DistributedDataParallel unless it is built with ``find_unused_parameters=True``, and once every parameter is frozen
+the loss no longer requires grad, so check ``loss.requires_grad`` before calling backward.
+"""
+
+import torch
+
+
+class LayerFreezer:
+    r"""Freeze parameters whose relative updates stay below a threshold, and periodically re-probe them.
+
+    :param threshold: float. a parameter is frozen when update_rms / param_rms stayed below this for a whole window.
+    :param window: int. steps a parameter is measured before it can be frozen, also the interval of the host check.
+    :param reprobe_every: int. steps a parameter stays frozen before it is thawed and measured again. a multiple of
+        window, as frozen parameters are only thawed at the end of a window.
+    :param interval: int. only measure every interval-th step, the optimizers compute the update RMS when measuring.
+    :param eps: float. floor of param_rms, so parameters that are still zero don't divide by zero.
+    """
+
+    def __init__(
+        self, threshold: float = 1e-5, window: int = 200, reprobe_every: int = 2000, interval: int = 10, eps: float = 1e-12
+    ):
+        if threshold <= 0.0:
+            raise ValueError(f"Invalid threshold: {threshold}")
+        if window < 1 or reprobe_every < 1 or interval < 1:
+            raise ValueError("window, reprobe_every and interval must be >= 1")
+        if window % interval != 0:
+            raise ValueError("window must be a multiple of interval")
+        if reprobe_every % window != 0:
+            raise ValueError("reprobe_every must be a multiple of window")
+
+        self.threshold = threshold
+        self.window = window
+        self.reprobe_every = reprobe_every
+        self.interval = interval
+        self.eps = eps
+
+        self.telemetry = None
+        self.active = False
+        self.params = []
+        self.frozen = {}
+        self.frozen_steps = 0
+        self._index = {}
+        self._peak = None
+        self._scale = None
+        self._seen = []
+        self._step = 0
+        self._sampling = False
+
+    def attach(self, optimizer):
+        r"""Start measuring the steps of an optimizer, forwarding to the telemetry it already has."""
+        self.params = [p for group in optimizer.param_groups for p in group['params']]
+        self._index = {p: i for i, p in enumerate(self.params)}
+        self._peak = torch.zeros(len(self.params), dtype=torch.float32, device=self.params[0].device)
+        self._seen = [0] * len(self.params)
+        self._update_scale()
+
+        self.telemetry = getattr(optimizer, 'telemetry', None)
+        optimizer.telemetry = self
+        return self
+
+    def begin_step(self):
+        self._step += 1
+        self._sampling = self._step % self.interval == 0
+        telemetry = self.telemetry
+        if telemetry is not None:
+            telemetry.begin_step()
+        self.active = self._sampling or (telemetry is not None and telemetry.active)
+
+    def record(self, p: torch.Tensor, metric: str, value):
+        telemetry = self.telemetry
+        if telemetry is not None and telemetry.active:
+            telemetry.record(p, metric, value)
+        if not self._sampling or metric != 'update_rms':
+            return
+
+        i = self._index[p]
+        self._seen[i] += 1
+        if not isinstance(value, torch.Tensor):
+            value = torch.tensor(value, dtype=torch.float32)
+        ratio = value.detach().reshape(()).float().to(self._peak.device, non_blocking=True) / self._scale[i]
+        # NaN propagates through maximum, so a window with a non-finite update never freezes
+        torch.maximum(self._peak[i], ratio, out=self._peak[i])
+
+    def end_step(self):
+        if self.telemetry is not None:
+            self.telemetry.end_step()
+        self.active = False
+        self.frozen_steps += len(self.frozen)
+        if self._step % self.window == 0:
+            self._check()
+
+    @property
+    def frozen_fraction(self) -> float:
+        r"""Fraction of the parameter elements that are frozen right now."""
+        total = sum(p.numel() for p in self.params)
+        return sum(p.numel() for p in self.frozen) / max(total, 1)
+
+    def thaw(self):
+        r"""Unfreeze every parameter, e.g. before saving a model or changing the learning rate schedule."""
+        for p in list(self.frozen):
+            self._thaw(p)
+
+    @torch.no_grad()
+    def _check(self):
+        # The only host sync, once per window
+        converged = (self._peak < self.threshold).tolist()
+        samples = self.window // self.interval
+
+        for p, frozen_at in list(self.frozen.items()):
+            if self._step - frozen_at >= self.reprobe_every:
+                self._thaw(p)
+
+        for i, p in enumerate(self.params):
+            if p in self.frozen or not converged[i] or self._seen[i] < samples:
+                continue
+            p.requires_grad_(False)
+            p.grad = None
+            self.frozen[p] = self._step
+
+        self._peak.zero_()
+        self._seen = [0] * len(self.params)
+        self._update_scale()
+
+    def _thaw(self, p: torch.Tensor):
+        del self.frozen[p]
+        p.requires_grad_(True)
+
+    @torch.no_grad()
+    def _update_scale(self):
+        # Param RMS barely changes within a window, so it is measured once per window instead of every step
+        device = self._peak.device
+        self._scale = torch.stack([
+            torch.linalg.vector_norm(p, dtype=torch.float32).div_(max(p.numel(), 1) ** 0.5).to(device)
+            for p in self.params
+        ]).clamp_(min=self.eps)
@@ -0,0 +1,263 @@
+"""Optimizer state memory estimation.
+
+Every optimizer keeps a fixed set of state tensors per parameter, whose sizes
+only depend on the parameter's shape, its dtype and a handful of boolean
+options. Those layouts are described here as plain data (``STATE_COST_FORMULAS``)
+so the same formulas can be evaluated in Python before a job is queued and
+shipped to the frontend through ``generate_schema.py``.
+
+Nothing in this module imports torch; dtypes may be given as ``torch.dtype``
+objects or as their names (``'bfloat16'``, ``'torch.float32'``).
+"""
+
+import math
+
+DTYPE_BYTES = {
+    'float64': 8,
+    'float32': 4,
+    'float16': 2,
+    'bfloat16': 2,
+    'int64': 8,
+    'int32': 4,
+    'uint8': 1,
+    'int8': 1,
+}
+
+# Each term describes one state tensor:
+#   key       - name of the entry in ``optimizer.state[p]``
+#   size      - 'numel' (same shape as the param), 'rows' (shape[:-1]),
+#               'cols' (shape[:-2] + shape[-1:]), 'gram' (min(rows, cols)^2 of the
+#               (shape[0], rest) matrix view, 1 for vectors), 'one' (a single element)
+#               or 'projector' (min(rows, cols) * projection_rank)
+#   dtype     - 'param' (same as the param), 'grad' (the param dtype upcast to
+#               float32 for 16-bit params) or an explicit dtype name. An entry for
+#               the key in the ``state_dtypes`` arg (a state dtype policy) wins
+#   dtype_arg - optional dtype arg the state is kept in when it is set, ``dtype`` is then the default
+#   upcast_at_least - optional (arg, value): 16-bit dtypes are upcast to float32 when the numeric
+#               arg is at least value
+#   when      - optional boolean optimizer arg (or list of args) that must be enabled
+#   unless    - optional boolean optimizer arg that must be disabled
+#   at_least  - optional (arg, value): only allocated when the numeric arg is at least value
+#   equals    - optional (arg, value): only allocated when the arg is set to value (e.g. an enum option)
+#   param_dtypes - optional list of dtype names: only allocated for params of one of these dtypes
+#   numel_at_least - optional numeric arg: only allocated for params with at least that many elements
+#   min_ndim  - optional, only allocated for params with at least this many dims
+#   max_ndim  - optional, only allocated for params with at most this many dims
+#   projectable - optional, for params with low-rank projected state (the ``projection_rank``
+#               arg, see ``projected_shape``) the size is taken from the projected shape
+#   projected - optional, only allocated for params with projected state
+STATE_COST_FORMULAS = {
+    'AdaBelief': [
+        {'key': 'exp_avg', 'size': 'numel', 'dtype': 'param', 'projectable': True},
+        {'key': 'exp_avg_var', 'size': 'numel', 'dtype': 'param', 'max_ndim': 1},
+        {'key': 'exp_avg_var', 'size': 'numel', 'dtype': 'param', 'unless': 'factored', 'min_ndim': 2,
+         'projectable': True},
+        {'key': 'exp_avg_var_row', 'size': 'rows', 'dtype': 'float32', 'when': 'factored', 'min_ndim': 2},
+        {'key': 'exp_avg_var_col', 'size': 'cols', 'dtype': 'float32', 'when': 'factored', 'min_ndim': 2},
+        {'key': 'exp_grad_norm', 'size': 'one', 'dtype': 'param', 'when': 'adanorm'},
+        {'key': 'max_exp_avg_var', 'size': 'numel', 'dtype': 'param', 'when': 'ams_bound', 'max_ndim': 1},
+        {'key': 'max_exp_avg_var', 'size': 'numel', 'dtype': 'param', 'when': 'ams_bound', 'unless': 'factored',
+         'min_ndim': 2, 'projectable': True},
+        {'key': 'max_exp_avg_var_row', 'size': 'rows', 'dtype': 'float32', 'when': ['ams_bound', 'factored'],
+         'min_ndim': 2},
+        {'key': 'max_exp_avg_var_col', 'size': 'cols', 'dtype': 'float32', 'when': ['ams_bound', 'factored'],
+         'min_ndim': 2},
+        {'key': 'projector', 'size': 'projector', 'dtype': 'float32', 'projected': True},
+        {'key': 'kahan_comp', 'size': 'numel', 'dtype': 'param', 'equals': ['bf16_mode', 'kahan'],
+         'param_dtypes': ['float16', 'bfloat16']},
+    ],
+    'CAME': [
+        {'key': 'exp_avg', 'size': 'numel', 'dtype': 'param'},
+        {'key': 'exp_avg_sq_row', 'size': 'rows', 'dtype': 'grad', 'min_ndim': 2},
+        {'key': 'exp_avg_sq_col', 'size': 'cols', 'dtype': 'grad', 'min_ndim': 2},
+        {'key': 'exp_avg_res_row', 'size': 'rows', 'dtype': 'grad', 'min_ndim': 2},
+        {'key': 'exp_avg_res_col', 'size': 'cols', 'dtype': 'grad', 'min_ndim': 2},
+        {'key': 'exp_avg_sq', 'size': 'numel', 'dtype': 'grad', 'max_ndim': 1},
+        {'key': 'exp_avg_sq_hat', 'size': 'numel', 'dtype': 'grad', 'when': 'ams_bound'},
+        {'key': 'exp_avg_sq_row_factor', 'size': 'rows', 'dtype': 'grad', 'min_ndim': 2,
+         'at_least': ['precondition_interval', 2], 'numel_at_least': 'precondition_min_numel'},
+        {'key': 'exp_avg_sq_col_factor', 'size': 'cols', 'dtype': 'grad', 'min_ndim': 2,
+         'at_least': ['precondition_interval', 2], 'numel_at_least': 'precondition_min_numel'},
+        {'key': 'exp_avg_res_row_factor', 'size': 'rows', 'dtype': 'grad', 'min_ndim': 2,
+         'at_least': ['precondition_interval', 2], 'numel_at_least': 'precondition_min_numel'},
+        {'key': 'exp_avg_res_col_factor', 'size': 'cols', 'dtype': 'grad', 'min_ndim': 2,
+         'at_least': ['precondition_interval', 2], 'numel_at_least': 'precondition_min_numel'},
+        {'key': 'kahan_comp', 'size': 'numel', 'dtype': 'param', 'equals': ['bf16_mode', 'kahan'],
+         'param_dtypes': ['float16', 'bfloat16']},
+    ],
+    'OCGOpt': [
+        {'key': 'denom', 'size': 'numel', 'dtype': 'param', 'max_ndim': 0},
+        {'key': 'value_momentum', 'size': 'numel', 'dtype': 'param', 'projectable': True},
+        {'key': 'centralized_momentum', 'size': 'numel', 'dtype': 'param', 'projectable': True},
+        {'key': 'ortho_factor', 'size': 'gram', 'dtype': 'float32', 'dtype_arg': 'spectral_clip_dtype',
+         'upcast_at_least': ['spectral_clip_refine_steps', 1], 'min_ndim': 1,
+         'at_least': ['precondition_interval', 2], 'numel_at_least': 'precondition_min_numel', 'projectable': True},
+        {'key': 'projector', 'size': 'projector', 'dtype': 'float32', 'projected': True},
+        {'key': 'kahan_comp', 'size': 'numel', 'dtype': 'param', 'equals': ['bf16_mode', 'kahan'],
+         'param_dtypes': ['float16', 'bfloat16']},
+    ],
+    'AdamW': [
+        {'key': 'step', 'size': 'one', 'dtype': 'float32'},
+        {'key': 'exp_avg', 'size': 'numel', 'dtype': 'param'},
+        {'key': 'exp_avg_sq', 'size': 'numel', 'dtype': 'param'},
+    ],
+    'Adafactor': [
+        {'key': 'exp_avg_sq_row', 'size': 'rows', 'dtype': 'grad', 'min_ndim': 2},
+        {'key': 'exp_avg_sq_col', 'size': 'cols', 'dtype': 'grad', 'min_ndim': 2},
+        {'key': 'exp_avg_sq', 'size': 'numel', 'dtype': 'grad', 'max_ndim': 1},
+    ],
+    'Prodigy': [
+        {'key': 's', 'size': 'numel', 'dtype': 'param'},
+        {'key': 'p0', 'size': 'numel', 'dtype': 'param'},
+        {'key': 'exp_avg', 'size': 'numel', 'dtype': 'param'},
+        {'key': 'exp_avg_sq', 'size': 'numel', 'dtype': 'param'},
+    ],
+}
+
+
+# Short aliases accepted in state dtype policies
+DTYPE_ALIASES = {'fp32': 'float32', 'bf16': 'bfloat16', 'fp16': 'float16'}
+
+
+def dtype_name(dtype) -> str:
+    """Normalize a ``torch.dtype`` or dtype string to its short name."""
+    name = str(dtype).split('.')[-1]
+    name = DTYPE_ALIASES.get(name, name)
+    if name not in DTYPE_BYTES:
+        raise ValueError(f"Unsupported dtype: {dtype}")
+    return name
+
+
+def projected_shape(shape, args):
+    """Shape of the low-rank state of a param with projected state (``projection_rank``), or None if it has none.
+
+    Only matrices whose smaller side exceeds the rank and with at least ``projection_min_numel`` elements are
+    projected, their smaller side is reduced to the rank.
+    """
+    rank = args.get('projection_rank') or 0
+    if rank <= 0 or len(shape) != 2 or min(shape) <= rank or math.prod(shape) < args.get('projection_min_numel', 0):
+        return None
+    return (rank, shape[1]) if shape[0] <= shape[1] else (shape[0], rank)
+
+
+def _term_numel(term, shape, args) -> int:
+    numel = math.prod(shape)
+    if term['size'] == 'numel':
+        return numel
+    if term['size'] == 'one':
+        return 1
+    if term['size'] == 'rows':
+        return math.prod(shape[:-1])
+    if term['size'] == 'cols':
+        return math.prod(shape[:-2]) * shape[-1]
+    if term['size'] == 'gram':
+        return min(shape[0], numel // shape[0]) ** 2 if len(shape) > 1 and shape[0] else 1
+    if term['size'] == 'projector':
+        return min(shape) * args['projection_rank']
+    raise ValueError(f"Unknown state size kind: {term['size']}")
+
+
+def _term_dtype(term, param_dtype: str, args) -> str:
+    policy = args.get('state_dtypes') or {}
+    if policy.get(term['key']) is not None:
+        return dtype_name(policy[term['key']])
+    if term['dtype'] == 'param':
+        return param_dtype
+    if term['dtype'] == 'grad':
+        return 'float32' if DTYPE_BYTES[param_dtype] < 4 else param_dtype
+    dtype = term['dtype']
+    if args.get(term.get('dtype_arg')) is not None:
+        dtype = dtype_name(args[term['dtype_arg']])
+    if 'upcast_at_least' in term:
+        arg, value = term['upcast_at_least']
+        if args.get(arg, 0) >= value and DTYPE_BYTES[dtype] < 4:
+            dtype = 'float32'
+    return dtype
+
+
+def _term_applies(term, args, shape, param_dtype: str) -> bool:
+    ndim = len(shape)
+    when = term.get('when', [])
+    if any(not args.get(arg, False) for arg in ([when] if isinstance(when, str) else when)):
+        return False
+    if 'unless' in term and args.get(term['unless'], False):
+        return False
+    if 'min_ndim' in term and ndim < term['min_ndim']:
+        return False
+    if 'max_ndim' in term and ndim > term['max_ndim']:
+        return False
+    if 'at_least' in term:
+        arg, value = term['at_least']
+        if args.get(arg, 0) < value:
+            return False
+    if 'numel_at_least' in term and math.prod(shape) < args.get(term['numel_at_least'], 0):
+        return False
+    if 'equals' in term:
+        arg, value = term['equals']
+        if args.get(arg) != value:
+            return False
+    if 'param_dtypes' in term and param_dtype not in term['param_dtypes']:
+        return False
+    if term.get('projected') and projected_shape(shape, args) is None:
+        return False
+    return True
+
+
+def iter_state_tensors(optimizer_id, args, param_shapes, dtype='float32'):
+    """Yield ``(param_index, key, numel, dtype_name)`` for every state tensor the optimizer would allocate."""
+    if optimizer_id not in STATE_COST_FORMULAS:
+        raise KeyError(f"No state cost formula for optimizer: {optimizer_id}")
+
+    formula = STATE_COST_FORMULAS[optimizer_id]
+    param_dtype = dtype_name(dtype)
+    args = args or {}
+
+    for index, shape in enumerate(param_shapes):
+        shape = tuple(shape)
+        projected = projected_shape(shape, args)
+        for term in formula:
+            if _term_applies(term, args, shape, param_dtype):
+                term_shape = projected if projected and term.get('projectable') else shape
+                yield index, term['key'], _term_numel(term, term_shape, args), _term_dtype(term, param_dtype, args)
+
+
+def estimate_state_bytes(optimizer_id, args, param_shapes, dtype='float32') -> int:
+    """Compute the exact number of bytes of optimizer state for the given params, without allocating anything.
+
+    :param optimizer_id: str. id of the optimizer as it appears in the generated schema.
+    :param args: dict. optimizer arguments; boolean options that are missing count as disabled.
+    :param param_shapes: iterable of parameter shapes.
+    :param dtype: torch.dtype or str. dtype of the parameters.
+    """
+    return sum(
+        numel * DTYPE_BYTES[state_dtype]
+        for _, _, numel, state_dtype in iter_state_tensors(optimizer_id, args, param_shapes, dtype)
+    )
+
+
+def state_bytes_by_key(optimizer_id, args, param_shapes, dtype='float32'):
+    """Estimated state bytes per state key and dtype, ``{key: {dtype_name: bytes}}``.
+
+    Shows what a state dtype policy (the ``state_dtypes`` arg) saves on each state tensor.
+    """
+    report = {}
+    for _, key, numel, state_dtype in iter_state_tensors(optimizer_id, args, param_shapes, dtype):
+        by_dtype = report.setdefault(key, {})
+        by_dtype[state_dtype] = by_dtype.get(state_dtype, 0) + numel * DTYPE_BYTES[state_dtype]
+    return report
+
+
+def measure_state_bytes(optimizer):
+    """Bytes of the state an optimizer actually holds, in the same ``{key: {dtype_name: bytes}}`` form.
+
+    Tensors are counted by their own size, so views into flat_state buffers add up to the buffers.
+    """
+    report = {}
+    for state in optimizer.state.values():
+        for key, value in state.items():
+            if not hasattr(value, 'element_size'):
+                continue
+            by_dtype = report.setdefault(key, {})
+            name = str(value.dtype).split('.')[-1]
+            by_dtype[name] = by_dtype.get(name, 0) + value.numel() * value.element_size()
+    return report
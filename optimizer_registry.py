@@ -0,0 +1,94 @@
+"""Lazy optimizer registry.
+
+Maps the optimizer ids of the generated schema (``OPTIMIZER_SCHEMAS``) to the module and class that implement
+them. Nothing is imported until an optimizer is actually selected, so a worker that trains with AdamW never pays
+for importing ``pytorch_optimizer``, ``torch._dynamo`` or bitsandbytes.
+
+Like the rest of the package it has to be imported as a package, as the local optimizers are relative imports.
+``generate_schema.py`` fails when the registered ids and the schema's ids disagree, so a new optimizer that isn't
+registered here, or a misspelled id, is caught when the schema is regenerated rather than when it is selected.
+
+Run ``python -m <package>.optimizer_registry`` to print the cold-start import time of every optimizer, each
+measured in a fresh interpreter.
+"""
+
+import importlib
+import json
+import subprocess
+import sys
+import time
+
+# id -> (module, class name). Modules starting with '.' are resolved relative to this package.
+_REGISTRY = {
+    'AdaBelief': ('.ref_opt_adabelief', 'AdaBelief'),
+    'CAME': ('.ref_opt_came', 'CAME'),
+    'OCGOpt': ('.ref_opt_ocgopt', 'OCGOpt'),
+    'AdamW': ('torch.optim', 'AdamW'),
+    'AdamW8bit': ('bitsandbytes.optim', 'AdamW8bit'),
+    'Adafactor': ('transformers.optimization', 'Adafactor'),
+    'Prodigy': ('prodigyopt', 'Prodigy'),
+}
+
+# id -> seconds spent importing its module, for the ones loaded so far
+IMPORT_TIMES = {}
+
+
+def register(optimizer_id: str, module: str, attr: str):
+    """Register (or override) the module and class name implementing an optimizer id."""
+    _REGISTRY[optimizer_id] = (module, attr)
+
+
+def available():
+    return sorted(_REGISTRY)
+
+
+def _import(module: str):
+    if module.startswith('.'):
+        if __package__:
+            return importlib.import_module(module, package=__package__)
+        module = module[1:]
+    return importlib.import_module(module)
+
+
+def get_optimizer_class(optimizer_id: str):
+    """Import and return the class of an optimizer, recording how long the import took."""
+    if optimizer_id not in _REGISTRY:
+        raise KeyError(f"Unknown optimizer: {optimizer_id}")
+
+    module, attr = _REGISTRY[optimizer_id]
+    start = time.perf_counter()
+    cls = getattr(_import(module), attr)
+    IMPORT_TIMES.setdefault(optimizer_id, time.perf_counter() - start)
+    return cls
+
+
+def create_optimizer(optimizer_id: str, params, **kwargs):
+    return get_optimizer_class(optimizer_id)(params, **kwargs)
+
+
+def measure_cold_import(optimizer_id: str) -> float:
+    """Seconds to import an optimizer in a fresh interpreter that has already imported torch."""
+    module = f"{__package__}.optimizer_registry" if __package__ else 'optimizer_registry'
+    code = (
+        "import json, time, torch\n"
+        f"from {module} import get_optimizer_class\n"
+        "start = time.perf_counter()\n"
+        f"get_optimizer_class({optimizer_id!r})\n"
+        "print(json.dumps(time.perf_counter() - start))\n"
+    )
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    for optimizer_id in available():
+        try:
+            seconds = measure_cold_import(optimizer_id)
+        except subprocess.CalledProcessError as e:
+            print(f"{optimizer_id:>12}: unavailable ({e.stderr.strip().splitlines()[-1]})")
+            continue
+        print(f"{optimizer_id:>12}: {seconds * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""ZeRO-1 style optimizer state sharding across data-parallel ranks.
+
+With plain data parallelism every rank keeps the full optimizer state. ``ShardedOptimizer`` instead assigns every
+parameter to one rank of a ``torch.distributed`` group, balancing the ranks by the state bytes the optimizer keeps for
+their params (``optimizer_memory``), so each rank only allocates and updates state for its shard. After the local step
+every owner broadcasts its updated params, in flat per-dtype buckets, so all ranks end the step with identical weights.
+
+Gradients must already be averaged across ranks (DDP, or an all-reduce before ``step``). Any backend works; gloo
+covers CPU runs and tests::
+
+    dist.init_process_group('gloo', rank=rank, world_size=world_size)
+    optimizer = ShardedOptimizer(model.parameters(), 'AdaBelief', lr=1e-4)
+
+State dicts hold only the calling rank's shard: save one file per rank and load it back with the same world size.
+"""
+
+import torch
+import torch.distributed as dist
+from torch._utils import _flatten_dense_tensors, _unflatten_dense_tensors
+from torch.optim import Optimizer
+
+from .optimizer_memory import estimate_state_bytes
+from .optimizer_registry import create_optimizer
+from .utils import partition_by_cost
+
+
+def param_state_bytes(optimizer_id: str, args, p: torch.Tensor) -> int:
+    r"""State bytes the optimizer keeps for p, or the param's own size for optimizers without a cost formula."""
+    try:
+        return estimate_state_bytes(optimizer_id, args, [p.shape], p.dtype)
+    except KeyError:
+        return p.numel() * p.element_size()
+
+
+class ShardedOptimizer(Optimizer):
+    r"""Shard an optimizer's state across the ranks of a process group.
+
+    :param params: iterable of params or param group dicts, identical on every rank.
+    :param optimizer_id: str. id of the wrapped optimizer in optimizer_registry.
+    :param process_group: the group to shard across, the default group if None.
+    :param bucket_numel: int. max elements per broadcast, bounding the temporary flat copies.
+    :param kwargs: arguments of the wrapped optimizer.
+    """
+
+    def __init__(self, params, optimizer_id: str, process_group=None, bucket_numel: int = 2 ** 25, **kwargs):
+        self.process_group = process_group
+        self.rank = dist.get_rank(process_group)
+        self.world_size = dist.get_world_size(process_group)
+
+        param_groups = list(params)
+        if len(param_groups) == 0:
+            raise ValueError("optimizer got an empty parameter list")
+        if not isinstance(param_groups[0], dict):
+            param_groups = [{'params': param_groups}]
+        param_groups = [dict(group, params=list(group['params'])) for group in param_groups]
+
+        # Every rank computes the same split from the same shapes, so no communication is needed
+        params = [p for group in param_groups for p in group['params']]
+        costs = []
+        for group in param_groups:
+            args = {**kwargs, **{k: v for k, v in group.items() if k != 'params'}}
+            costs += [max(param_state_bytes(optimizer_id, args, p), 1) for p in group['params']]
+        shards = partition_by_cost(list(range(len(params))), costs, self.world_size)
+
+        self.owners = {}
+        for rank, shard in enumerate(shards):
+            for index in shard:
+                self.owners[params[index]] = rank
+
+        # Groups stay aligned with the full ones (possibly empty), so hyperparameters map one to one
+        local_groups = [
+            dict(group, params=[p for p in group['params'] if self.owners[p] == self.rank]) for group in param_groups
+        ]
+        self.optimizer = create_optimizer(optimizer_id, local_groups, **kwargs)
+
+        super().__init__(param_groups, self.optimizer.defaults)
+        self._sync_groups(self.optimizer.param_groups, self.param_groups)
+        self.state = self.optimizer.state
+
+        self._buckets = self._build_buckets(params, bucket_numel)
+
+    def __repr__(self) -> str:
+        return f"ShardedOptimizer({self.optimizer}, rank={self.rank}, world_size={self.world_size})"
+
+    @staticmethod
+    def _sync_groups(source, target):
+        for source_group, target_group in zip(source, target):
+            for key, value in source_group.items():
+                if key != 'params':
+                    target_group[key] = value
+
+    def _build_buckets(self, params, bucket_numel: int):
+        r"""(source rank, params) broadcast buckets: per owner, per dtype and device, at most bucket_numel elements."""
+        buckets = []
+        for rank in range(self.world_size):
+            src = rank if self.process_group is None else dist.get_global_rank(self.process_group, rank)
+            by_kind = {}
+            for p in params:
+                if self.owners[p] == rank:
+                    by_kind.setdefault((p.dtype, p.device), []).append(p)
+
+            for kind_params in by_kind.values():
+                bucket, numel = [], 0
+                for p in kind_params:
+                    if bucket and numel + p.numel() > bucket_numel:
+                        buckets.append((src, rank, bucket))
+                        bucket, numel = [], 0
+                    bucket.append(p)
+                    numel += p.numel()
+                buckets.append((src, rank, bucket))
+        return buckets
+
+    @torch.no_grad()
+    def broadcast_params(self):
+        r"""Send every shard's params from their owner to all other ranks."""
+        for src, owner, bucket in self._buckets:
+            if owner == self.rank:
+                buffer = _flatten_dense_tensors([p.detach() for p in bucket])
+            else:
+                buffer = torch.empty(sum(p.numel() for p in bucket), dtype=bucket[0].dtype, device=bucket[0].device)
+
+            dist.broadcast(buffer, src=src, group=self.process_group)
+
+            if owner != self.rank:
+                for p, synced in zip(bucket, _unflatten_dense_tensors(buffer, bucket)):
+                    p.copy_(synced)
+
+    @torch.no_grad()
+    def step(self, closure=None):
+        loss = None
+        if closure is not None:
+            with torch.enable_grad():
+                loss = closure()
+
+        # Schedulers and users change the full groups, the wrapped optimizer updates its own (e.g. 'step')
+        self._sync_groups(self.param_groups, self.optimizer.param_groups)
+        self.optimizer.step()
+        self._sync_groups(self.optimizer.param_groups, self.param_groups)
+
+        self.broadcast_params()
+        return loss
+
+    def state_dict(self):
+        state_dict = super().state_dict()
+        state_dict['shard'] = {'rank': self.rank, 'world_size': self.world_size}
+        return state_dict
+
+    def load_state_dict(self, state_dict):
+        shard = state_dict.get('shard')
+        if shard != {'rank': self.rank, 'world_size': self.world_size}:
+            raise ValueError(f"State dict of shard {shard} can't be loaded on rank {self.rank} of {self.world_size}")
+
+        state_dict = {k: v for k, v in state_dict.items() if k != 'shard'}
+        super().load_state_dict(state_dict)
+        self.optimizer.state = self.state
+        self._sync_groups(self.param_groups, self.optimizer.param_groups)
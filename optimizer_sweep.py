@@ -0,0 +1,459 @@
+"""Vectorized hyperparameter sweeps: K optimizer configurations trained side by side in one batched step.
+
+``SweepOptimizer`` keeps K replicas of a (small, e.g. LoRA-sized) parameter set stacked along a new leading dim, with
+state stacked the same way. Hyperparameters that differ between the configurations become per-replica columns that
+broadcast against the stacked tensors, so one ``step()`` runs each op once for all K replicas instead of K optimizers
+running every op separately, and the model is loaded once for the whole sweep. Reductions (RMS, cautious keep ratio,
+Newton-Schulz norms) are taken per replica, so every replica follows exactly the trajectory its own optimizer would.
+
+::
+
+    sweep = SweepOptimizer(lora.named_parameters(), 'CAME', [{'lr': 1e-4}, {'lr': 3e-4, 'update_strategy': 'grams'}])
+    outputs = sweep.forward(model, batch)             # [K, ...], one vmapped forward over the replicas
+    losses = loss_fn(outputs, target)                 # [K]
+    losses.sum().backward()                           # replicas are independent, each gets its own gradient
+    sweep.step()
+    sweep.zero_grad()
+    ...
+    sweep.export(losses.argmin())                     # copy the best replica into the model's params
+
+Only the hyperparameters in ``SWEEP_HYPERPARAMETERS`` may differ between configs; all other options must be equal,
+and the ones in ``UNSUPPORTED_OPTIONS`` must keep their default. State and math are float32, 16-bit replicas are
+written back with stochastic rounding.
+"""
+
+import inspect
+import math
+
+import torch
+from pytorch_optimizer.base.optimizer import BaseOptimizer
+
+from .optimizer_registry import get_optimizer_class
+from .ref_opt_came import CAME
+from .ref_opt_ocgopt import NS_COEFFS, refine_dtype
+from .utils import copy_stochastic_
+
+# Options that may differ between the configs of a sweep
+SWEEP_HYPERPARAMETERS = {
+    'AdaBelief': ('lr', 'betas', 'weight_decay', 'eps', 'cautious', 'rectify'),
+    'CAME': ('lr', 'betas', 'weight_decay', 'eps1', 'eps2', 'clip_threshold', 'update_strategy', 'cautious'),
+    'OCGOpt': ('lr', 'betas', 'weight_decay', 'weight_decay_rate', 'centralization', 'cautious_min', 'adaptive_min',
+               'adaptive_max'),
+}
+
+# Options the batched steps don't implement, with the value they must keep
+UNSUPPORTED_OPTIONS = {
+    'AdaBelief': {
+        'adanorm': False, 'factored': False, 'bf16_mode': 'stochastic', 'skip_non_finite': False, 'state_dtypes': None,
+        'hibernate_after': 0, 'projection_rank': 0,
+    },
+    'CAME': {'bf16_mode': 'stochastic', 'skip_non_finite': False, 'state_dtypes': None, 'hibernate_after': 0},
+    'OCGOpt': {
+        'lowpass_grad': 0.0, 'sim_match': False, 'bf16_mode': 'stochastic', 'skip_non_finite': False, 'state_dtypes': None,
+        'hibernate_after': 0, 'projection_rank': 0,
+    },
+}
+
+def replica_sum(x: torch.Tensor) -> torch.Tensor:
+    r"""Sum over everything but the replica dim, shaped to broadcast against x."""
+    return x.reshape(len(x), -1).sum(dim=1).view(-1, *([1] * (x.ndim - 1)))
+
+
+def replica_mean(x: torch.Tensor) -> torch.Tensor:
+    return x.reshape(len(x), -1).mean(dim=1).view(-1, *([1] * (x.ndim - 1)))
+
+
+def replica_rms(x: torch.Tensor) -> torch.Tensor:
+    return replica_mean(x.square()).sqrt_()
+
+
+def matrix_view(x: torch.Tensor) -> torch.Tensor:
+    r"""Stacked 2D views of the replicas, as OCGOpt reshapes a param: (len, rest) for >= 2 dims, (1, numel) for 1."""
+    return x.reshape(len(x), x.shape[1], -1) if x.ndim > 2 else x.reshape(len(x), 1, -1)
+
+
+@torch.no_grad()
+def orthogonalize_batched(
+    M: torch.Tensor, ortho_dtype=torch.float32, adaptive: bool = False, refine_steps: int = 0
+) -> torch.Tensor:
+    r"""ref_opt_ocgopt.orthogonalize for a stack of tall matrices [K, m, n], with per-matrix norms."""
+    orig_dtype = M.dtype
+    M = M.to(ortho_dtype)
+    M_orig = M
+    for i, (a, b, c) in enumerate(NS_COEFFS):
+        if i == len(NS_COEFFS) - refine_steps:
+            M = M.to(refine_dtype(M.dtype))
+        M = M / torch.linalg.norm(M, dim=(-2, -1), keepdim=True).clamp_min_(1e-8)
+        A = M.mT @ M
+        I = torch.eye(A.shape[-1], dtype=M.dtype, device=M.device)
+        M = M @ (a * I + b * A + c * A @ A)
+    if adaptive:
+        M = (M_orig * M).sum(dim=(-2, -1), keepdim=True) * M
+    return M.to(orig_dtype)
+
+
+class SweepOptimizer:
+    r"""Train K replicas of a parameter set, one per optimizer configuration, with batched steps.
+
+    :param named_params: iterable of (name, param), e.g. module.named_parameters(). params without requires_grad are
+        left out (frozen base weights are shared by all replicas).
+    :param optimizer_id: str. 'AdaBelief', 'CAME' or 'OCGOpt'.
+    :param configs: list of dicts. per-replica optimizer arguments, on top of kwargs and the optimizer's defaults.
+    :param kwargs: arguments shared by every replica.
+    """
+
+    def __init__(self, named_params, optimizer_id: str, configs, **kwargs):
+        if optimizer_id not in SWEEP_STEPS:
+            raise KeyError(f"No batched step for optimizer: {optimizer_id}, sweepable: {sorted(SWEEP_STEPS)}")
+        if len(configs) == 0:
+            raise ValueError("configs must not be empty")
+
+        signature = inspect.signature(get_optimizer_class(optimizer_id).__init__)
+        defaults = {
+            name: parameter.default
+            for name, parameter in signature.parameters.items()
+            if parameter.default is not inspect.Parameter.empty
+        }
+        self.optimizer_id = optimizer_id
+        self.configs = [self.normalize({**defaults, **kwargs, **config}) for config in configs]
+        self.options = self.configs[0]
+
+        varying = {key for config in self.configs for key in config if config[key] != self.options.get(key)}
+        unsweepable = varying - set(SWEEP_HYPERPARAMETERS[optimizer_id])
+        if unsweepable:
+            raise ValueError(
+                f"{optimizer_id} sweeps can't vary {sorted(unsweepable)}, "
+                f"only {list(SWEEP_HYPERPARAMETERS[optimizer_id])}"
+            )
+        for option, value in UNSUPPORTED_OPTIONS[optimizer_id].items():
+            if self.options.get(option, value) != value:
+                raise ValueError(f"{optimizer_id} sweeps don't support {option}={self.options[option]!r}")
+
+        named_params = [(name, p) for name, p in named_params if p.requires_grad]
+        self.names = [name for name, _ in named_params]
+        self.params = [p for _, p in named_params]
+        self.replicas = [
+            p.detach().unsqueeze(0).repeat(len(self.configs), *([1] * p.ndim)).requires_grad_() for p in self.params
+        ]
+        self.state = [{} for _ in self.replicas]
+        self.steps = 0
+        self._columns = {}
+
+    def __len__(self) -> int:
+        return len(self.configs)
+
+    def normalize(self, config):
+        if self.optimizer_id == 'CAME' and config.get('cautious'):
+            config['update_strategy'] = 'cautious'
+        if self.optimizer_id == 'OCGOpt':
+            dtype = config.get('spectral_clip_dtype') or torch.float32
+            config['spectral_clip_dtype'] = getattr(torch, dtype.split('.')[-1]) if isinstance(dtype, str) else dtype
+        return config
+
+    def values(self, name: str):
+        r"""Per-replica values of an option, 'beta1', 'beta2', ... index into betas."""
+        if name.startswith('beta') and name[4:].isdigit():
+            return [config['betas'][int(name[4:]) - 1] for config in self.configs]
+        return [config[name] for config in self.configs]
+
+    def column(self, values, like: torch.Tensor, key=None):
+        r"""Per-replica values as a float32 column broadcasting against the stacked tensor like.
+
+        Values shared by every replica stay a Python float, so that case runs the same scalar ops as the optimizer
+        itself. Columns of fixed options are cached under key.
+        """
+        if all(value == values[0] for value in values):
+            return float(values[0])
+        key = key and (key, like.device, like.ndim)
+        column = self._columns.get(key) if key else None
+        if column is None:
+            column = torch.tensor(values, dtype=torch.float32, device=like.device).view(-1, *([1] * (like.ndim - 1)))
+            if key:
+                self._columns[key] = column
+        return column
+
+    def hyper(self, name: str, like: torch.Tensor):
+        return self.column(self.values(name), like, key=name)
+
+    def complement(self, name: str, like: torch.Tensor):
+        r"""1 - hyper(name), taken in double precision: 1 - float32(0.9999) is off by 2e-5."""
+        return self.column([1.0 - value for value in self.values(name)], like, key=('1 -', name))
+
+    def decoupled_decay(self, like: torch.Tensor):
+        r"""Per-replica multiplier of decoupled weight decay, as BaseOptimizer.apply_weight_decay computes it."""
+        return self.column(
+            [1.0 - c['weight_decay'] * (1.0 if c['fixed_decay'] else c['lr']) for c in self.configs], like,
+            key='decoupled_decay',
+        )
+
+    def forward(self, module: torch.nn.Module, *args, **kwargs):
+        r"""Run module once per replica, vectorized with vmap, and return the outputs stacked along dim 0."""
+        def call(params, *call_args):
+            return torch.func.functional_call(module, params, call_args, kwargs)
+
+        params = dict(zip(self.names, self.replicas))
+        return torch.func.vmap(call, in_dims=(0,) + (None,) * len(args))(params, *args)
+
+    def zero_grad(self):
+        for replica in self.replicas:
+            replica.grad = None
+
+    @torch.no_grad()
+    def export(self, index: int):
+        r"""Copy replica index into the original params."""
+        for p, replica in zip(self.params, self.replicas):
+            p.copy_(replica[int(index)])
+
+    @torch.no_grad()
+    def step(self):
+        self.steps += 1
+        update = SWEEP_STEPS[self.optimizer_id]
+        for replica, state in zip(self.replicas, self.state):
+            if replica.grad is None:
+                continue
+
+            # float32 replicas are updated in place
+            p = replica.detach()
+            p32 = p.float()
+            update(self, p32, replica.grad.float(), state, self.steps)
+
+            if p.dtype in {torch.float16, torch.bfloat16}:
+                copy_stochastic_(p, p32)
+
+
+def add_scaled_(target: torch.Tensor, x: torch.Tensor, weight):
+    r"""target += x * weight, for a scalar or a per-replica column weight, without a temporary."""
+    if isinstance(weight, float):
+        return target.add_(x, alpha=weight)
+    return target.addcmul_(x, weight)
+
+
+def enabled(value) -> bool:
+    r"""Whether a hyperparameter is on for any replica. A column only exists when the replicas differ."""
+    return not isinstance(value, float) or value != 0.0
+
+
+def per_replica_where(condition, x: torch.Tensor, y):
+    r"""x for the replicas where condition holds, y for the others."""
+    if isinstance(condition, float):
+        return x if condition else y
+    return torch.where(condition > 0, x, y)
+
+
+def adabelief_step(sweep: SweepOptimizer, p: torch.Tensor, grad: torch.Tensor, state, step: int):
+    options = sweep.options
+    if len(state) == 0:
+        state['exp_avg'] = torch.zeros_like(p)
+        state['exp_avg_var'] = torch.zeros_like(p)
+        if options['ams_bound']:
+            state['max_exp_avg_var'] = torch.zeros_like(p)
+
+    if options['weight_decouple']:
+        p.mul_(sweep.decoupled_decay(p))
+    else:
+        grad = add_scaled_(grad.clone(), p, sweep.hyper('weight_decay', p))
+
+    exp_avg, exp_avg_var = state['exp_avg'], state['exp_avg_var']
+    add_scaled_(exp_avg.mul_(sweep.hyper('beta1', p)), grad, sweep.complement('beta1', p))
+
+    grad_residual = grad - exp_avg
+    add_scaled_(exp_avg_var.mul_(sweep.hyper('beta2', p)), grad_residual.square_(), sweep.complement('beta2', p))
+    eps = sweep.hyper('eps', p)
+    exp_avg_var.add_(eps)
+
+    if options['ams_bound']:
+        de_nom = torch.maximum(state['max_exp_avg_var'], exp_avg_var, out=state['max_exp_avg_var']).add(1e-15)
+    else:
+        de_nom = exp_avg_var.add(1e-15)
+    de_nom.sqrt_().add_(eps)
+
+    cautious = sweep.hyper('cautious', p)
+    update = exp_avg
+    if enabled(cautious):
+        mask = (exp_avg * grad > 0).float()
+        update = exp_avg * per_replica_where(cautious, mask.div_(replica_mean(mask).clamp(min=1e-3)), 1.0)
+
+    # Step sizes and the rectify branch are per-replica scalars, as in AdaBelief.step
+    step_sizes, denom_scales, use_denom = [], [], []
+    for config in sweep.configs:
+        step_size, n_sma = BaseOptimizer.get_rectify_step_size(
+            is_rectify=config['rectify'],
+            step=step,
+            lr=config['lr'],
+            beta2=config['betas'][1],
+            n_sma_threshold=config['n_sma_threshold'],
+            degenerated_to_sgd=config['degenerated_to_sgd'],
+        )
+        step_size = BaseOptimizer.apply_adam_debias(
+            adam_debias=config['adam_debias'],
+            step_size=step_size,
+            bias_correction1=BaseOptimizer.debias(config['betas'][0], step),
+        )
+        adaptive = not config['rectify'] or n_sma >= config['n_sma_threshold']
+        step_sizes.append(-step_size if adaptive or step_size > 0 else 0.0)
+        denom_scales.append(1.0 if config['rectify'] else math.sqrt(BaseOptimizer.debias(config['betas'][1], step)))
+        use_denom.append(adaptive)
+
+    use_denom = sweep.column(use_denom, p)
+    if enabled(use_denom):
+        update = per_replica_where(use_denom, update / de_nom.div_(sweep.column(denom_scales, p)), update)
+    add_scaled_(p, update, sweep.column(step_sizes, p))
+
+
+def came_step(sweep: SweepOptimizer, p: torch.Tensor, grad: torch.Tensor, state, step: int):
+    options = sweep.options
+    # Shapes of a single replica, the stacked tensors carry the replica dim in front
+    factored = p.ndim - 1 >= 2
+    if len(state) == 0:
+        state['exp_avg'] = torch.zeros_like(p)
+        if factored:
+            state['exp_avg_sq_row'] = torch.zeros(p.shape[:-1], dtype=p.dtype, device=p.device)
+            state['exp_avg_sq_col'] = torch.zeros(p.shape[:-2] + p.shape[-1:], dtype=p.dtype, device=p.device)
+            state['exp_avg_res_row'] = torch.zeros(p.shape[:-1], dtype=p.dtype, device=p.device)
+            state['exp_avg_res_col'] = torch.zeros(p.shape[:-2] + p.shape[-1:], dtype=p.dtype, device=p.device)
+        else:
+            state['exp_avg_sq'] = torch.zeros_like(p)
+        if options['ams_bound']:
+            state['exp_avg_sq_hat'] = torch.zeros_like(p)
+
+    def decay_(stat, value, beta):
+        # CAME's factored statistics reduce over the last dims only, so the replica dim passes through unchanged
+        return add_scaled_(stat.mul_(sweep.hyper(beta, stat)), value, sweep.complement(beta, stat))
+
+    update = torch.mul(grad, grad).add_(sweep.hyper('eps1', p))
+
+    if factored:
+        row, col = state['exp_avg_sq_row'], state['exp_avg_sq_col']
+        decay_(row, update.mean(dim=-1), 'beta2')
+        decay_(col, update.mean(dim=-2), 'beta2')
+        CAME.approximate_sq_grad(row, col, update)
+    else:
+        torch.rsqrt(decay_(state['exp_avg_sq'], update, 'beta2'), out=update)
+
+    if options['ams_bound']:
+        exp_avg_sq_hat = state['exp_avg_sq_hat']
+        torch.max(exp_avg_sq_hat, 1 / update, out=exp_avg_sq_hat)
+        torch.rsqrt(exp_avg_sq_hat / sweep.hyper('beta2', p), out=update)
+
+    update.mul_(grad)
+
+    clip_factor = (replica_rms(update) / sweep.hyper('clip_threshold', p)).clamp_(min=1.0)
+    update.div_(clip_factor)
+
+    exp_avg = decay_(state['exp_avg'], update, 'beta1')
+
+    if factored:
+        res = update - exp_avg
+        res.pow_(2).add_(sweep.hyper('eps2', p))
+
+        row, col = state['exp_avg_res_row'], state['exp_avg_res_col']
+        decay_(row, res.mean(dim=-1), 'beta3')
+        decay_(col, res.mean(dim=-2), 'beta3')
+        CAME.approximate_sq_grad(row, col, update)
+        update.mul_(exp_avg)
+    else:
+        update = exp_avg.clone()
+
+    if options['weight_decouple']:
+        p.mul_(sweep.decoupled_decay(p))
+    else:
+        grad = add_scaled_(grad.clone(), p, sweep.hyper('weight_decay', p))
+
+    update.mul_(sweep.hyper('lr', p))
+
+    strategies = sweep.values('update_strategy')
+    grams = sweep.column([s == 'grams' for s in strategies], p, key='grams')
+    if enabled(grams):
+        update.copy_(per_replica_where(grams, torch.sign(grad) * update.abs(), update))
+
+    cautious = sweep.column([s == 'cautious' for s in strategies], p, key='cautious')
+    if enabled(cautious):
+        mask = (update * grad > 0).float()
+        update = update * per_replica_where(cautious, mask.div_(replica_mean(mask).clamp(min=1e-3)), 1.0)
+
+    p.sub_(update)
+
+
+def ocgopt_step(sweep: SweepOptimizer, p: torch.Tensor, grad: torch.Tensor, state, step: int):
+    options = sweep.options
+    dimcount = p.ndim - 1
+    if len(state) == 0:
+        if dimcount < 1:
+            state['denom'] = torch.ones_like(p)
+        state['value_momentum'] = torch.zeros_like(p)
+        state['centralized_momentum'] = torch.zeros_like(p)
+
+    beta = sweep.hyper('beta1', p)
+    centralization = sweep.hyper('centralization', p)
+    # Averaged betas, per replica like in OCGOpt.step
+    slow_beta2 = [(b ** step - b) / (b ** step - 1.0) for b in sweep.values('beta2')]
+    slow_beta3 = [(b ** step - b) / (b ** step - 1.0) for b in sweep.values('beta3')]
+
+    grad = grad.clamp(-step, step)
+
+    if dimcount >= 1 and options['input_norm']:
+        grad_2d = matrix_view(grad)
+        grad = grad_2d.div(grad_2d.pow(2).mean(dim=-1, keepdim=True).sqrt_().clamp_min_(1e-16)).view_as(grad)
+    else:
+        grad = grad.div(replica_rms(grad).clamp_min_(1e-16))
+
+    if dimcount < 1:
+        denom = state['denom']
+        current_denom = denom.sqrt()
+
+    value_momentum, centralized_momentum = state['value_momentum'], state['centralized_momentum']
+
+    centralized_grad = grad - value_momentum * centralization
+    centralized_momentum.lerp_(centralized_grad, sweep.complement('beta1', p))
+    value_momentum.lerp_(grad, sweep.column([1.0 - b for b in slow_beta2], p))
+    exp_avg = centralized_grad.lerp(centralized_momentum, beta)
+    add_scaled_(exp_avg, grad.lerp(value_momentum, sweep.column(slow_beta2, p)), centralization)
+
+    if dimcount < 1:
+        denom.lerp_(centralized_grad.pow(2), sweep.column([1.0 - b for b in slow_beta3], p))
+
+    if dimcount >= 1:
+        exp_avg_2d = matrix_view(exp_avg)
+        flip = exp_avg_2d.shape[-2] < exp_avg_2d.shape[-1]
+        if flip:
+            exp_avg_2d = exp_avg_2d.mT
+        exp_avg_2d = orthogonalize_batched(
+            exp_avg_2d, options['spectral_clip_dtype'], options['spectral_adaptive'],
+            options['spectral_clip_refine_steps'],
+        )
+        if flip:
+            exp_avg_2d = exp_avg_2d.mT
+
+        full_step = exp_avg_2d.reshape(exp_avg.shape)
+        full_step = full_step.div(replica_rms(full_step).clamp_min_(1))
+    else:
+        full_step = exp_avg.atan2(current_denom).mul_(1.27323954474)
+
+    mask = torch.where(grad * full_step > 0, 1.0, sweep.hyper('cautious_min', p))
+    full_step = full_step.mul(mask.div(replica_mean(mask).clamp_min_(1e-3)))
+
+    if options['adaptive']:
+        if dimcount >= 1 and options['input_norm']:
+            full_step_2d = matrix_view(full_step)
+            # Bounds one at a time, clamp() doesn't take a column and a float together
+            scale_factor = (matrix_view(exp_avg) * full_step_2d).sum(dim=-1, keepdim=True)
+            scale_factor = scale_factor.clamp(min=sweep.hyper('adaptive_min', full_step_2d))
+            scale_factor = scale_factor.clamp(max=sweep.hyper('adaptive_max', full_step_2d))
+            full_step = (full_step_2d * scale_factor).view_as(full_step)
+        else:
+            scale_factor = replica_sum(exp_avg * full_step).clamp(min=sweep.hyper('adaptive_min', p))
+            scale_factor = scale_factor.clamp(max=sweep.hyper('adaptive_max', p))
+            full_step = scale_factor * full_step
+
+    weight_decay = sweep.column([c['weight_decay'] * c['weight_decay_rate'] ** step for c in sweep.configs], p)
+    if enabled(weight_decay):
+        full_step = add_scaled_(full_step, p, weight_decay)
+
+    add_scaled_(p, full_step, sweep.column([-lr for lr in sweep.values('lr')], p, key='-lr'))
+
+
+SWEEP_STEPS = {
+    'AdaBelief': adabelief_step,
+    'CAME': came_step,
+    'OCGOpt': ocgopt_step,
+}
@@ -0,0 +1,185 @@
+"""Sync-free per-layer optimizer telemetry.
+
+Optimizers record small per-parameter statistics (update RMS, gradient RMS, cautious keep ratio, ...) as device
+tensors into a preallocated ring buffer while they step, so nothing calls ``.item()`` or otherwise waits for the
+device. Every ``flush_every`` recorded steps the filled rows are copied to host memory asynchronously and a
+background thread appends them to a compact binary log, which the backend can tail with ``read_telemetry``.
+
+Usage::
+
+    telemetry = OptimizerTelemetry('run/telemetry.bin', names=[n for n, _ in model.named_parameters()])
+    telemetry.attach(optimizer)
+    ...
+    telemetry.close()
+
+Log layout (little endian): ``b'KOTL'``, a uint32 header length and a JSON header (``metrics``, ``names``), then one
+fixed-size record per step: an int64 step followed by ``len(names) * len(metrics)`` float32 values, param-major.
+Metrics an optimizer doesn't produce for a parameter are NaN.
+"""
+
+import json
+import queue
+import struct
+import sys
+import threading
+from array import array
+
+import torch
+
+MAGIC = b'KOTL'
+VERSION = 1
+
+METRICS = ('update_rms', 'grad_rms', 'keep_ratio', 'clip_factor', 'scale_factor', 'n_sma')
+_METRIC_INDEX = {name: i for i, name in enumerate(METRICS)}
+
+
+class OptimizerTelemetry:
+    r"""Ring buffer of per-parameter optimizer statistics, flushed to a binary log by a background thread.
+
+    :param path: str. file the log is written to (overwritten).
+    :param names: list of parameter names, in param_groups order. defaults to '<group>.<index>'.
+    :param flush_every: int. number of recorded steps kept on device before they are handed to the writer.
+    :param interval: int. only record every interval-th step, the statistics cost a few extra kernels per param.
+    """
+
+    def __init__(self, path: str, names=None, flush_every: int = 50, interval: int = 1):
+        if flush_every < 1 or interval < 1:
+            raise ValueError("flush_every and interval must be >= 1")
+
+        self.path = path
+        self.names = list(names) if names is not None else None
+        self.flush_every = flush_every
+        self.interval = interval
+
+        self.active = False
+        self._index = {}
+        self._buffer = None
+        self._steps = []
+        self._step = 0
+        self._queue = queue.Queue()
+        self._writer = None
+
+    def attach(self, optimizer):
+        r"""Start recording the steps of an optimizer."""
+        params = [p for group in optimizer.param_groups for p in group['params']]
+        if self.names is None:
+            self.names = [
+                f"{g}.{i}" for g, group in enumerate(optimizer.param_groups) for i in range(len(group['params']))
+            ]
+        if len(self.names) != len(params):
+            raise ValueError(f"Got {len(self.names)} names for {len(params)} parameters")
+
+        self._index = {p: i for i, p in enumerate(params)}
+        self._buffer = torch.full(
+            (self.flush_every, len(params), len(METRICS)), float('nan'), dtype=torch.float32, device=params[0].device
+        )
+
+        header = json.dumps({'version': VERSION, 'metrics': METRICS, 'names': self.names}).encode()
+        file = open(self.path, 'wb')
+        file.write(MAGIC + struct.pack('<I', len(header)) + header)
+        file.flush()
+
+        self._writer = threading.Thread(target=self._write_loop, args=(file,), name='optimizer-telemetry', daemon=True)
+        self._writer.start()
+
+        optimizer.telemetry = self
+        return self
+
+    def begin_step(self):
+        self._step += 1
+        self.active = self._step % self.interval == 0
+        if self.active:
+            self._steps.append(self._step)
+
+    def record(self, p: torch.Tensor, metric: str, value):
+        r"""Store a statistic of parameter p for the current step. value is a 0-dim tensor or a python number."""
+        slot = self._buffer[len(self._steps) - 1, self._index[p], _METRIC_INDEX[metric]]
+        if isinstance(value, torch.Tensor):
+            # Device to device copy of a single element, no sync
+            slot.copy_(value.detach().reshape(()), non_blocking=True)
+        else:
+            slot.fill_(value)
+
+    def end_step(self):
+        if self.active and len(self._steps) == self.flush_every:
+            self.flush()
+        self.active = False
+
+    def flush(self):
+        r"""Hand the recorded rows to the writer thread without waiting for the device."""
+        if not self._steps:
+            return
+
+        rows = self._buffer[:len(self._steps)]
+        event = None
+        if rows.is_cuda:
+            host = torch.empty(rows.shape, dtype=rows.dtype, pin_memory=True)
+            host.copy_(rows, non_blocking=True)
+            event = torch.cuda.Event()
+            event.record()
+        else:
+            host = rows.clone()
+
+        self._queue.put((self._steps, host, event))
+        self._steps = []
+        # Ordered after the copy on the device, so it can't clobber rows that are still being read
+        self._buffer.fill_(float('nan'))
+
+    def close(self):
+        r"""Flush what is left and wait for the writer to finish."""
+        if self._writer is None:
+            return
+        self.flush()
+        self._queue.put(None)
+        self._writer.join()
+        self._writer = None
+
+    def _write_loop(self, file):
+        with file:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                steps, host, event = item
+                if event is not None:
+                    event.synchronize()
+
+                values = host.reshape(len(steps), -1)
+                for step, row in zip(steps, values):
+                    file.write(struct.pack('<q', step))
+                    file.write(row.numpy().astype('<f4').tobytes())
+                file.flush()
+
+
+def read_telemetry(path: str, offset: int = 0):
+    r"""Read the header and every complete record of a telemetry log, starting at byte offset (0 = from the start).
+
+    Returns (header, records, offset), where records is a list of (step, {name: {metric: value}}) and offset is the
+    position to pass to the next call, so a growing log can be tailed.
+    """
+    with open(path, 'rb') as f:
+        if f.read(4) != MAGIC:
+            raise ValueError(f"{path} is not an optimizer telemetry log")
+        (header_len,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(header_len))
+        offset = max(offset, f.tell())
+
+        names, metrics = header['names'], header['metrics']
+        values_per_step = len(names) * len(metrics)
+        record_size = 8 + 4 * values_per_step
+
+        f.seek(offset)
+        data = f.read()
+
+    records = []
+    for start in range(0, len(data) - record_size + 1, record_size):
+        (step,) = struct.unpack_from('<q', data, start)
+        values = array('f', data[start + 8:start + record_size])
+        if sys.byteorder == 'big':
+            values.byteswap()
+        records.append((step, {
+            name: dict(zip(metrics, values[i * len(metrics):(i + 1) * len(metrics)])) for i, name in enumerate(names)
+        }))
+        offset += record_size
+
+    return header, records, offset
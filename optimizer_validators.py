@@ -0,0 +1,435 @@
+"""Validators and coercers of optimizer args. Generated by generate_schema.py from the optimizer schema, do not edit.
+
+``validate_optimizer_args`` checks a config like the optimizer constructors would (types, bounds, enum options, unknown
+names) and turns it into constructor kwargs: beta1/beta2/beta3 become a ``betas`` tuple, args with a ``kwarg`` in the
+schema are renamed to it (AdamW's epsilon is passed as eps), numeric strings become numbers and dtype names lose any
+``torch.`` prefix. It imports neither torch nor the optimizers, so a queue of sweep configs can be checked at
+submission time instead of failing after the job has loaded the model::
+
+    kwargs = validate_optimizer_args('CAME', {'lr': '1e-4', 'beta1': 0.9, 'update_strategy': 'grams'})
+    optimizer = create_optimizer('CAME', model.parameters(), **kwargs)
+
+Args that are left out are left out of the kwargs too, so constructor defaults apply. A missing beta is filled in with
+its schema default, as ``betas`` is only passed whole.
+"""
+
+import math
+
+
+class OptimizerConfigError(ValueError):
+    """All problems found in one optimizer config, in ``errors``."""
+
+    def __init__(self, optimizer_id, errors):
+        super().__init__(f"Invalid {optimizer_id} config: " + '; '.join(errors))
+        self.optimizer_id = optimizer_id
+        self.errors = errors
+
+
+def _number(args, name, kind, errors, low=None, high=None, low_exclusive=False, high_exclusive=False, nullable=False):
+    value = args[name]
+    if value is None and nullable:
+        return None
+    if isinstance(value, str):
+        try:
+            value = kind(value.strip())
+        except ValueError:
+            errors.append(f"{name}: {value!r} is not a valid {kind.__name__}")
+            return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        errors.append(f"{name}: expected {kind.__name__}, got {type(value).__name__}")
+        return None
+
+    if kind is int:
+        if isinstance(value, float) and not value.is_integer():
+            errors.append(f"{name}: expected int, got {value!r}")
+            return None
+        value = int(value)
+    else:
+        value = float(value)
+        if not math.isfinite(value):
+            errors.append(f"{name}: {value} is not finite")
+            return None
+
+    if low is not None and (value <= low if low_exclusive else value < low):
+        errors.append(f"{name}: {value} must be {'>' if low_exclusive else '>='} {low}")
+    elif high is not None and (value >= high if high_exclusive else value > high):
+        errors.append(f"{name}: {value} must be {'<' if high_exclusive else '<='} {high}")
+    return value
+
+
+def _bool(args, name, errors, nullable=False):
+    value = args[name]
+    if value is None and nullable or isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ('true', 'false'):
+        return value.strip().lower() == 'true'
+    errors.append(f"{name}: expected bool, got {value!r}")
+    return None
+
+
+def _string(args, name, errors, nullable=False):
+    value = args[name]
+    if value is None and nullable or isinstance(value, str):
+        return value
+    errors.append(f"{name}: expected str, got {type(value).__name__}")
+    return None
+
+
+def _choice(args, name, options, errors, nullable=False, dtype=False):
+    value = args[name]
+    if value is None and nullable:
+        return None
+    if isinstance(value, str):
+        # Like the constructors, accept dtypes written as 'torch.bfloat16'
+        value = value.strip().split('.')[-1] if dtype else value.strip()
+        if value in options:
+            return value
+    errors.append(f"{name}: {value!r} is not one of {list(options)}")
+    return None
+
+
+_DTYPE_ALIASES = {'fp32': 'float32', 'bf16': 'bfloat16', 'fp16': 'float16'}
+
+
+def _mapping(args, name, keys, options, errors, nullable=False, dtype=False):
+    value = args[name]
+    if value is None and nullable:
+        return None
+    if not isinstance(value, dict):
+        errors.append(f"{name}: expected dict, got {type(value).__name__}")
+        return None
+
+    mapping = {}
+    for key, item in value.items():
+        if key not in keys:
+            errors.append(f"{name}: {key!r} is not one of {list(keys)}")
+            continue
+        if dtype:
+            # Like the constructors, accept torch dtypes, 'torch.bfloat16' and short names like 'bf16'
+            item = str(item).strip().split('.')[-1]
+            item = _DTYPE_ALIASES.get(item, item)
+        if item not in options:
+            errors.append(f"{name}: {key}={item!r} is not one of {list(options)}")
+            continue
+        mapping[key] = item
+    return mapping
+
+
+def _unknown(args, known, kwargs, errors, strict):
+    for name in sorted(args.keys() - known):
+        if strict:
+            errors.append(f"{name}: unknown argument")
+        else:
+            kwargs[name] = args[name]
+
+
+_ADABELIEF_ARGS = frozenset(['adam_debias', 'adanorm', 'ams_bound', 'beta1', 'beta2', 'bf16_mode', 'cautious', 'degenerated_to_sgd', 'eps', 'factored', 'fixed_decay', 'flat_state', 'hibernate_after', 'hibernate_to', 'lr', 'n_sma_threshold', 'num_workers', 'projection_interval', 'projection_min_numel', 'projection_rank', 'r', 'rectify', 'skip_non_finite', 'state_dtypes', 'weight_decay', 'weight_decouple'])
+
+
+def _validate_AdaBelief(args, strict):
+    errors = []
+    kwargs = {}
+    if 'lr' in args:
+        kwargs['lr'] = _number(args, 'lr', float, errors, low=0.0)
+    if 'weight_decay' in args:
+        kwargs['weight_decay'] = _number(args, 'weight_decay', float, errors, low=0.0)
+    if 'weight_decouple' in args:
+        kwargs['weight_decouple'] = _bool(args, 'weight_decouple', errors)
+    if 'fixed_decay' in args:
+        kwargs['fixed_decay'] = _bool(args, 'fixed_decay', errors)
+    if 'rectify' in args:
+        kwargs['rectify'] = _bool(args, 'rectify', errors)
+    if 'n_sma_threshold' in args:
+        kwargs['n_sma_threshold'] = _number(args, 'n_sma_threshold', int, errors)
+    if 'degenerated_to_sgd' in args:
+        kwargs['degenerated_to_sgd'] = _bool(args, 'degenerated_to_sgd', errors)
+    if 'ams_bound' in args:
+        kwargs['ams_bound'] = _bool(args, 'ams_bound', errors)
+    if 'r' in args:
+        kwargs['r'] = _number(args, 'r', float, errors)
+    if 'adanorm' in args:
+        kwargs['adanorm'] = _bool(args, 'adanorm', errors)
+    if 'adam_debias' in args:
+        kwargs['adam_debias'] = _bool(args, 'adam_debias', errors)
+    if 'eps' in args:
+        kwargs['eps'] = _number(args, 'eps', float, errors, low=0.0)
+    if 'cautious' in args:
+        kwargs['cautious'] = _bool(args, 'cautious', errors)
+    if 'factored' in args:
+        kwargs['factored'] = _bool(args, 'factored', errors)
+    if 'flat_state' in args:
+        kwargs['flat_state'] = _bool(args, 'flat_state', errors)
+    if 'num_workers' in args:
+        kwargs['num_workers'] = _number(args, 'num_workers', int, errors)
+    if 'bf16_mode' in args:
+        kwargs['bf16_mode'] = _choice(args, 'bf16_mode', ('stochastic', 'kahan'), errors)
+    if 'skip_non_finite' in args:
+        kwargs['skip_non_finite'] = _bool(args, 'skip_non_finite', errors)
+    if 'state_dtypes' in args:
+        kwargs['state_dtypes'] = _mapping(args, 'state_dtypes', ('exp_avg', 'exp_avg_var', 'max_exp_avg_var'), ('float32', 'bfloat16', 'float16'), errors, nullable=True, dtype=True)
+    if 'hibernate_after' in args:
+        kwargs['hibernate_after'] = _number(args, 'hibernate_after', int, errors, low=0)
+    if 'hibernate_to' in args:
+        kwargs['hibernate_to'] = _choice(args, 'hibernate_to', ('cpu', 'disk'), errors)
+    if 'projection_rank' in args:
+        kwargs['projection_rank'] = _number(args, 'projection_rank', int, errors, low=0)
+    if 'projection_interval' in args:
+        kwargs['projection_interval'] = _number(args, 'projection_interval', int, errors, low=1)
+    if 'projection_min_numel' in args:
+        kwargs['projection_min_numel'] = _number(args, 'projection_min_numel', int, errors)
+    if 'beta1' in args or 'beta2' in args:
+        kwargs['betas'] = (
+            _number(args, 'beta1', float, errors, low=0.0, high=1.0, high_exclusive=True) if 'beta1' in args else 0.9,
+            _number(args, 'beta2', float, errors, low=0.0, high=1.0, high_exclusive=True) if 'beta2' in args else 0.999,
+        )
+    _unknown(args, _ADABELIEF_ARGS, kwargs, errors, strict)
+    return kwargs, errors
+
+
+_CAME_ARGS = frozenset(['ams_bound', 'beta1', 'beta2', 'beta3', 'bf16_mode', 'cautious', 'clip_threshold', 'eps1', 'eps2', 'fixed_decay', 'flat_state', 'hibernate_after', 'hibernate_to', 'lr', 'num_workers', 'precondition_interval', 'precondition_min_numel', 'skip_non_finite', 'state_dtypes', 'update_strategy', 'weight_decay', 'weight_decouple'])
+
+
+def _validate_CAME(args, strict):
+    errors = []
+    kwargs = {}
+    if 'lr' in args:
+        kwargs['lr'] = _number(args, 'lr', float, errors, low=0.0)
+    if 'weight_decay' in args:
+        kwargs['weight_decay'] = _number(args, 'weight_decay', float, errors, low=0.0)
+    if 'weight_decouple' in args:
+        kwargs['weight_decouple'] = _bool(args, 'weight_decouple', errors)
+    if 'fixed_decay' in args:
+        kwargs['fixed_decay'] = _bool(args, 'fixed_decay', errors)
+    if 'clip_threshold' in args:
+        kwargs['clip_threshold'] = _number(args, 'clip_threshold', float, errors)
+    if 'ams_bound' in args:
+        kwargs['ams_bound'] = _bool(args, 'ams_bound', errors)
+    if 'eps1' in args:
+        kwargs['eps1'] = _number(args, 'eps1', float, errors, low=0.0)
+    if 'eps2' in args:
+        kwargs['eps2'] = _number(args, 'eps2', float, errors, low=0.0)
+    if 'cautious' in args:
+        kwargs['cautious'] = _bool(args, 'cautious', errors)
+    if 'update_strategy' in args:
+        kwargs['update_strategy'] = _choice(args, 'update_strategy', ('unmodified', 'cautious', 'grams'), errors)
+    if 'flat_state' in args:
+        kwargs['flat_state'] = _bool(args, 'flat_state', errors)
+    if 'num_workers' in args:
+        kwargs['num_workers'] = _number(args, 'num_workers', int, errors)
+    if 'precondition_interval' in args:
+        kwargs['precondition_interval'] = _number(args, 'precondition_interval', int, errors, low=1)
+    if 'precondition_min_numel' in args:
+        kwargs['precondition_min_numel'] = _number(args, 'precondition_min_numel', int, errors)
+    if 'bf16_mode' in args:
+        kwargs['bf16_mode'] = _choice(args, 'bf16_mode', ('stochastic', 'kahan'), errors)
+    if 'skip_non_finite' in args:
+        kwargs['skip_non_finite'] = _bool(args, 'skip_non_finite', errors)
+    if 'state_dtypes' in args:
+        kwargs['state_dtypes'] = _mapping(args, 'state_dtypes', ('exp_avg', 'exp_avg_sq', 'exp_avg_sq_hat', 'exp_avg_sq_row', 'exp_avg_sq_col', 'exp_avg_res_row', 'exp_avg_res_col'), ('float32', 'bfloat16', 'float16'), errors, nullable=True, dtype=True)
+    if 'hibernate_after' in args:
+        kwargs['hibernate_after'] = _number(args, 'hibernate_after', int, errors, low=0)
+    if 'hibernate_to' in args:
+        kwargs['hibernate_to'] = _choice(args, 'hibernate_to', ('cpu', 'disk'), errors)
+    if 'beta1' in args or 'beta2' in args or 'beta3' in args:
+        kwargs['betas'] = (
+            _number(args, 'beta1', float, errors, low=0.0, high=1.0, high_exclusive=True) if 'beta1' in args else 0.9,
+            _number(args, 'beta2', float, errors, low=0.0, high=1.0, high_exclusive=True) if 'beta2' in args else 0.999,
+            _number(args, 'beta3', float, errors, low=0.0, high=1.0) if 'beta3' in args else 0.9999,
+        )
+    _unknown(args, _CAME_ARGS, kwargs, errors, strict)
+    return kwargs, errors
+
+
+_OCGOPT_ARGS = frozenset(['adaptive', 'adaptive_max', 'adaptive_min', 'beta1', 'beta2', 'beta3', 'bf16_mode', 'cautious_min', 'centralization', 'flat_state', 'hibernate_after', 'hibernate_to', 'input_norm', 'lowpass_grad', 'lr', 'num_workers', 'precondition_interval', 'precondition_min_numel', 'projection_interval', 'projection_min_numel', 'projection_rank', 'sim_match', 'skip_non_finite', 'spectral_adaptive', 'spectral_clip_compile', 'spectral_clip_dtype', 'spectral_clip_refine_steps', 'state_dtypes', 'stochastic_fp', 'weight_decay', 'weight_decay_rate'])
+
+
+def _validate_OCGOpt(args, strict):
+    errors = []
+    kwargs = {}
+    if 'lr' in args:
+        kwargs['lr'] = _number(args, 'lr', float, errors)
+    if 'weight_decay' in args:
+        kwargs['weight_decay'] = _number(args, 'weight_decay', float, errors)
+    if 'weight_decay_rate' in args:
+        kwargs['weight_decay_rate'] = _number(args, 'weight_decay_rate', float, errors)
+    if 'centralization' in args:
+        kwargs['centralization'] = _number(args, 'centralization', float, errors)
+    if 'spectral_adaptive' in args:
+        kwargs['spectral_adaptive'] = _bool(args, 'spectral_adaptive', errors)
+    if 'spectral_clip_compile' in args:
+        kwargs['spectral_clip_compile'] = _bool(args, 'spectral_clip_compile', errors)
+    if 'spectral_clip_dtype' in args:
+        kwargs['spectral_clip_dtype'] = _choice(args, 'spectral_clip_dtype', ('float32', 'float16', 'bfloat16', 'float64'), errors, nullable=True, dtype=True)
+    if 'spectral_clip_refine_steps' in args:
+        kwargs['spectral_clip_refine_steps'] = _number(args, 'spectral_clip_refine_steps', int, errors)
+    if 'adaptive' in args:
+        kwargs['adaptive'] = _bool(args, 'adaptive', errors)
+    if 'adaptive_min' in args:
+        kwargs['adaptive_min'] = _number(args, 'adaptive_min', float, errors)
+    if 'adaptive_max' in args:
+        kwargs['adaptive_max'] = _number(args, 'adaptive_max', float, errors)
+    if 'input_norm' in args:
+        kwargs['input_norm'] = _bool(args, 'input_norm', errors)
+    if 'lowpass_grad' in args:
+        kwargs['lowpass_grad'] = _number(args, 'lowpass_grad', float, errors)
+    if 'sim_match' in args:
+        kwargs['sim_match'] = _bool(args, 'sim_match', errors)
+    if 'cautious_min' in args:
+        kwargs['cautious_min'] = _number(args, 'cautious_min', float, errors)
+    if 'stochastic_fp' in args:
+        kwargs['stochastic_fp'] = _bool(args, 'stochastic_fp', errors)
+    if 'flat_state' in args:
+        kwargs['flat_state'] = _bool(args, 'flat_state', errors)
+    if 'num_workers' in args:
+        kwargs['num_workers'] = _number(args, 'num_workers', int, errors)
+    if 'precondition_interval' in args:
+        kwargs['precondition_interval'] = _number(args, 'precondition_interval', int, errors)
+    if 'precondition_min_numel' in args:
+        kwargs['precondition_min_numel'] = _number(args, 'precondition_min_numel', int, errors)
+    if 'bf16_mode' in args:
+        kwargs['bf16_mode'] = _choice(args, 'bf16_mode', ('stochastic', 'kahan'), errors)
+    if 'skip_non_finite' in args:
+        kwargs['skip_non_finite'] = _bool(args, 'skip_non_finite', errors)
+    if 'state_dtypes' in args:
+        kwargs['state_dtypes'] = _mapping(args, 'state_dtypes', ('value_momentum', 'centralized_momentum', 'denom'), ('float32', 'bfloat16', 'float16'), errors, nullable=True, dtype=True)
+    if 'hibernate_after' in args:
+        kwargs['hibernate_after'] = _number(args, 'hibernate_after', int, errors)
+    if 'hibernate_to' in args:
+        kwargs['hibernate_to'] = _choice(args, 'hibernate_to', ('cpu', 'disk'), errors)
+    if 'projection_rank' in args:
+        kwargs['projection_rank'] = _number(args, 'projection_rank', int, errors)
+    if 'projection_interval' in args:
+        kwargs['projection_interval'] = _number(args, 'projection_interval', int, errors)
+    if 'projection_min_numel' in args:
+        kwargs['projection_min_numel'] = _number(args, 'projection_min_numel', int, errors)
+    if 'beta1' in args or 'beta2' in args or 'beta3' in args:
+        kwargs['betas'] = (
+            _number(args, 'beta1', float, errors, high=1.0) if 'beta1' in args else 0.95,
+            _number(args, 'beta2', float, errors, high=1.0) if 'beta2' in args else 0.9999999,
+            _number(args, 'beta3', float, errors, high=1.0) if 'beta3' in args else 0.9999999,
+        )
+    _unknown(args, _OCGOPT_ARGS, kwargs, errors, strict)
+    return kwargs, errors
+
+
+_ADAMW_ARGS = frozenset(['beta1', 'beta2', 'epsilon', 'weight_decay'])
+
+
+def _validate_AdamW(args, strict):
+    errors = []
+    kwargs = {}
+    if 'weight_decay' in args:
+        kwargs['weight_decay'] = _number(args, 'weight_decay', float, errors, low=0.0)
+    if 'epsilon' in args:
+        kwargs['eps'] = _number(args, 'epsilon', float, errors, low=0.0)
+    if 'beta1' in args or 'beta2' in args:
+        kwargs['betas'] = (
+            _number(args, 'beta1', float, errors, low=0.0, high=1.0, high_exclusive=True) if 'beta1' in args else 0.9,
+            _number(args, 'beta2', float, errors, low=0.0, high=1.0, high_exclusive=True) if 'beta2' in args else 0.999,
+        )
+    _unknown(args, _ADAMW_ARGS, kwargs, errors, strict)
+    return kwargs, errors
+
+
+_ADAMW8BIT_ARGS = frozenset(['beta1', 'beta2', 'epsilon', 'weight_decay'])
+
+
+def _validate_AdamW8bit(args, strict):
+    errors = []
+    kwargs = {}
+    if 'weight_decay' in args:
+        kwargs['weight_decay'] = _number(args, 'weight_decay', float, errors, low=0.0)
+    if 'epsilon' in args:
+        kwargs['eps'] = _number(args, 'epsilon', float, errors, low=0.0)
+    if 'beta1' in args or 'beta2' in args:
+        kwargs['betas'] = (
+            _number(args, 'beta1', float, errors, low=0.0, high=1.0, high_exclusive=True) if 'beta1' in args else 0.9,
+            _number(args, 'beta2', float, errors, low=0.0, high=1.0, high_exclusive=True) if 'beta2' in args else 0.999,
+        )
+    _unknown(args, _ADAMW8BIT_ARGS, kwargs, errors, strict)
+    return kwargs, errors
+
+
+_ADAFACTOR_ARGS = frozenset(['relative_step', 'scale_parameter', 'warmup_init'])
+
+
+def _validate_Adafactor(args, strict):
+    errors = []
+    kwargs = {}
+    if 'scale_parameter' in args:
+        kwargs['scale_parameter'] = _bool(args, 'scale_parameter', errors)
+    if 'relative_step' in args:
+        kwargs['relative_step'] = _bool(args, 'relative_step', errors)
+    if 'warmup_init' in args:
+        kwargs['warmup_init'] = _bool(args, 'warmup_init', errors)
+    _unknown(args, _ADAFACTOR_ARGS, kwargs, errors, strict)
+    return kwargs, errors
+
+
+_PRODIGY_ARGS = frozenset(['d_coef', 'decouple', 'safeguard_warmup', 'use_bias_correction', 'weight_decay'])
+
+
+def _validate_Prodigy(args, strict):
+    errors = []
+    kwargs = {}
+    if 'weight_decay' in args:
+        kwargs['weight_decay'] = _number(args, 'weight_decay', float, errors)
+    if 'decouple' in args:
+        kwargs['decouple'] = _bool(args, 'decouple', errors)
+    if 'use_bias_correction' in args:
+        kwargs['use_bias_correction'] = _bool(args, 'use_bias_correction', errors)
+    if 'safeguard_warmup' in args:
+        kwargs['safeguard_warmup'] = _bool(args, 'safeguard_warmup', errors)
+    if 'd_coef' in args:
+        kwargs['d_coef'] = _number(args, 'd_coef', float, errors)
+    _unknown(args, _PRODIGY_ARGS, kwargs, errors, strict)
+    return kwargs, errors
+
+
+_VALIDATORS = {
+    'AdaBelief': _validate_AdaBelief,
+    'CAME': _validate_CAME,
+    'OCGOpt': _validate_OCGOpt,
+    'AdamW': _validate_AdamW,
+    'AdamW8bit': _validate_AdamW8bit,
+    'Adafactor': _validate_Adafactor,
+    'Prodigy': _validate_Prodigy,
+}
+
+
+OPTIMIZER_IDS = tuple(_VALIDATORS)
+
+
+def validate_optimizer_args(optimizer_id, args, strict=True):
+    """Check one config and return it as constructor kwargs, raising OptimizerConfigError with every problem found.
+
+    With strict=False, args missing from the schema (e.g. an lr passed to a standard optimizer) are passed through
+    unchecked instead of being rejected.
+    """
+    if optimizer_id not in _VALIDATORS:
+        raise KeyError(f"Unknown optimizer: {optimizer_id}")
+    kwargs, errors = _VALIDATORS[optimizer_id](args, strict)
+    if errors:
+        raise OptimizerConfigError(optimizer_id, errors)
+    return kwargs
+
+
+def validate_configs(configs, strict=True):
+    """Check many (optimizer_id, args) pairs. Returns {index: errors} of the invalid ones, empty if all are valid."""
+    invalid = {}
+    for index, (optimizer_id, args) in enumerate(configs):
+        validate = _VALIDATORS.get(optimizer_id)
+        if validate is None:
+            invalid[index] = [f"unknown optimizer: {optimizer_id}"]
+            continue
+        errors = validate(args, strict)[1]
+        if errors:
+            invalid[index] = errors
+    return invalid
+
+
+def create_validated_optimizer(optimizer_id, params, args, strict=True):
+    """Validate a config, then construct the optimizer through optimizer_registry."""
+    from .optimizer_registry import create_optimizer
+
+    return create_optimizer(optimizer_id, params, **validate_optimizer_args(optimizer_id, args, strict=strict))
@@ -6,7 +6,35 @@ import torch
 from pytorch_optimizer.base.exception import NoSparseGradientError
 from pytorch_optimizer.base.optimizer import BaseOptimizer
 from pytorch_optimizer.base.type import Betas, Closure, Defaults, Loss, ParamGroup
-from .utils import copy_stochastic_
+from .utils import (
+    BF16_MODES,
+    HIBERNATE_TARGETS,
+    FlatStateBuffers,
+    NonFiniteGuard,
+    StateHibernation,
+    change_basis,
+    expand_rows,
+    index_copy_rows_,
+    lazy_ema_weights,
+    lazy_skipped_steps,
+    pack_state_,
+    parallel_param_update,
+    parse_state_dtypes,
+    preconditioner_due,
+    project,
+    project_back,
+    projected_shape,
+    projects,
+    refresh_projector,
+    rms,
+    sparse_rows,
+    unpack_state,
+    write_param_,
+    zeros_state,
+)
+
+# State a state_dtypes policy can store in another dtype, the factored row/col statistics always stay in fp32
+STATE_DTYPE_KEYS = ('exp_avg', 'exp_avg_var', 'max_exp_avg_var')
 
 
 class AdaBelief(BaseOptimizer):
@@ -27,6 +55,32 @@ class AdaBelief(BaseOptimizer):
     :param adam_debias: bool. Only correct the denominator to avoid inflating step sizes early in training.
     :param eps: float. term added to the denominator to improve numerical stability.
     :param cautious: bool: Use cautious mask on parameter update - https://arxiv.org/abs/2411.16085
+    :param factored: bool. track the belief variance of params with 2 or more dims as row/col statistics
+        (Adafactor-style), cutting its memory from O(nm) to O(n + m).
+    :param flat_state: bool. keep each moment of a param group in one contiguous buffer and decay it with a single op
+        when every param of the group has a gradient.
+    :param num_workers: int. update parameters on this many threads, split into chunks of roughly equal size. mainly
+        useful for CPU training.
+    :param bf16_mode: str. how updates are written back into 16-bit params: 'stochastic' rounding, or 'kahan' summation
+        with a param-sized 16-bit compensation buffer, which needs no random numbers.
+    :param skip_non_finite: bool. skip steps whose gradients hold a NaN or Inf, leaving params and state untouched,
+        decided on device without a host sync. skipped steps are counted in `non_finite.skipped_steps`.
+    :param state_dtypes: dict. dtype per state tensor, e.g. {'exp_avg': 'bfloat16', 'exp_avg_var': 'float32'}, keys
+        from STATE_DTYPE_KEYS. states without an entry use the param dtype. updates are computed in fp32 (or the
+        param dtype if wider) and written back to 16-bit states with stochastic rounding.
+    :param hibernate_after: int. move the state of a param to the host after this many consecutive steps without a
+        gradient, and back to the device when it gets one again. 0 disables it. see `hibernation.hibernated_bytes`.
+    :param hibernate_to: str. where hibernated state goes: pinned 'cpu' memory, or a temp file on 'disk' mapped back
+        with mmap.
+    :param projection_rank: int. keep the state of matrices in a rank-r subspace of their gradient (GaLore-style),
+        cutting it from O(mn) to O((m + n) r). the moments are updated in the subspace and the update is projected
+        back. 0 disables it. not supported with factored or flat_state.
+    :param projection_interval: int. refit each projector to the gradient every this many steps, by randomized range
+        finding. refreshes are staggered across params and exp_avg is carried over to the new subspace.
+    :param projection_min_numel: int. only matrices with at least this many elements are projected.
+
+    Set `telemetry` (see optimizer_telemetry.OptimizerTelemetry.attach) to record grad RMS, update RMS, cautious keep
+    ratio and n_sma per param without syncing the device.
     """
 
     def __init__(
@@ -46,12 +100,32 @@ class AdaBelief(BaseOptimizer):
         adam_debias: bool = False,
         eps: float = 1e-16,
         cautious: bool = False,
+        factored: bool = False,
+        flat_state: bool = False,
+        num_workers: int = 1,
+        bf16_mode: str = 'stochastic',
+        skip_non_finite: bool = False,
+        state_dtypes: dict = None,
+        hibernate_after: int = 0,
+        hibernate_to: str = 'cpu',
+        projection_rank: int = 0,
+        projection_interval: int = 200,
+        projection_min_numel: int = 0,
         **kwargs,
     ):
         self.validate_learning_rate(lr)
         self.validate_betas(betas)
         self.validate_non_negative(weight_decay, 'weight_decay')
         self.validate_non_negative(eps, 'eps')
+        self.validate_non_negative(hibernate_after, 'hibernate_after')
+        self.validate_non_negative(projection_rank, 'projection_rank')
+        self.validate_positive(projection_interval, 'projection_interval')
+        if projection_rank > 0 and (factored or flat_state):
+            raise ValueError("projection_rank is not supported with factored or flat_state")
+        if bf16_mode not in BF16_MODES:
+            raise ValueError("Invalid bf16 mode: {}".format(bf16_mode))
+        if hibernate_to not in HIBERNATE_TARGETS:
+            raise ValueError("Invalid hibernate target: {}".format(hibernate_to))
 
         self.n_sma_threshold = n_sma_threshold
         self.degenerated_to_sgd = degenerated_to_sgd
@@ -68,12 +142,25 @@ class AdaBelief(BaseOptimizer):
             'adam_debias': adam_debias,
             'eps': eps,
             'cautious': cautious,
+            'factored': factored,
+            'flat_state': flat_state,
+            'bf16_mode': bf16_mode,
+            'state_dtypes': parse_state_dtypes(state_dtypes, STATE_DTYPE_KEYS),
+            'projection_rank': projection_rank,
+            'projection_interval': projection_interval,
+            'projection_min_numel': projection_min_numel,
         }
         if adanorm:
             defaults.update({'r': r})
 
         super().__init__(params, defaults)
 
+        self.flat_state = FlatStateBuffers()
+        self.num_workers = num_workers
+        self.non_finite = NonFiniteGuard() if skip_non_finite else None
+        self.hibernation = StateHibernation(hibernate_after, hibernate_to) if hibernate_after > 0 else None
+        self.telemetry = None
+
     def __str__(self) -> str:
         return 'AdaBelief'
     
@@ -87,12 +174,115 @@ class AdaBelief(BaseOptimizer):
             for p in group['params']:
                 state = self.state[p]
 
-                state['exp_avg'] = torch.zeros_like(p)
-                state['exp_avg_var'] = torch.zeros_like(p)
+                state.clear()
+                shape = projected_shape(p, group['projection_rank']) if projects(p, group) else None
+                state['exp_avg'] = zeros_state(group, 'exp_avg', p, shape)
+                if group['factored'] and p.ndim >= 2:
+                    self.init_factored_state(state, p, group['ams_bound'])
+                else:
+                    state['exp_avg_var'] = zeros_state(group, 'exp_avg_var', p, shape)
+                    if group['ams_bound']:
+                        state['max_exp_avg_var'] = zeros_state(group, 'max_exp_avg_var', p, shape)
                 if group['adanorm']:
                     state['exp_grad_norm'] = torch.zeros((1,), dtype=p.dtype, device=p.device)
-                if group['ams_bound']:
-                    state['max_exp_avg_var'] = torch.zeros_like(p)
+
+    @staticmethod
+    def init_factored_state(state, p: torch.Tensor, ams_bound: bool):
+        r"""Row/col statistics of the belief variance, kept in fp32 since they are small."""
+        row_shape, col_shape = p.shape[:-1], p.shape[:-2] + p.shape[-1:]
+        keys = ['exp_avg_var'] + (['max_exp_avg_var'] if ams_bound else [])
+        for key in keys:
+            state[f'{key}_row'] = torch.zeros(row_shape, dtype=torch.float32, device=p.device)
+            state[f'{key}_col'] = torch.zeros(col_shape, dtype=torch.float32, device=p.device)
+
+    @staticmethod
+    def approximate_belief_var(exp_avg_var_row: torch.Tensor, exp_avg_var_col: torch.Tensor, output: torch.Tensor):
+        r"""Reconstruct the belief variance from its row/col statistics."""
+        r_factor: torch.Tensor = (exp_avg_var_row / exp_avg_var_row.mean(dim=-1, keepdim=True)).unsqueeze(-1)
+        return torch.mul(r_factor, exp_avg_var_col.unsqueeze(-2), out=output)
+
+    def update_sparse(self, p, group, step_size: float, bias_correction2_sq: float, n_sma: float, record=None,
+                      generator=None):
+        r"""Lazy update of the rows touched by a row-sparse gradient (e.g. token embeddings).
+
+        Only the touched rows of the moments and the param are read and written, so the cost scales with the number
+        of touched rows rather than the vocabulary. Moments of rows skipped since their last update are first decayed
+        in closed form, as if they had seen zero gradients. Their params only catch up on decoupled weight decay, they
+        don't follow the decaying momentum in between (like LazyAdam).
+        """
+        sparse = sparse_rows(p.grad)
+        if sparse is None:
+            raise NoSparseGradientError(str(self), note='sparse dims other than the first')
+        rows, grad = sparse
+        grad = grad.to(torch.float32)
+
+        state = self.state[p]
+        beta1, beta2 = group['betas']
+        skipped = lazy_skipped_steps(state, p, rows, group['step'])
+
+        p_rows = p.index_select(0, rows).to(torch.float32)
+        exp_avg = state['exp_avg'].index_select(0, rows).to(torch.float32)
+        exp_avg_var = state['exp_avg_var'].index_select(0, rows).to(torch.float32)
+
+        # m_k = b1^k * m, s_k = b2^k * s + (1 - b2) * m^2 * sum_j b2^(k-j) b1^(2j) + eps * (1 - b2^k) / (1 - b2)
+        decay1, decay2, residual_weight = (expand_rows(w, grad) for w in lazy_ema_weights(beta1, beta2, skipped))
+        exp_avg_var.mul_(decay2).addcmul_(exp_avg.square(), residual_weight, value=1.0 - beta2)
+        exp_avg_var.add_((1.0 - decay2).mul_(group['eps'] / (1.0 - beta2)))
+        exp_avg.mul_(decay1)
+
+        if group['weight_decouple']:
+            decay = 1.0 - group['weight_decay'] * (1.0 if group['fixed_decay'] else group['lr'])
+            p_rows.mul_(expand_rows(torch.pow(decay, skipped + 1), p_rows))
+        elif group['weight_decay'] > 0.0:
+            grad.add_(p_rows, alpha=group['weight_decay'])
+
+        if record:
+            record(p, 'grad_rms', rms(grad))
+
+        exp_avg.mul_(beta1).add_(grad, alpha=1.0 - beta1)
+        grad_residual = grad - exp_avg
+        exp_avg_var.mul_(beta2).addcmul_(grad_residual, grad_residual, value=1.0 - beta2).add_(group['eps'])
+
+        max_exp_avg_var = (
+            state['max_exp_avg_var'].index_select(0, rows).to(torch.float32) if group['ams_bound'] else None
+        )
+        de_nom = self.apply_ams_bound(
+            ams_bound=group['ams_bound'],
+            exp_avg_sq=exp_avg_var,
+            max_exp_avg_sq=max_exp_avg_var,
+            eps=group['eps'],
+        )
+
+        if group['cautious']:
+            mask = (exp_avg * grad > 0).to(grad.dtype)
+            keep_ratio = mask.mean()
+            if record:
+                record(p, 'keep_ratio', keep_ratio)
+            mask.div_(keep_ratio.clamp(min=1e-3))
+        else:
+            mask = 1.0
+
+        if not group['rectify']:
+            de_nom.div_(bias_correction2_sq)
+        elif record:
+            record(p, 'n_sma', n_sma)
+
+        update = None
+        if not group['rectify'] or n_sma >= self.n_sma_threshold:
+            update = (exp_avg * mask).div_(de_nom).mul_(step_size)
+        elif step_size > 0:
+            update = (exp_avg * mask).mul_(step_size)
+
+        if update is not None:
+            if record:
+                record(p, 'update_rms', rms(update))
+            p_rows.sub_(update)
+
+        index_copy_rows_(state['exp_avg'], rows, exp_avg, generator)
+        index_copy_rows_(state['exp_avg_var'], rows, exp_avg_var, generator)
+        if group['ams_bound']:
+            index_copy_rows_(state['max_exp_avg_var'], rows, max_exp_avg_var, generator)
+        write_param_(p, p_rows, state, group['bf16_mode'], generator, rows=rows)
 
     @torch.no_grad()
     def step(self, closure: Closure = None) -> Loss:
@@ -101,6 +291,18 @@ class AdaBelief(BaseOptimizer):
             with torch.enable_grad():
                 loss = closure()
 
+        telemetry = self.telemetry
+        if telemetry is not None:
+            telemetry.begin_step()
+        record = telemetry.record if telemetry is not None and telemetry.active else None
+
+        if self.hibernation is not None:
+            self.hibernation.step(self.param_groups, self.state)
+
+        non_finite = self.non_finite
+        if non_finite is not None:
+            non_finite.check(self.param_groups)
+
         for group in self.param_groups:
             if 'step' in group:
                 group['step'] += 1
@@ -127,31 +329,69 @@ class AdaBelief(BaseOptimizer):
                 bias_correction1=bias_correction1,
             )
 
-            for p in group['params']:
-                if p.grad is None:
-                    continue
-
+            flat = None
+            bulk_decay = False
+            offsets = {p: i for i, p in enumerate(group['params'])} if group['projection_rank'] > 0 else None
+            if group['flat_state']:
+                keys = ['exp_avg']
+                if not group['factored']:
+                    keys += ['exp_avg_var'] + (['max_exp_avg_var'] if group['ams_bound'] else [])
+                flat = self.flat_state.prepare(self.state, group, keys)
+
+                # Skipped params (and rows of sparse ones) must not decay, so only decay whole buffers when every
+                # param has a dense gradient and no non-finite guard may have to undo the step. 16-bit buffers are
+                # left to the per-param path, which decays them after unpacking to fp32.
+                bulk_decay = non_finite is None and all(
+                    p.grad is not None and not p.grad.is_sparse for p in group['params']
+                )
+                if bulk_decay:
+                    for buffer in flat.buffers('exp_avg'):
+                        if buffer.dtype not in {torch.float16, torch.bfloat16}:
+                            buffer.mul_(beta1)
+                    for buffer in flat.buffers('exp_avg_var') if not group['factored'] else []:
+                        if buffer.dtype not in {torch.float16, torch.bfloat16}:
+                            buffer.mul_(beta2).add_(group['eps'])
+
+            def update_param(p, generator=None):
                 grad = p.grad
-                if grad.is_sparse:
-                    raise NoSparseGradientError(str(self))
-
                 state = self.state[p]
 
+                factored = group['factored'] and grad.ndim >= 2
+                var_flat = flat if not group['factored'] else None
+                projected = not grad.is_sparse and projects(p, group)
+                shape = projected_shape(p, group['projection_rank']) if projected else None
+
+                if len(state) == 0:
+                    state['exp_avg'] = flat.view('exp_avg', p) if flat else zeros_state(group, 'exp_avg', p, shape)
+                    if factored:
+                        self.init_factored_state(state, p, group['ams_bound'])
+                    else:
+                        state['exp_avg_var'] = (
+                            var_flat.view('exp_avg_var', p) if var_flat else zeros_state(group, 'exp_avg_var', p, shape)
+                        )
+                        if group['ams_bound']:
+                            state['max_exp_avg_var'] = (
+                                var_flat.view('max_exp_avg_var', p) if var_flat
+                                else zeros_state(group, 'max_exp_avg_var', p, shape)
+                            )
+                    if group['adanorm']:
+                        state['exp_grad_norm'] = torch.zeros((1,), dtype=p.dtype, device=p.device)
+
+                if grad.is_sparse:
+                    if factored or group['adanorm']:
+                        raise NoSparseGradientError(str(self), note='factored or adanorm')
+                    self.update_sparse(p, group, step_size, bias_correction2_sq, n_sma, record, generator)
+                    return
+
                 p_fp32 = p
+                dtype = p.dtype
 
                 # unpack
                 if p.dtype in {torch.float16, torch.bfloat16}:
+                    dtype = torch.float32
                     grad = grad.to(torch.float32)
                     p_fp32 = p.clone().to(torch.float32)
 
-                if len(state) == 0:
-                    state['exp_avg'] = torch.zeros_like(p)
-                    state['exp_avg_var'] = torch.zeros_like(p)
-                    if group['adanorm']:
-                        state['exp_grad_norm'] = torch.zeros((1,), dtype=p.dtype, device=p.device)
-                    if group['ams_bound']:
-                        state['max_exp_avg_var'] = torch.zeros_like(p)
-
                 self.apply_weight_decay(
                     p=p_fp32,
                     grad=grad,
@@ -161,19 +401,33 @@ class AdaBelief(BaseOptimizer):
                     fixed_decay=group['fixed_decay'],
                 )
 
-                exp_avg, exp_avg_var = state['exp_avg'], state['exp_avg_var']
+                exp_avg, exp_avg_var = state['exp_avg'], state.get('exp_avg_var', None)
                 exp_grad_norm = state.get('exp_grad_norm', None)
                 max_exp_avg_var = state.get('max_exp_avg_var', None)
 
-                # unpack
-                if p.dtype in {torch.float16, torch.bfloat16}:
-                    grad = grad.to(torch.float32)
-                    p_fp32 = p.clone().to(torch.float32)
-                    exp_avg, exp_avg_var = exp_avg.to(torch.float32), exp_avg_var.to(torch.float32)
-                    if group['adanorm']:
-                        exp_grad_norm = exp_grad_norm.to(torch.float32)
+                # unpack, a no-op for states already in the compute dtype
+                exp_avg = unpack_state(exp_avg, dtype)
+                if group['adanorm']:
+                    exp_grad_norm = unpack_state(exp_grad_norm, dtype)
+                if not factored:
+                    exp_avg_var = unpack_state(exp_avg_var, dtype)
                     if group['ams_bound']:
-                        max_exp_avg_var = max_exp_avg_var.to(torch.float32)
+                        max_exp_avg_var = unpack_state(max_exp_avg_var, dtype)
+
+                if record:
+                    record(p, 'grad_rms', rms(grad))
+
+                # Refit the subspace to the gradient when due, carrying the first moment over to the new one
+                rms_step_size = step_size
+                if projected:
+                    interval = group['projection_interval']
+                    if preconditioner_due(state, group['step'], offsets[p], interval, 'projection_step'):
+                        rotation = refresh_projector(state, grad, group['projection_rank'], generator)
+                        if rotation is not None:
+                            exp_avg = change_basis(exp_avg, rotation)
+                    grad = project(grad, state['projector'])
+                    # Projecting back keeps the norm of the update, the RMS is over the full matrix
+                    rms_step_size = step_size * (grad.numel() / p.numel()) ** 0.5
 
                 s_grad = self.get_adanorm_gradient(
                     grad=grad,
@@ -182,43 +436,97 @@ class AdaBelief(BaseOptimizer):
                     r=group.get('r', None),
                 )
 
-                exp_avg.mul_(beta1).add_(s_grad, alpha=1.0 - beta1)
+                decayed = bulk_decay and state['exp_avg'].dtype not in {torch.float16, torch.bfloat16}
+
+                if not decayed:
+                    exp_avg.mul_(beta1)
+                exp_avg.add_(s_grad, alpha=1.0 - beta1)
 
                 grad_residual = grad - exp_avg
-                exp_avg_var.mul_(beta2).addcmul_(grad_residual, grad_residual, value=1.0 - beta2).add_(group['eps'])
+                if factored:
+                    grad_residual.pow_(2)
 
-                de_nom = self.apply_ams_bound(
-                    ams_bound=group['ams_bound'],
-                    exp_avg_sq=exp_avg_var,
-                    max_exp_avg_sq=max_exp_avg_var,
-                    eps=group['eps'],
-                )
+                    exp_avg_var_row, exp_avg_var_col = state['exp_avg_var_row'], state['exp_avg_var_col']
+                    exp_avg_var_row.mul_(beta2).add_(grad_residual.mean(dim=-1), alpha=1.0 - beta2).add_(group['eps'])
+                    exp_avg_var_col.mul_(beta2).add_(grad_residual.mean(dim=-2), alpha=1.0 - beta2).add_(group['eps'])
+
+                    if group['ams_bound']:
+                        max_row, max_col = state['max_exp_avg_var_row'], state['max_exp_avg_var_col']
+                        exp_avg_var_row = torch.maximum(max_row, exp_avg_var_row, out=max_row)
+                        exp_avg_var_col = torch.maximum(max_col, exp_avg_var_col, out=max_col)
+
+                    # Reuses the residual's memory, same epsilon handling as apply_ams_bound
+                    de_nom = self.approximate_belief_var(exp_avg_var_row, exp_avg_var_col, grad_residual)
+                    de_nom.add_(1e-15).sqrt_().add_(group['eps'])
+                else:
+                    var_decayed = (
+                        bulk_decay and not group['factored']
+                        and state['exp_avg_var'].dtype not in {torch.float16, torch.bfloat16}
+                    )
+                    if not var_decayed:
+                        exp_avg_var.mul_(beta2)
+                    exp_avg_var.addcmul_(grad_residual, grad_residual, value=1.0 - beta2)
+                    if not var_decayed:
+                        exp_avg_var.add_(group['eps'])
+
+                    de_nom = self.apply_ams_bound(
+                        ams_bound=group['ams_bound'],
+                        exp_avg_sq=exp_avg_var,
+                        max_exp_avg_sq=max_exp_avg_var,
+                        eps=group['eps'],
+                    )
 
                 if group["cautious"]:
                     # compute norm gradient
                     mask = (exp_avg * grad > 0).to(grad.dtype)
-                    mask.div_(mask.mean().clamp_(min=1e-3))
+                    keep_ratio = mask.mean()
+                    if record:
+                        record(p, 'keep_ratio', keep_ratio)
+                    mask.div_(keep_ratio.clamp(min=1e-3))
                 else:
                     mask = 1.0
 
+                # Projected params take the step in the subspace and map it back afterwards
+                target = torch.zeros_like(exp_avg) if projected else p_fp32
+
                 if not group['rectify']:
                     de_nom.div_(bias_correction2_sq)
-                    p_fp32.addcdiv_(exp_avg * mask, de_nom, value=-step_size)
-                    continue
+                    if record:
+                        record(p, 'update_rms', rms((exp_avg * mask).div_(de_nom)) * rms_step_size)
+                    target.addcdiv_(exp_avg * mask, de_nom, value=-step_size)
+                else:
+                    if record:
+                        record(p, 'n_sma', n_sma)
+
+                    if n_sma >= self.n_sma_threshold:
+                        if record:
+                            record(p, 'update_rms', rms((exp_avg * mask).div_(de_nom)) * rms_step_size)
+                        target.addcdiv_(exp_avg * mask, de_nom, value=-step_size)
+                    elif step_size > 0:
+                        if record:
+                            record(p, 'update_rms', rms(exp_avg * mask) * rms_step_size)
+                        target.add_(exp_avg * mask, alpha=-step_size)
 
-                if n_sma >= self.n_sma_threshold:
-                    p_fp32.addcdiv_(exp_avg * mask, de_nom, value=-step_size)
-                elif step_size > 0:
-                    p_fp32.add_(exp_avg * mask, alpha=-step_size)
+                if projected:
+                    p_fp32.add_(project_back(target, state['projector']))
 
                 # pack
-                if p.dtype in {torch.float16, torch.bfloat16}:
-                    copy_stochastic_(state['exp_avg'], exp_avg)
-                    copy_stochastic_(state['exp_avg_var'], exp_avg_var)
-                    if group['adanorm']:
-                        copy_stochastic_(state['exp_grad_norm'], exp_grad_norm)
+                pack_state_(state['exp_avg'], exp_avg, generator)
+                if group['adanorm']:
+                    pack_state_(state['exp_grad_norm'], exp_grad_norm, generator)
+                if not factored:
+                    pack_state_(state['exp_avg_var'], exp_avg_var, generator)
                     if group['ams_bound']:
-                        copy_stochastic_(state['max_exp_avg_var'], max_exp_avg_var)
-                    copy_stochastic_(p, p_fp32)
+                        pack_state_(state['max_exp_avg_var'], max_exp_avg_var, generator)
+                if p.dtype in {torch.float16, torch.bfloat16}:
+                    write_param_(p, p_fp32, state, group['bf16_mode'], generator)
+
+            params = [p for p in group['params'] if p.grad is not None]
+            if non_finite is not None:
+                update_param = non_finite.guard(update_param, self.state)
+            parallel_param_update(update_param, params, num_workers=self.num_workers)
+
+        if telemetry is not None:
+            telemetry.end_step()
 
-        return loss
\ No newline at end of file
+        return loss
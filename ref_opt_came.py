@@ -11,7 +11,32 @@ from pytorch_optimizer.base.exception import NoSparseGradientError
 from pytorch_optimizer.base.optimizer import BaseOptimizer
 from pytorch_optimizer.base.type import Betas, Closure, Defaults, Loss, ParamGroup
 
-from .utils import UPDATE_STRATEGY
+from .utils import (
+    BF16_MODES,
+    HIBERNATE_TARGETS,
+    UPDATE_STRATEGY,
+    FlatStateBuffers,
+    NonFiniteGuard,
+    StateHibernation,
+    expand_rows,
+    index_copy_rows_,
+    lazy_ema_weights,
+    lazy_skipped_steps,
+    pack_state_,
+    parallel_param_update,
+    parse_state_dtypes,
+    preconditioner_due,
+    rms,
+    sparse_rows,
+    unpack_state,
+    write_param_,
+    zeros_state,
+)
+
+# State a state_dtypes policy can store in another dtype
+STATE_DTYPE_KEYS = (
+    'exp_avg', 'exp_avg_sq', 'exp_avg_sq_hat', 'exp_avg_sq_row', 'exp_avg_sq_col', 'exp_avg_res_row', 'exp_avg_res_col'
+)
 
 
 class CAME(BaseOptimizer):
@@ -33,6 +58,31 @@ class CAME(BaseOptimizer):
     update_strategy (str) (NOTE: for backwards compatibility, cautious parameter being set to true will override to cautious)
         Determine the update strategy to use, valid values are 'unmodified', 'cautious' (https://arxiv.org/abs/2411.16085), 
         and 'grams' (https://arxiv.org/abs/2412.17107) (default: unmodified)
+    :param flat_state: bool. keep exp_avg of a param group in one contiguous buffer and decay it with a single op
+        when every param of the group has a gradient.
+    :param num_workers: int. update parameters on this many threads, split into chunks of roughly equal size. mainly
+        useful for CPU training.
+    :param precondition_interval: int. refresh the factored second moment and residual statistics, and their
+        row/column rsqrt factors, only every this many steps per matrix and reuse the cached factors in between. the
+        statistics are heavily smoothed, so sampling them every few steps (with the decay scaled to the elapsed steps)
+        barely changes them, while skipping the squared-gradient and residual passes and their reductions. refreshes are
+        staggered across params.
+    :param precondition_min_numel: int. only matrices with at least this many elements use precondition_interval.
+    :param bf16_mode: str. how updates are written back into 16-bit params: 'stochastic' rounding, or 'kahan' summation
+        with a param-sized 16-bit compensation buffer, which needs no random numbers.
+    :param skip_non_finite: bool. skip steps whose gradients hold a NaN or Inf, leaving params and state untouched,
+        decided on device without a host sync. skipped steps are counted in `non_finite.skipped_steps`.
+    :param state_dtypes: dict. dtype per state tensor, e.g. {'exp_avg': 'bfloat16', 'exp_avg_sq_row': 'float32'}, keys
+        from STATE_DTYPE_KEYS. without an entry exp_avg uses the param dtype and the second moment statistics the grad
+        dtype (fp32 for 16-bit params). updates are computed in fp32 and written back to 16-bit states with stochastic
+        rounding.
+    :param hibernate_after: int. move the state of a param to the host after this many consecutive steps without a
+        gradient, and back to the device when it gets one again. 0 disables it. see `hibernation.hibernated_bytes`.
+    :param hibernate_to: str. where hibernated state goes: pinned 'cpu' memory, or a temp file on 'disk' mapped back
+        with mmap.
+
+    Set `telemetry` (see optimizer_telemetry.OptimizerTelemetry.attach) to record grad RMS, update RMS, RMS clip factor
+    and cautious keep ratio per param without syncing the device.
     """
 
     def __init__(
@@ -49,6 +99,15 @@ class CAME(BaseOptimizer):
         eps2: float = 1e-16,
         cautious: bool = False,
         update_strategy: UPDATE_STRATEGY = 'unmodified',
+        flat_state: bool = False,
+        num_workers: int = 1,
+        precondition_interval: int = 1,
+        precondition_min_numel: int = 0,
+        bf16_mode: str = 'stochastic',
+        skip_non_finite: bool = False,
+        state_dtypes: dict = None,
+        hibernate_after: int = 0,
+        hibernate_to: str = 'cpu',
         **kwargs,
     ):
         self.validate_learning_rate(lr)
@@ -56,9 +115,15 @@ class CAME(BaseOptimizer):
         self.validate_non_negative(weight_decay, 'weight_decay')
         self.validate_non_negative(eps1, 'eps1')
         self.validate_non_negative(eps2, 'eps2')
+        self.validate_positive(precondition_interval, 'precondition_interval')
+        self.validate_non_negative(hibernate_after, 'hibernate_after')
 
         if update_strategy is not None and update_strategy not in {'unmodified','cautious','grams'}:
             raise ValueError("Invalid update strategy: {}".format(update_strategy))
+        if bf16_mode not in BF16_MODES:
+            raise ValueError("Invalid bf16 mode: {}".format(bf16_mode))
+        if hibernate_to not in HIBERNATE_TARGETS:
+            raise ValueError("Invalid hibernate target: {}".format(hibernate_to))
         
         # If cautious true, override update strategy to cautious
         if cautious:
@@ -79,9 +144,20 @@ class CAME(BaseOptimizer):
             'eps2': eps2,
             'cautious':cautious,
             'update_strategy':update_strategy,
+            'flat_state': flat_state,
+            'precondition_interval': precondition_interval,
+            'precondition_min_numel': precondition_min_numel,
+            'bf16_mode': bf16_mode,
+            'state_dtypes': parse_state_dtypes(state_dtypes, STATE_DTYPE_KEYS),
         }
         super().__init__(params, defaults)
 
+        self.flat_state = FlatStateBuffers()
+        self.num_workers = num_workers
+        self.non_finite = NonFiniteGuard() if skip_non_finite else None
+        self.hibernation = StateHibernation(hibernate_after, hibernate_to) if hibernate_after > 0 else None
+        self.telemetry = None
+
     def __str__(self) -> str:
         return 'CAME'
     
@@ -102,22 +178,23 @@ class CAME(BaseOptimizer):
                 grad_shape: Tuple[int, ...] = grad.shape
                 factored: bool = self.get_options(grad_shape)
 
-                state['exp_avg'] = torch.zeros_like(p)
+                state['exp_avg'] = zeros_state(group, 'exp_avg', p)
+                self.init_second_moments(state, group, p, grad.dtype, factored)
 
-                if factored:
-                    state['exp_avg_sq_row'] = torch.zeros(grad_shape[:-1], dtype=grad.dtype, device=grad.device)
-                    state['exp_avg_sq_col'] = torch.zeros(
-                        grad_shape[:-2] + grad_shape[-1:], dtype=grad.dtype, device=grad.device
-                    )
-                    state['exp_avg_res_row'] = torch.zeros(grad_shape[:-1], dtype=grad.dtype, device=grad.device)
-                    state['exp_avg_res_col'] = torch.zeros(
-                        grad_shape[:-2] + grad_shape[-1:], dtype=grad.dtype, device=grad.device
-                    )
-                else:
-                    state['exp_avg_sq'] = torch.zeros_like(grad)
-
-                if group['ams_bound']:
-                    state['exp_avg_sq_hat'] = torch.zeros_like(grad)
+    @staticmethod
+    def init_second_moments(state, group, p: torch.Tensor, dtype: torch.dtype, factored: bool):
+        r"""Second moment and residual statistics, in dtype (the grad dtype) unless the state dtype policy says otherwise."""
+        if factored:
+            row_shape, col_shape = p.shape[:-1], p.shape[:-2] + p.shape[-1:]
+            state['exp_avg_sq_row'] = zeros_state(group, 'exp_avg_sq_row', p, row_shape, dtype)
+            state['exp_avg_sq_col'] = zeros_state(group, 'exp_avg_sq_col', p, col_shape, dtype)
+            state['exp_avg_res_row'] = zeros_state(group, 'exp_avg_res_row', p, row_shape, dtype)
+            state['exp_avg_res_col'] = zeros_state(group, 'exp_avg_res_col', p, col_shape, dtype)
+        else:
+            state['exp_avg_sq'] = zeros_state(group, 'exp_avg_sq', p, default=dtype)
+
+        if group['ams_bound']:
+            state['exp_avg_sq_hat'] = zeros_state(group, 'exp_avg_sq_hat', p, default=dtype)
 
     @staticmethod
     def get_options(shape: Tuple[int, ...]) -> bool:
@@ -129,6 +206,13 @@ class CAME(BaseOptimizer):
         r"""Get RMS."""
         return x.norm(2) / math.sqrt(x.numel())
 
+    @staticmethod
+    def sq_grad_factors(exp_avg_sq_row: torch.Tensor, exp_avg_sq_col: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        r"""Get the row and column factors whose outer product approximates the rsqrt of the EMA of squared gradient."""
+        r_factor: torch.Tensor = (exp_avg_sq_row / exp_avg_sq_row.mean(dim=-1, keepdim=True)).rsqrt_().unsqueeze(-1)
+        c_factor: torch.Tensor = exp_avg_sq_col.unsqueeze(-2).rsqrt()
+        return r_factor, c_factor
+
     @staticmethod
     def approximate_sq_grad(
         exp_avg_sq_row: torch.Tensor,
@@ -136,10 +220,120 @@ class CAME(BaseOptimizer):
         output: torch.Tensor,
     ):
         r"""Get approximation of EMA of squared gradient."""
-        r_factor: torch.Tensor = (exp_avg_sq_row / exp_avg_sq_row.mean(dim=-1, keepdim=True)).rsqrt_().unsqueeze(-1)
-        c_factor: torch.Tensor = exp_avg_sq_col.unsqueeze(-2).rsqrt()
+        r_factor, c_factor = CAME.sq_grad_factors(exp_avg_sq_row, exp_avg_sq_col)
         torch.mul(r_factor, c_factor, out=output)
 
+    def update_sparse(self, p, group, record=None, generator=None):
+        r"""Lazy update of the rows touched by a row-sparse gradient (e.g. token embeddings).
+
+        Only the touched rows are read and written, so the cost scales with the number of touched rows rather than the
+        vocabulary. Row statistics and the momentum of rows skipped since their last update are first decayed in
+        closed form, as if they had seen zero gradients. Their params only catch up on decoupled weight decay, they
+        don't follow the decaying momentum in between (like LazyAdam). Column statistics and the RMS clip only see the
+        touched rows, i.e. each step factors the touched sub-matrix.
+        """
+        sparse = sparse_rows(p.grad)
+        if sparse is None or p.ndim > 2:
+            raise NoSparseGradientError(str(self), note='sparse dims other than the first')
+        rows, grad = sparse
+        grad = grad.to(torch.float32)
+
+        state = self.state[p]
+        beta1, beta2, beta3 = group['betas']
+        factored: bool = self.get_options(p.shape)
+        skipped = lazy_skipped_steps(state, p, rows, group['step'])
+
+        p_rows = p.index_select(0, rows).to(torch.float32)
+        exp_avg = state['exp_avg'].index_select(0, rows).to(torch.float32)
+
+        # A zero gradient still adds eps1 to the squared gradient and (m_j^2 + eps2) to the residual
+        decay1, decay2, _ = lazy_ema_weights(beta1, beta2, skipped)
+        _, decay3, residual_weight = lazy_ema_weights(beta1, beta3, skipped)
+        if factored:
+            exp_avg_sq = state['exp_avg_sq_row'].index_select(0, rows).to(torch.float32)
+            exp_avg_res = state['exp_avg_res_row'].index_select(0, rows).to(torch.float32)
+            exp_avg_res.mul_(decay3).addcmul_(exp_avg.square().mean(dim=-1), residual_weight, value=1.0 - beta3)
+            exp_avg_res.add_((1.0 - decay3).mul_(self.eps2))
+        else:
+            exp_avg_sq = state['exp_avg_sq'].index_select(0, rows).to(torch.float32)
+        exp_avg_sq.mul_(decay2).add_((1.0 - decay2).mul_(self.eps1))
+        exp_avg.mul_(expand_rows(decay1, exp_avg))
+
+        update = torch.mul(grad, grad).add_(self.eps1)
+
+        if factored:
+            exp_avg_sq_col = unpack_state(state['exp_avg_sq_col'], torch.float32)
+            exp_avg_sq.mul_(beta2).add_(update.mean(dim=-1), alpha=1.0 - beta2)
+            exp_avg_sq_col.mul_(beta2).add_(update.mean(dim=-2), alpha=1.0 - beta2)
+            pack_state_(state['exp_avg_sq_col'], exp_avg_sq_col, generator)
+
+            self.approximate_sq_grad(exp_avg_sq, exp_avg_sq_col, update)
+        else:
+            exp_avg_sq.mul_(beta2).add_(update, alpha=1.0 - beta2)
+            torch.rsqrt(exp_avg_sq, out=update)
+
+        if group['ams_bound']:
+            exp_avg_sq_hat = state['exp_avg_sq_hat'].index_select(0, rows).to(torch.float32)
+            torch.max(exp_avg_sq_hat, 1 / update, out=exp_avg_sq_hat)
+            torch.rsqrt(exp_avg_sq_hat / beta2, out=update)
+
+        update.mul_(grad)
+
+        clip_factor = (self.get_rms(update) / self.clip_threshold).clamp_(min=1.0)
+        if record:
+            record(p, 'grad_rms', rms(grad))
+            record(p, 'clip_factor', clip_factor)
+        update.div_(clip_factor)
+
+        exp_avg.mul_(beta1).add_(update, alpha=1.0 - beta1)
+
+        res = update - exp_avg
+        res.pow_(2).add_(self.eps2)
+
+        if factored:
+            exp_avg_res_col = unpack_state(state['exp_avg_res_col'], torch.float32)
+            exp_avg_res.mul_(beta3).add_(res.mean(dim=-1), alpha=1.0 - beta3)
+            exp_avg_res_col.mul_(beta3).add_(res.mean(dim=-2), alpha=1.0 - beta3)
+            pack_state_(state['exp_avg_res_col'], exp_avg_res_col, generator)
+
+            self.approximate_sq_grad(exp_avg_res, exp_avg_res_col, update)
+            update.mul_(exp_avg)
+        else:
+            update = exp_avg.clone()
+
+        if group['weight_decouple']:
+            decay = 1.0 - group['weight_decay'] * (1.0 if group['fixed_decay'] else group['lr'])
+            p_rows.mul_(expand_rows(torch.pow(decay, skipped + 1), p_rows))
+        elif group['weight_decay'] > 0.0:
+            grad.add_(p_rows, alpha=group['weight_decay'])
+
+        update.mul_(group['lr'])
+
+        mask = 1.0
+        if group['update_strategy'] == 'cautious':
+            mask = (update * grad > 0).to(grad.dtype)
+            keep_ratio = mask.mean()
+            if record:
+                record(p, 'keep_ratio', keep_ratio)
+            mask.div_(keep_ratio.clamp(min=1e-3))
+        elif group['update_strategy'] == 'grams':
+            update.copy_(torch.sign(grad) * update.abs())
+
+        if record:
+            record(p, 'update_rms', rms(update * mask))
+
+        p_rows.add_(-(update * mask))
+
+        index_copy_rows_(state['exp_avg'], rows, exp_avg, generator)
+        if factored:
+            index_copy_rows_(state['exp_avg_sq_row'], rows, exp_avg_sq, generator)
+            index_copy_rows_(state['exp_avg_res_row'], rows, exp_avg_res, generator)
+        else:
+            index_copy_rows_(state['exp_avg_sq'], rows, exp_avg_sq, generator)
+        if group['ams_bound']:
+            index_copy_rows_(state['exp_avg_sq_hat'], rows, exp_avg_sq_hat, generator)
+        write_param_(p, p_rows, state, group['bf16_mode'], generator, rows=rows)
+
     @torch.no_grad()
     def step(self, closure: Closure = None) -> Loss:
         loss: Loss = None
@@ -147,6 +341,18 @@ class CAME(BaseOptimizer):
             with torch.enable_grad():
                 loss = closure()
 
+        telemetry = self.telemetry
+        if telemetry is not None:
+            telemetry.begin_step()
+        record = telemetry.record if telemetry is not None and telemetry.active else None
+
+        if self.hibernation is not None:
+            self.hibernation.step(self.param_groups, self.state)
+
+        non_finite = self.non_finite
+        if non_finite is not None:
+            non_finite.check(self.param_groups)
+
         for group in self.param_groups:
             if 'step' in group:
                 group['step'] += 1
@@ -155,87 +361,129 @@ class CAME(BaseOptimizer):
 
             beta1, beta2, beta3 = group['betas']
 
-            for p in group['params']:
-                if p.grad is None:
-                    continue
+            flat = None
+            bulk_decay = False
+            if group['flat_state']:
+                flat = self.flat_state.prepare(self.state, group, ['exp_avg'])
+
+                # Skipped params (and rows of sparse ones) must not decay, so only decay whole buffers when every
+                # param has a dense gradient and no non-finite guard may have to undo the step. 16-bit buffers are
+                # left to the per-param path, which decays them after unpacking to fp32.
+                bulk_decay = non_finite is None and all(
+                    p.grad is not None and not p.grad.is_sparse for p in group['params']
+                )
+                if bulk_decay:
+                    for buffer in flat.buffers('exp_avg'):
+                        if buffer.dtype not in {torch.float16, torch.bfloat16}:
+                            buffer.mul_(beta1)
+
+            offsets = {p: i for i, p in enumerate(group['params'])} if group['precondition_interval'] > 1 else None
 
+            def update_param(p, generator=None):
                 grad = p.grad
-                if grad.is_sparse:
-                    raise NoSparseGradientError(str(self))
                 if grad.dtype in {torch.float16, torch.bfloat16}:
                     grad = grad.to(torch.float32)
 
                 state = self.state[p]
 
-
                 grad_shape: Tuple[int, ...] = grad.shape
                 factored: bool = self.get_options(grad_shape)
 
                 if len(state) == 0:
-                    state['exp_avg'] = torch.zeros_like(p)
-
-                    if factored:
-                        state['exp_avg_sq_row'] = torch.zeros(grad_shape[:-1], dtype=grad.dtype, device=grad.device)
-                        state['exp_avg_sq_col'] = torch.zeros(
-                            grad_shape[:-2] + grad_shape[-1:], dtype=grad.dtype, device=grad.device
-                        )
-                        state['exp_avg_res_row'] = torch.zeros(grad_shape[:-1], dtype=grad.dtype, device=grad.device)
-                        state['exp_avg_res_col'] = torch.zeros(
-                            grad_shape[:-2] + grad_shape[-1:], dtype=grad.dtype, device=grad.device
-                        )
-                    else:
-                        state['exp_avg_sq'] = torch.zeros_like(grad)
+                    state['exp_avg'] = flat.view('exp_avg', p) if flat else zeros_state(group, 'exp_avg', p)
+                    self.init_second_moments(state, group, p, grad.dtype, factored)
+
+                if grad.is_sparse:
+                    self.update_sparse(p, group, record, generator)
+                    return
 
-                    if group['ams_bound']:
-                        state['exp_avg_sq_hat'] = torch.zeros_like(grad)
+                if record:
+                    record(p, 'grad_rms', rms(grad))
 
                 p_data_fp32 = p
                 if p.dtype in {torch.float16, torch.bfloat16}:
                     p_data_fp32 = p_data_fp32.to(torch.float32)
 
-                update = torch.mul(grad, grad).add_(self.eps1)
+                # Steps since the factored statistics were last refreshed, 0 while the cached factors are reused
+                cached = offsets is not None and factored and p.numel() >= group['precondition_min_numel']
+                elapsed = 1
+                if cached:
+                    elapsed = preconditioner_due(state, group['step'], offsets[p], group['precondition_interval'])
 
                 if factored:
-                    exp_avg_sq_row, exp_avg_sq_col = state['exp_avg_sq_row'], state['exp_avg_sq_col']
-
-                    exp_avg_sq_row.mul_(beta2).add_(update.mean(dim=-1), alpha=1.0 - beta2)
-                    exp_avg_sq_col.mul_(beta2).add_(update.mean(dim=-2), alpha=1.0 - beta2)
-
-                    self.approximate_sq_grad(exp_avg_sq_row, exp_avg_sq_col, update)
+                    exp_avg_sq_row = unpack_state(state['exp_avg_sq_row'], grad.dtype)
+                    exp_avg_sq_col = unpack_state(state['exp_avg_sq_col'], grad.dtype)
+
+                    if elapsed:
+                        update = torch.mul(grad, grad).add_(self.eps1)
+
+                        # One sample stands in for the elapsed steps, so it gets their combined weight
+                        decay = beta2 ** elapsed
+                        exp_avg_sq_row.mul_(decay).add_(update.mean(dim=-1), alpha=1.0 - decay)
+                        exp_avg_sq_col.mul_(decay).add_(update.mean(dim=-2), alpha=1.0 - decay)
+                        pack_state_(state['exp_avg_sq_row'], exp_avg_sq_row, generator)
+                        pack_state_(state['exp_avg_sq_col'], exp_avg_sq_col, generator)
+
+                    if cached:
+                        if elapsed:
+                            state['exp_avg_sq_row_factor'], state['exp_avg_sq_col_factor'] = self.sq_grad_factors(
+                                exp_avg_sq_row, exp_avg_sq_col
+                            )
+                        update = torch.mul(state['exp_avg_sq_row_factor'], state['exp_avg_sq_col_factor'])
+                    else:
+                        self.approximate_sq_grad(exp_avg_sq_row, exp_avg_sq_col, update)
                 else:
-                    exp_avg_sq = state['exp_avg_sq']
+                    update = torch.mul(grad, grad).add_(self.eps1)
+                    exp_avg_sq = unpack_state(state['exp_avg_sq'], grad.dtype)
                     exp_avg_sq.mul_(beta2).add_(update, alpha=1.0 - beta2)
+                    pack_state_(state['exp_avg_sq'], exp_avg_sq, generator)
                     torch.rsqrt(exp_avg_sq, out=update)
 
                 if group['ams_bound']:
-                    exp_avg_sq_hat = state['exp_avg_sq_hat']
+                    exp_avg_sq_hat = unpack_state(state['exp_avg_sq_hat'], grad.dtype)
                     torch.max(exp_avg_sq_hat, 1 / update, out=exp_avg_sq_hat)
+                    pack_state_(state['exp_avg_sq_hat'], exp_avg_sq_hat, generator)
                     torch.rsqrt(exp_avg_sq_hat / beta2, out=update)
 
                 update.mul_(grad)
 
-                update.div_((self.get_rms(update) / self.clip_threshold).clamp_(min=1.0))
-
-                exp_avg = state['exp_avg']
-
-                if p.dtype in {torch.float16, torch.bfloat16}:
-                    exp_avg = exp_avg.to(torch.float32)
+                clip_factor = (self.get_rms(update) / self.clip_threshold).clamp_(min=1.0)
+                if record:
+                    record(p, 'clip_factor', clip_factor)
+                update.div_(clip_factor)
 
-                exp_avg.mul_(beta1).add_(update, alpha=1.0 - beta1)
+                exp_avg = unpack_state(state['exp_avg'], grad.dtype)
 
-                res = update - exp_avg
-                res.pow_(2).add_(self.eps2)
+                if not (bulk_decay and state['exp_avg'].dtype not in {torch.float16, torch.bfloat16}):
+                    exp_avg.mul_(beta1)
+                exp_avg.add_(update, alpha=1.0 - beta1)
 
                 if factored:
-                    exp_avg_res_row, exp_avg_res_col = state['exp_avg_res_row'], state['exp_avg_res_col']
-
-                    exp_avg_res_row.mul_(beta3).add_(res.mean(dim=-1), alpha=1.0 - beta3)
-                    exp_avg_res_col.mul_(beta3).add_(res.mean(dim=-2), alpha=1.0 - beta3)
-
-                    self.approximate_sq_grad(exp_avg_res_row, exp_avg_res_col, update)
+                    exp_avg_res_row = unpack_state(state['exp_avg_res_row'], grad.dtype)
+                    exp_avg_res_col = unpack_state(state['exp_avg_res_col'], grad.dtype)
+
+                    if elapsed:
+                        res = update - exp_avg
+                        res.pow_(2).add_(self.eps2)
+
+                        decay = beta3 ** elapsed
+                        exp_avg_res_row.mul_(decay).add_(res.mean(dim=-1), alpha=1.0 - decay)
+                        exp_avg_res_col.mul_(decay).add_(res.mean(dim=-2), alpha=1.0 - decay)
+                        pack_state_(state['exp_avg_res_row'], exp_avg_res_row, generator)
+                        pack_state_(state['exp_avg_res_col'], exp_avg_res_col, generator)
+
+                    if cached:
+                        if elapsed:
+                            state['exp_avg_res_row_factor'], state['exp_avg_res_col_factor'] = self.sq_grad_factors(
+                                exp_avg_res_row, exp_avg_res_col
+                            )
+                        torch.mul(state['exp_avg_res_row_factor'], state['exp_avg_res_col_factor'], out=update)
+                    else:
+                        self.approximate_sq_grad(exp_avg_res_row, exp_avg_res_col, update)
                     update.mul_(exp_avg)
                 else:
-                    update = exp_avg
+                    # A copy, update is scaled in place below and exp_avg may be a view into the flat state
+                    update = exp_avg.clone()
 
                 self.apply_weight_decay(
                     p=p_data_fp32,
@@ -251,36 +499,31 @@ class CAME(BaseOptimizer):
                 if group['update_strategy'] in {'cautious','grams'}:
                     if group['update_strategy'] == 'cautious':
                         mask = (update * grad > 0).to(grad.dtype)
-                        mask.div_(mask.mean().clamp_(min=1e-3))
+                        keep_ratio = mask.mean()
+                        if record:
+                            record(p, 'keep_ratio', keep_ratio)
+                        mask.div_(keep_ratio.clamp(min=1e-3))
                     elif group['update_strategy'] == 'grams':
                         update.copy_(torch.sign(grad) * update.abs())
                         mask = 1.0
                 else:
                     mask = 1.0
 
+                if record:
+                    record(p, 'update_rms', rms(update * mask))
+
                 p_data_fp32.add_(-(update * mask))
 
+                pack_state_(state['exp_avg'], exp_avg, generator)
                 if p.dtype in {torch.float16, torch.bfloat16}:
-                    copy_stochastic_(state['exp_avg'], exp_avg)
-                    copy_stochastic_(p, p_data_fp32)
+                    write_param_(p, p_data_fp32, state, group['bf16_mode'], generator)
 
-        return loss
-
-
-def copy_stochastic_(target: torch.Tensor, source: torch.Tensor):
-    # create a random 16 bit integer
-    result = torch.randint_like(
-        source,
-        dtype=torch.int32,
-        low=0,
-        high=(1 << 16),
-    )
+            params = [p for p in group['params'] if p.grad is not None]
+            if non_finite is not None:
+                update_param = non_finite.guard(update_param, self.state)
+            parallel_param_update(update_param, params, num_workers=self.num_workers)
 
-    # add the random number to the lower 16 bit of the mantissa
-    result.add_(source.view(dtype=torch.int32))
+        if telemetry is not None:
+            telemetry.end_step()
 
-    # mask off the lower 16 bit of the mantissa
-    result.bitwise_and_(-65536)  # -65536 = FFFF0000 as a signed int32
-
-    # copy the higher 16 bit into the target tensor
-    target.copy_(result.view(dtype=torch.float32))
+        return loss
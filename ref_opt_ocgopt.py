@@ -6,26 +6,34 @@ from math import sqrt
 from typing import Callable, Tuple
 import math
 
-def copy_stochastic_(target: torch.Tensor, source: torch.Tensor):
-    # thanks to Nerogar for fast stochastic pytorch implementation
-    # https://github.com/pytorch/pytorch/issues/120376#issuecomment-1974828905
-    with torch.no_grad():
-        # create a random 16 bit integer
-        result = torch.randint_like(
-            source,
-            dtype=torch.int32,
-            low=0,
-            high=(1 << 16),
-        )
-
-        # add the random number to the lower 16 bit of the mantissa
-        result.add_(source.view(dtype=torch.int32))
-
-        # mask off the lower 16 bit of the mantissa
-        result.bitwise_and_(-65536)  # -65536 = FFFF0000 as a signed int32
-
-        # copy the higher 16 bit into the target tensor
-        target.copy_(result.view(dtype=torch.float32))
+from .utils import (
+    BF16_MODES,
+    HIBERNATE_TARGETS,
+    FlatStateBuffers,
+    NonFiniteGuard,
+    StateHibernation,
+    change_basis,
+    expand_rows,
+    index_copy_rows_,
+    lazy_skipped_steps,
+    pack_state_,
+    parallel_param_update,
+    parse_state_dtypes,
+    preconditioner_due,
+    project,
+    project_back,
+    projected_shape,
+    projects,
+    refresh_projector,
+    sparse_rows,
+    state_dtype,
+    unpack_state,
+    write_param_,
+    zeros_state,
+)
+
+# State a state_dtypes policy can store in another dtype
+STATE_DTYPE_KEYS = ("value_momentum", "centralized_momentum", "denom")
 
 # Original Spectral Clipping code by leloykun (https://leloykun.github.io/ponder/spectral-clipping/ https://github.com/leloykun/spectral_clip)
 
@@ -59,18 +67,27 @@ NS_COEFFS = [
     (1.875, -1.25, 0.375)
 ]
 
+def refine_dtype(dtype: torch.dtype) -> torch.dtype:
+    """Dtype of the final refinement iterations of a mixed-precision Newton-Schulz schedule: at least fp32."""
+    return torch.promote_types(dtype, torch.float32)
+
 @torch.no_grad()
-def orthogonalize(M: torch.Tensor, num_ns_steps=len(NS_COEFFS), ortho_dtype=None, adaptive=False) -> torch.Tensor:
-    """Orthogonalize a matrix via 5th order Newton-Schulz iteration."""
+def orthogonalize(M: torch.Tensor, num_ns_steps=len(NS_COEFFS), ortho_dtype=None, adaptive=False, refine_steps=0) -> torch.Tensor:
+    """Orthogonalize a matrix via 5th order Newton-Schulz iteration.
+
+    The last refine_steps iterations run in fp32 (or ortho_dtype if wider). The early iterations with large coefficients only have to pull the singular values into the neighbourhood of 1, which low precision does about as well, while the final ones set the accuracy of the result.
+    """
+    orig_dtype = M.dtype
     if ortho_dtype is not None:
-        orig_dtype = M.dtype
         M = M.to(ortho_dtype)
     if adaptive:
         M_orig = M.clone()
     transpose = M.shape[0] < M.shape[1]
     if transpose:
         M = M.T
-    for a, b, c in NS_COEFFS[:num_ns_steps]:
+    for i, (a, b, c) in enumerate(NS_COEFFS[:num_ns_steps]):
+        if i == num_ns_steps - refine_steps:
+            M = M.to(refine_dtype(M.dtype))
         M = M / (torch.linalg.norm(M).clamp_min_(1e-8))
         A = M.T @ M
         I = torch.eye(A.shape[0], dtype=M.dtype, device=M.device)
@@ -79,18 +96,80 @@ def orthogonalize(M: torch.Tensor, num_ns_steps=len(NS_COEFFS), ortho_dtype=None
         M = M.T
     if adaptive:
         M = torch.einsum('ij,ij,ab->ab', M_orig.type_as(M), M, M)
-    if ortho_dtype is not None:
-        M = M.to(orig_dtype)
-    return M
+    return M.to(orig_dtype)
+
+@torch.no_grad()
+def orthogonal_factor(M: torch.Tensor, num_ns_steps=len(NS_COEFFS), ortho_dtype=torch.float32, refine_steps=0) -> torch.Tensor:
+    """Right factor Q of the Newton-Schulz iteration on a tall matrix, such that orthogonalize(M) == M @ Q.
+
+    Every iteration right-multiplies M by a scaled polynomial of M.T @ M, so their product can be kept and applied to later, similar matrices for one matmul instead of the full iteration. refine_steps as in orthogonalize, Q is then kept in the refinement dtype.
+    """
+    M = M.to(ortho_dtype)
+    Q = torch.eye(M.shape[1], dtype=M.dtype, device=M.device)
+    for i, (a, b, c) in enumerate(NS_COEFFS[:num_ns_steps]):
+        if i == num_ns_steps - refine_steps:
+            M, Q = M.to(refine_dtype(M.dtype)), Q.to(refine_dtype(M.dtype))
+        scale = 1.0 / torch.linalg.norm(M).clamp_min_(1e-8)
+        M = M * scale
+        A = M.T @ M
+        I = torch.eye(A.shape[0], dtype=M.dtype, device=M.device)
+        P = a * I + b * A + c * A @ A
+        M = M @ P
+        Q = (Q * scale) @ P
+    return Q
+
+@torch.no_grad()
+def apply_orthogonal_factor(M: torch.Tensor, Q: torch.Tensor, adaptive=False) -> torch.Tensor:
+    """Approximate orthogonalize(M) of a tall matrix with a cached factor from orthogonal_factor."""
+    M_ortho = M.to(Q.dtype)
+    O = M_ortho @ Q
+    if adaptive:
+        O = (M_ortho * O).sum() * O
+    return O.to(M.dtype)
 
 @torch.no_grad()
-def orthogonalize_func(W: torch.Tensor, sigma_min: float=-1., sigma_max: float=1., ortho_dtype=torch.float32, num_ns_steps=len(NS_COEFFS), adaptive=False):
-    return orthogonalize(W, num_ns_steps=num_ns_steps, ortho_dtype=ortho_dtype, adaptive=adaptive)
+def orthogonalize_func(W: torch.Tensor, sigma_min: float=-1., sigma_max: float=1., ortho_dtype=torch.float32, num_ns_steps=len(NS_COEFFS), adaptive=False, refine_steps=0):
+    return orthogonalize(W, num_ns_steps=num_ns_steps, ortho_dtype=ortho_dtype, adaptive=adaptive, refine_steps=refine_steps)
+
+# Compiled lazily: importing torch._dynamo and setting up compilation costs seconds, which every process that merely imports this module would otherwise pay
+_compiled = {}
+
+def compile_ns(func):
+    if func not in _compiled:
+        import torch._dynamo
+
+        compiled = torch.compile(func, fullgraph=True, mode="reduce-overhead")
+        _compiled[func] = torch._dynamo.utils.disable_cache_limit()(compiled)
+    return _compiled[func]
 
-@torch._dynamo.utils.disable_cache_limit()
-@torch.compile(fullgraph=True, mode="reduce-overhead")
-def orthogonalize_compiled_func(W: torch.Tensor, sigma_min: float=-1., sigma_max: float=1., ortho_dtype=torch.float32, num_ns_steps=len(NS_COEFFS), adaptive=False):
-    return orthogonalize(W, num_ns_steps=num_ns_steps, ortho_dtype=ortho_dtype, adaptive=adaptive)
+def compile_orthogonalize():
+    return compile_ns(orthogonalize_func)
+
+def orthogonalize_compiled_func(W: torch.Tensor, sigma_min: float=-1., sigma_max: float=1., ortho_dtype=torch.float32, num_ns_steps=len(NS_COEFFS), adaptive=False, refine_steps=0):
+    return compile_orthogonalize()(W, sigma_min=sigma_min, sigma_max=sigma_max, ortho_dtype=ortho_dtype, num_ns_steps=num_ns_steps, adaptive=adaptive, refine_steps=refine_steps)
+
+def orthogonal_factor_compiled(M: torch.Tensor, num_ns_steps=len(NS_COEFFS), ortho_dtype=torch.float32, refine_steps=0):
+    return compile_ns(orthogonal_factor)(M, num_ns_steps=num_ns_steps, ortho_dtype=ortho_dtype, refine_steps=refine_steps)
+
+def spectral_clip_cost(p: torch.Tensor, num_ns_steps=len(NS_COEFFS)) -> int:
+    """Approximate FLOPs of orthogonalizing p's 2D view, used to balance the chunks of a parallel step."""
+    if p.ndim < 1:
+        return 1
+    rows, cols = (len(p), p[0].numel()) if p.ndim > 1 else (1, p.numel())
+    m, n = max(rows, cols), min(rows, cols)
+    # Per iteration: A = M.T @ M and M @ (...) are 2mn^2 each, A @ A is 2n^3
+    return num_ns_steps * (4 * m * n * n + 2 * n ** 3) + p.numel()
+
+def updates_in_fp32(p: torch.Tensor, group) -> bool:
+    """Whether a 16-bit param and its state are unpacked to fp32 for the update and rounded back afterwards."""
+    return p.dtype in {torch.float16, torch.bfloat16} and (group["stochastic_fp"] or group["bf16_mode"] == "kahan")
+
+def compute_dtype(p: torch.Tensor, group) -> torch.dtype:
+    """Dtype a param's update is computed in: fp32 if updates_in_fp32, else the param dtype, widened to any state the state dtype policy keeps wider, so that state isn't rounded to the param dtype every step."""
+    dtype = torch.float32 if updates_in_fp32(p, group) else p.dtype
+    for key in STATE_DTYPE_KEYS:
+        dtype = torch.promote_types(dtype, state_dtype(group, key, dtype))
+    return dtype
 
 def filter_grad(grad, fft_alpha=1.0):
     # 1. Apply n-dimensional FFT
@@ -154,9 +233,9 @@ def similarity_fft(grad, prev_grad, sigma=0.0):
 
     agreement_mask = grad_freq_shifted.abs() * prev_grad_freq_shifted.abs().conj()
 
+    # Normalize on device, a Python branch on mask_max would sync with the host
     mask_max = torch.max(agreement_mask.abs())
-    if mask_max > 1e-16:
-        agreement_mask /= mask_max
+    agreement_mask /= torch.where(mask_max > 1e-16, mask_max, 1.0)
     
     new_grad_fft = grad_freq_shifted * agreement_mask.real
 
@@ -197,6 +276,8 @@ class OCGOpt(Optimizer):
             Compile the spectral clip function (Highly recommended for a large speed increase) (default: True).
         spectral_clip_dtype (torch.dtype in string format):
             Sets the dtype of spectral clipping calculation. Recommended to use torch.float32 (or leave at default of None) (default: None, which results in torch.float32).
+        spectral_clip_refine_steps (int):
+            Run the last this many Newton-Schulz iterations in fp32 and only the earlier ones in spectral_clip_dtype. With spectral_clip_dtype='bfloat16' and 2 refinement steps, most of the matmuls run in bf16 while the orthogonality error stays close to fp32's. Cached preconditioner factors are then kept in fp32 (default: 0, one dtype for every iteration).
         adaptive (bool):
             Scale the full step to the momentumized average gradient, always utilizes RMS normalization on the gradient if True, otherwise caps RMS at 1.0 (default: True).
         adaptive_min (float):
@@ -213,6 +294,32 @@ class OCGOpt(Optimizer):
             A value other than 1.0 will utilize cautious-stepping. At 0.0, this zeros out parts of the momentum which don't correlate with the current gradient's direction. 0.5 will halve it instead (default: 0.0).
         stochastic_fp (bool):
             Utilize stochastic rounding for bf16 and fp16 tensors. (default: True).
+        flat_state (bool):
+            Keep value_momentum and centralized_momentum of a param group in one contiguous buffer each, handing out views per parameter (default: False).
+        num_workers (int):
+            Update parameters on this many threads, split into chunks of roughly equal Newton-Schulz cost. Mainly useful for CPU training; with compilation enabled, call warmup() first (default: 1).
+        precondition_interval (int):
+            Run the Newton-Schulz iteration only every this many steps per matrix and orthogonalize with its cached right factor (one matmul) in between. The momentum moves slowly, so the factor stays close for a few steps. Refreshes are staggered across params. Costs a min(rows, cols)^2 buffer per matrix, in spectral_clip_dtype, or fp32 when it is 16-bit and spectral_clip_refine_steps > 0 (default: 1, every step).
+        precondition_min_numel (int):
+            Only matrices with at least this many elements use precondition_interval, smaller ones are cheap enough to orthogonalize every step (default: 0).
+        bf16_mode (str):
+            How updates are written back into bf16 and fp16 params: 'stochastic' rounding, or 'kahan' summation with a param-sized 16-bit compensation buffer, which needs no random numbers. 'kahan' updates 16-bit params in fp32 regardless of stochastic_fp (default: 'stochastic').
+        skip_non_finite (bool):
+            Skip steps whose gradients hold a NaN or Inf, leaving params and state untouched, decided on device without a host sync. Skipped steps are counted in non_finite.skipped_steps (default: False).
+        state_dtypes (dict):
+            Dtype per state tensor, e.g. {'value_momentum': 'bfloat16', 'centralized_momentum': 'float32'}, keys from STATE_DTYPE_KEYS. States without an entry use the param dtype. Updates are computed in the param dtype (fp32 for 16-bit params with stochastic_fp or kahan), or in the widest state dtype of the policy if that is wider, and written back to narrower states with stochastic rounding when stochastic_fp is set (default: None).
+        hibernate_after (int):
+            Move the state of a param to the host after this many consecutive steps without a gradient, and back to the device when it gets one again. Frees the memory of e.g. a text encoder whose training stopped. 0 disables it, hibernation.hibernated_bytes reports the bytes moved (default: 0).
+        hibernate_to (str):
+            Where hibernated state goes: pinned 'cpu' memory, or a temp file on 'disk' that is mapped back with mmap (default: 'cpu').
+        projection_rank (int):
+            Keep the momenta of matrices in a rank-r subspace of their gradient (GaLore-style), cutting them from O(mn) to O((m + n) r). The whole update, including the Newton-Schulz iteration, runs in the subspace and is projected back before weight decay. Not supported with flat_state (default: 0, disabled).
+        projection_interval (int):
+            Refit each projector to the gradient every this many steps by randomized range finding. Refreshes are staggered across params, both momenta are carried over to the new subspace and a cached Newton-Schulz factor (precondition_interval) is recomputed in it (default: 200).
+        projection_min_numel (int):
+            Only matrices with at least this many elements are projected (default: 0).
+
+    Set `telemetry` (see optimizer_telemetry.OptimizerTelemetry.attach) to record grad RMS, update RMS, cautious keep ratio and the adaptive scale_factor per param without syncing the device.
     """
 
     def __init__(
@@ -226,6 +333,7 @@ class OCGOpt(Optimizer):
         spectral_adaptive: bool = True,
         spectral_clip_compile: bool = True,
         spectral_clip_dtype = None, # Can be set to torch.bfloat16, torch.float16, torch.float32, or even torch.float64 if you're insane in the membrane.
+        spectral_clip_refine_steps: int = 0,
         adaptive: bool = True,
         adaptive_min: float = -1.,
         adaptive_max: float = 1.,
@@ -234,11 +342,37 @@ class OCGOpt(Optimizer):
         sim_match: bool = False,
         cautious_min: float = 0.0,
         stochastic_fp: bool = True,
+        flat_state: bool = False,
+        num_workers: int = 1,
+        precondition_interval: int = 1,
+        precondition_min_numel: int = 0,
+        bf16_mode: str = 'stochastic',
+        skip_non_finite: bool = False,
+        state_dtypes: dict = None,
+        hibernate_after: int = 0,
+        hibernate_to: str = 'cpu',
+        projection_rank: int = 0,
+        projection_interval: int = 200,
+        projection_min_numel: int = 0,
     ):
 
         self._init_lr = lr
 
         self.clip_func = orthogonalize_compiled_func if spectral_clip_compile else orthogonalize_func
+        self.factor_func = orthogonal_factor_compiled if spectral_clip_compile else orthogonal_factor
+
+        if bf16_mode not in BF16_MODES:
+            raise ValueError("Invalid bf16 mode: {}".format(bf16_mode))
+        if not 0 <= spectral_clip_refine_steps <= len(NS_COEFFS):
+            raise ValueError("Invalid spectral_clip_refine_steps: {}".format(spectral_clip_refine_steps))
+        if projection_rank < 0 or projection_interval < 1:
+            raise ValueError("Invalid projection_rank or projection_interval: {}, {}".format(projection_rank, projection_interval))
+        if projection_rank > 0 and flat_state:
+            raise ValueError("projection_rank is not supported with flat_state")
+        if hibernate_after < 0:
+            raise ValueError("Invalid hibernate_after: {}".format(hibernate_after))
+        if hibernate_to not in HIBERNATE_TARGETS:
+            raise ValueError("Invalid hibernate target: {}".format(hibernate_to))
 
         if spectral_clip_dtype is None:
             spectral_clip_dtype = torch.float32
@@ -256,6 +390,7 @@ class OCGOpt(Optimizer):
             spectral_adaptive = spectral_adaptive,
             spectral_clip_compile = spectral_clip_compile,
             spectral_clip_dtype = spectral_clip_dtype,
+            spectral_clip_refine_steps = spectral_clip_refine_steps,
             adaptive = adaptive,
             adaptive_min = adaptive_min,
             adaptive_max = adaptive_max,
@@ -264,14 +399,79 @@ class OCGOpt(Optimizer):
             sim_match = sim_match,
             cautious_min = cautious_min,
             stochastic_fp = stochastic_fp,
+            flat_state = flat_state,
+            precondition_interval = precondition_interval,
+            precondition_min_numel = precondition_min_numel,
+            bf16_mode = bf16_mode,
+            state_dtypes = parse_state_dtypes(state_dtypes, STATE_DTYPE_KEYS),
+            projection_rank = projection_rank,
+            projection_interval = projection_interval,
+            projection_min_numel = projection_min_numel,
         )
 
         super(OCGOpt, self).__init__(params, defaults)
 
+        self.flat_state = FlatStateBuffers()
+        self.num_workers = num_workers
+        self.non_finite = NonFiniteGuard() if skip_non_finite else None
+        self.hibernation = StateHibernation(hibernate_after, hibernate_to) if hibernate_after > 0 else None
+        self.telemetry = None
+
     @torch.no_grad()
     def reset(self):
         pass
 
+    @torch.no_grad()
+    def warmup(self):
+        r"""Compile and run the spectral clip for every matrix shape up front, instead of stalling the first step."""
+        for group in self.param_groups:
+            if not group["spectral_clip_compile"]:
+                continue
+            seen = set()
+            for p in group["params"]:
+                if p.ndim < 1:
+                    continue
+                shape = (len(p), p[0].numel()) if p.ndim > 1 else (1, p.numel())
+                if shape[0] < shape[1]:
+                    shape = shape[::-1]
+                if shape in seen:
+                    continue
+                seen.add(shape)
+                self.clip_func(torch.zeros(shape, dtype=p.dtype, device=p.device), sigma_min=0., sigma_max=0., adaptive=group["spectral_adaptive"], ortho_dtype=group["spectral_clip_dtype"], refine_steps=group["spectral_clip_refine_steps"])
+                if group["precondition_interval"] > 1 and p.numel() >= group["precondition_min_numel"]:
+                    self.factor_func(torch.zeros(shape, dtype=p.dtype, device=p.device), ortho_dtype=group["spectral_clip_dtype"], refine_steps=group["spectral_clip_refine_steps"])
+
+    def gather_rows(self, p, state, rows, group):
+        r"""
+        Touched rows of a param with a row-sparse gradient and of its momenta, caught up on the steps they were skipped for.
+
+        A skipped step sees a zero gradient, so value_momentum only decays: the product of slow_beta2 over steps a+1..t-1 telescopes to beta2^k * (1 - beta2^a) / (1 - beta2^(t-1)).
+        centralized_momentum meanwhile moves towards -centralization * value_momentum, approximated here with the caught-up value_momentum.
+        The param rows catch up on the weight decay of the skipped steps at the current lr and decay rate, like AdaBelief and CAME, but don't follow the momenta in between (like LazyAdam).
+        """
+        beta, beta2 = group["betas"][0], group["betas"][1]
+        step = group["step"]
+        skipped = lazy_skipped_steps(state, p, rows, step).double()
+        last = step - 1 - skipped
+
+        dtype = compute_dtype(p, group)
+        p_rows = p.index_select(0, rows).to(dtype)
+        value_momentum = state["value_momentum"].index_select(0, rows).to(dtype)
+        centralized_momentum = state["centralized_momentum"].index_select(0, rows).to(dtype)
+
+        # float64, since beta2 is usually within 1e-7 of 1
+        value_decay = torch.where(skipped > 0, beta2**skipped * (1.0 - beta2**last) / (1.0 - beta2**(step - 1)), 1.0)
+        value_momentum.mul_(expand_rows(value_decay.to(dtype), value_momentum))
+
+        centralized_decay = expand_rows(torch.pow(beta, skipped).to(dtype), centralized_momentum)
+        centralized_momentum.mul_(centralized_decay).add_(value_momentum * (1.0 - centralized_decay), alpha=-group["centralization"])
+
+        if group["weight_decay"] != 0:
+            decay = 1.0 - group["lr"] * group["weight_decay"] * group["weight_decay_rate"]**step
+            p_rows.mul_(expand_rows((decay**skipped).to(dtype), p_rows))
+
+        return p_rows, value_momentum, centralized_momentum
+
     @torch.no_grad()
     def step(self, closure = None):
         loss = None
@@ -279,6 +479,18 @@ class OCGOpt(Optimizer):
             with torch.enable_grad():
                 loss = closure()
 
+        telemetry = self.telemetry
+        if telemetry is not None:
+            telemetry.begin_step()
+        record = telemetry.record if telemetry is not None and telemetry.active else None
+
+        if self.hibernation is not None:
+            self.hibernation.step(self.param_groups, self.state)
+
+        non_finite = self.non_finite
+        if non_finite is not None:
+            non_finite.check(self.param_groups)
+
         for group in self.param_groups:
             if 'step' in group:
                 group['step'] += 1
@@ -293,38 +505,61 @@ class OCGOpt(Optimizer):
 
             step = group['step']
 
-            for p in group["params"]:
-                if p.grad is None:
-                    continue
+            flat = None
+            if group["flat_state"]:
+                flat = self.flat_state.prepare(self.state, group, ["value_momentum", "centralized_momentum"])
+
+            offsets = {p: i for i, p in enumerate(group["params"])}
+
+            def update_param(p, generator=None):
                 state = self.state[p]
 
                 grad = p.grad.data
 
                 dimcount = grad.ndim
+                projected = not grad.is_sparse and projects(p, group)
+                shape = projected_shape(p, group["projection_rank"]) if projected else None
 
                 # State initialization
                 if len(state) == 0:
                     # Exponential moving average of gradient values
                     if dimcount < 1:
-                        state["denom"] = torch.ones_like(grad)
-                    state["value_momentum"] = torch.zeros_like(grad)
-                    state["centralized_momentum"] = torch.zeros_like(grad)
-
-                # Detach
-                p_fp32 = p.detach().clone()
-                if dimcount < 1:
-                    denom = state["denom"].detach().clone()
-                value_momentum = state["value_momentum"].detach().clone()
-                centralized_momentum = state["centralized_momentum"].detach().clone()
-
-                # Unpack
-                if p.dtype in {torch.float16, torch.bfloat16} and group["stochastic_fp"]:
-                    grad = grad.to(torch.float32)
+                        state["denom"] = torch.ones_like(grad, dtype=state_dtype(group, "denom", grad.dtype))
+                    state["value_momentum"] = flat.view("value_momentum", p) if flat else zeros_state(group, "value_momentum", p, shape)
+                    state["centralized_momentum"] = flat.view("centralized_momentum", p) if flat else zeros_state(group, "centralized_momentum", p, shape)
+
+                # Row-sparse gradients (embeddings) only update the touched rows, as a sub-matrix of the param
+                rows = None
+                if grad.is_sparse:
+                    sparse = sparse_rows(grad)
+                    if sparse is None:
+                        raise RuntimeError("OCGOpt only supports sparse gradients along the first dim")
+                    rows, grad = sparse
+                    p_fp32, value_momentum, centralized_momentum = self.gather_rows(p, state, rows, group)
+                    grad = grad.to(p_fp32.dtype)
+                else:
+                    # Unpack, the states are only updated out of place so they need no copy
+                    dtype = compute_dtype(p, group)
+                    grad = grad.to(dtype)
+                    p_fp32 = p.detach().clone().to(dtype)
                     if dimcount < 1:
-                        denom = state['denom'].detach().clone().to(torch.float32)
-                    value_momentum = state['value_momentum'].detach().clone().to(torch.float32)
-                    centralized_momentum = state['centralized_momentum'].detach().clone().to(torch.float32)
-                    p_fp32 = p.detach().clone().to(torch.float32)
+                        denom = unpack_state(state["denom"], dtype)
+                    value_momentum = unpack_state(state["value_momentum"], dtype)
+                    centralized_momentum = unpack_state(state["centralized_momentum"], dtype)
+
+                if record:
+                    record(p, 'grad_rms', grad.pow(2).mean().sqrt())
+
+                # GaLore-style: refit the subspace to the gradient when due, carrying both momenta over to the new one
+                refit = False
+                if projected:
+                    refit = bool(preconditioner_due(state, step, offsets[p], group["projection_interval"], "projection_step"))
+                    if refit:
+                        rotation = refresh_projector(state, grad, group["projection_rank"], generator)
+                        if rotation is not None:
+                            value_momentum = change_basis(value_momentum, rotation)
+                            centralized_momentum = change_basis(centralized_momentum, rotation)
+                    grad = project(grad, state["projector"])
 
                 # Averaged beta (step 1 = 0, step 2 = 0.5, step 3 = 0.6667, step 4 = 0.75...)
                 slow_beta2 = ((beta2**(step) - beta2) / (beta2**(step) - 1.0))
@@ -390,7 +625,16 @@ class OCGOpt(Optimizer):
                     if flip:
                         exp_avg_2d = exp_avg_2d.T # Flip if first dim is larger
 
-                    exp_avg_2d = self.clip_func(exp_avg_2d, sigma_min=0., sigma_max=0., adaptive=group["spectral_adaptive"], ortho_dtype=group["spectral_clip_dtype"])
+                    # Reuse the cached Newton-Schulz factor between refreshes, sparse row subsets change shape every step. A
+                    # factor cached in the previous subspace doesn't apply in a refitted one
+                    if group["precondition_interval"] > 1 and rows is None and p.numel() >= group["precondition_min_numel"]:
+                        due = preconditioner_due(state, step, offsets[p], group["precondition_interval"])
+                        factor = state.get("ortho_factor")
+                        if due or refit or factor is None or factor.shape[0] != exp_avg_2d.shape[1]:
+                            factor = state["ortho_factor"] = self.factor_func(exp_avg_2d, ortho_dtype=group["spectral_clip_dtype"], refine_steps=group["spectral_clip_refine_steps"])
+                        exp_avg_2d = apply_orthogonal_factor(exp_avg_2d, factor, adaptive=group["spectral_adaptive"])
+                    else:
+                        exp_avg_2d = self.clip_func(exp_avg_2d, sigma_min=0., sigma_max=0., adaptive=group["spectral_adaptive"], ortho_dtype=group["spectral_clip_dtype"], refine_steps=group["spectral_clip_refine_steps"])
 
                     if flip:
                         exp_avg_2d = exp_avg_2d.T
@@ -402,6 +646,8 @@ class OCGOpt(Optimizer):
                     full_step = exp_avg.atan2(current_denom).mul_(1.27323954474)
 
                 # Cautious update (zero-out update where the update isn't in the direction of the current gradient)
+                if record:
+                    record(p, 'keep_ratio', (grad * full_step > 0).float().mean())
                 scale_factor_mask = torch.where(grad * full_step > 0, torch.ones_like(full_step), torch.ones_like(full_step) * group["cautious_min"]).to(full_step.dtype)
                 scale_factor_mask = scale_factor_mask.div(scale_factor_mask.mean().clamp_min_(1e-3))
 
@@ -428,6 +674,15 @@ class OCGOpt(Optimizer):
                         scale_factor = (exp_avg * full_step).sum().clamp(group["adaptive_min"], group["adaptive_max"])
                         full_step = scale_factor * full_step
 
+                    if record:
+                        record(p, 'scale_factor', scale_factor.mean())
+
+                if projected:
+                    full_step = project_back(full_step, state["projector"])
+
+                if record:
+                    record(p, 'update_rms', full_step.pow(2).mean().sqrt() * lr)
+
                 # Perform weight decay
                 if weight_decay != 0:
                     grad_weights = p_fp32.data
@@ -437,16 +692,31 @@ class OCGOpt(Optimizer):
                 p_fp32.data.add_(full_step, alpha=-lr)
 
                 # Stochastic update
-                if p.dtype in {torch.float16, torch.bfloat16} and group["stochastic_fp"]:
-                    if dimcount < 1:
-                        copy_stochastic_(state["denom"], denom)
-                    copy_stochastic_(state["value_momentum"], value_momentum)
-                    copy_stochastic_(state["centralized_momentum"], centralized_momentum)
-                    copy_stochastic_(p, p_fp32)
+                if rows is not None:
+                    # Without stochastic rounding, rows computed wider than their storage are rounded to nearest
+                    stochastic = group["stochastic_fp"] or updates_in_fp32(p, group)
+                    for key, value in (("value_momentum", value_momentum), ("centralized_momentum", centralized_momentum)):
+                        index_copy_rows_(state[key], rows, value if stochastic else value.to(state[key].dtype), generator)
+                    if updates_in_fp32(p, group):
+                        write_param_(p, p_fp32, state, group["bf16_mode"], generator, rows=rows)
+                    else:
+                        p.index_copy_(0, rows, p_fp32.to(p.dtype))
                 else:
+                    stochastic = group["stochastic_fp"] or updates_in_fp32(p, group)
                     if dimcount < 1:
-                        state["denom"].copy_(denom)
-                    state["value_momentum"].copy_(value_momentum)
-                    state["centralized_momentum"].copy_(centralized_momentum)
-                    p.copy_(p_fp32)
-        return loss
\ No newline at end of file
+                        pack_state_(state["denom"], denom, generator, stochastic)
+                    pack_state_(state["value_momentum"], value_momentum, generator, stochastic)
+                    pack_state_(state["centralized_momentum"], centralized_momentum, generator, stochastic)
+                    if updates_in_fp32(p, group):
+                        write_param_(p, p_fp32, state, group["bf16_mode"], generator)
+                    else:
+                        p.copy_(p_fp32)
+
+            params = [p for p in group["params"] if p.grad is not None]
+            if non_finite is not None:
+                update_param = non_finite.guard(update_param, self.state)
+            parallel_param_update(update_param, params, num_workers=self.num_workers, cost=spectral_clip_cost)
+
+        if telemetry is not None:
+            telemetry.end_step()
+        return loss
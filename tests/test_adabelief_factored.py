@@ -0,0 +1,67 @@
+"""AdaBelief's factored belief variance: row/col statistics for matrices, full state for everything else."""
+
+import pytest
+import torch
+
+from ..optimizer_memory import estimate_state_bytes, measure_state_bytes, state_bytes_by_key
+from ..ref_opt_adabelief import AdaBelief
+
+SHAPES = [(8, 6), (6,), (2, 3, 4)]
+STEPS = 5
+
+
+def run(steps=STEPS, **kwargs):
+    r"""Train a matrix, a vector and a 3-dim param on random gradients, returning the params and the optimizer."""
+    generator = torch.Generator().manual_seed(0)
+    params = [torch.nn.Parameter(torch.randn(shape, generator=generator)) for shape in SHAPES]
+    optimizer = AdaBelief(params, lr=1e-2, **kwargs)
+    for _ in range(steps):
+        for p in params:
+            p.grad = torch.randn(p.shape, generator=generator)
+        optimizer.step()
+    return params, optimizer
+
+
+@pytest.mark.parametrize('ams_bound', [False, True])
+def test_matrices_keep_row_and_col_statistics(ams_bound):
+    params, optimizer = run(factored=True, ams_bound=ams_bound)
+    var_keys = ['exp_avg_var'] + (['max_exp_avg_var'] if ams_bound else [])
+
+    for p in params:
+        state = optimizer.state[p]
+        for key in var_keys:
+            if p.ndim >= 2:
+                assert key not in state
+                assert state[f'{key}_row'].shape == p.shape[:-1]
+                assert state[f'{key}_col'].shape == p.shape[:-2] + p.shape[-1:]
+                assert state[f'{key}_row'].dtype == state[f'{key}_col'].dtype == torch.float32
+            else:
+                assert state[key].shape == p.shape
+        assert p.isfinite().all()
+
+    measured = measure_state_bytes(optimizer)
+    estimated = state_bytes_by_key('AdaBelief', {'factored': True, 'ams_bound': ams_bound}, SHAPES)
+    assert measured == estimated
+    factored_bytes = estimate_state_bytes('AdaBelief', {'factored': True, 'ams_bound': ams_bound}, SHAPES)
+    assert factored_bytes < estimate_state_bytes('AdaBelief', {'ams_bound': ams_bound}, SHAPES)
+
+
+@pytest.mark.parametrize('flat_state', [False, True])
+def test_vectors_train_as_without_factoring(flat_state):
+    params, _ = run()
+    params_factored, _ = run(factored=True, flat_state=flat_state)
+
+    for p, p_factored in zip(params, params_factored):
+        if p.ndim < 2:
+            torch.testing.assert_close(p_factored, p, rtol=0, atol=0)
+        else:
+            # Same first moment and a variance of the same scale, so the matrices stay close
+            torch.testing.assert_close(p_factored, p, rtol=0, atol=STEPS * 2e-2)
+
+
+def test_sparse_gradients_are_rejected():
+    p = torch.nn.Parameter(torch.zeros(4, 3))
+    optimizer = AdaBelief([p], factored=True)
+    p.grad = torch.sparse_coo_tensor([[0]], torch.ones(1, 3), size=(4, 3))
+    with pytest.raises(Exception, match='factored'):
+        optimizer.step()
@@ -0,0 +1,76 @@
+"""AsyncCheckpointer: snapshots are taken at save() and written in the background."""
+
+import copy
+
+import pytest
+import torch
+
+from ..optimizer_checkpoint import AsyncCheckpointer
+from ..ref_opt_adabelief import AdaBelief
+
+SHAPES = [(8, 4), (4,)]
+
+
+def make_optimizer():
+    generator = torch.Generator().manual_seed(0)
+    params = [torch.nn.Parameter(torch.randn(shape, generator=generator)) for shape in SHAPES]
+    return AdaBelief(params, lr=1e-2)
+
+
+def train(optimizer, steps, generator):
+    for _ in range(steps):
+        for group in optimizer.param_groups:
+            for p in group['params']:
+                p.grad = torch.randn(p.shape, generator=generator)
+        optimizer.step()
+
+
+def assert_state_equal(state_dict, expected):
+    assert state_dict['param_groups'] == expected['param_groups']
+    assert state_dict['state'].keys() == expected['state'].keys()
+    for index, param_state in expected['state'].items():
+        for key, value in param_state.items():
+            torch.testing.assert_close(state_dict['state'][index][key], value, rtol=0, atol=0)
+
+
+@pytest.mark.parametrize('max_in_flight', [1, 2])
+def test_snapshot_is_unaffected_by_later_steps(tmp_path, max_in_flight):
+    optimizer = make_optimizer()
+    generator = torch.Generator().manual_seed(1)
+    checkpointer = AsyncCheckpointer(optimizer, max_in_flight=max_in_flight)
+
+    expected = []
+    for i in range(3):
+        train(optimizer, 2, generator)
+        expected.append(copy.deepcopy(optimizer.state_dict()))
+        checkpointer.save(str(tmp_path / f'{i}.pt'), extra={'step': 2 * (i + 1)})
+    # The state tensors are updated in place while the snapshots may still be written
+    train(optimizer, 2, generator)
+    checkpointer.close()
+
+    assert len(checkpointer.stalls) == 3
+    assert len(checkpointer.write_times) == 3
+    for i, state_dict in enumerate(expected):
+        saved = torch.load(tmp_path / f'{i}.pt')
+        assert saved['extra'] == {'step': 2 * (i + 1)}
+        assert_state_equal(saved, state_dict)
+
+        resumed = make_optimizer()
+        resumed.load_state_dict(saved)
+        assert_state_equal(resumed.state_dict(), state_dict)
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_write_errors_are_raised(tmp_path):
+    optimizer = make_optimizer()
+    train(optimizer, 1, torch.Generator().manual_seed(1))
+    checkpointer = AsyncCheckpointer(optimizer)
+    checkpointer.save(str(tmp_path / 'missing' / 'state.pt'))
+    with pytest.raises(RuntimeError, match='does not exist'):
+        checkpointer.wait()
+    checkpointer.close()
+
+
+def test_max_in_flight_must_be_positive():
+    with pytest.raises(ValueError, match='max_in_flight'):
+        AsyncCheckpointer(make_optimizer(), max_in_flight=0)
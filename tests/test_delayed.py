@@ -0,0 +1,78 @@
+"""DelayedStep on CPU threads against a serial optimizer fed the same gradients."""
+
+import torch
+
+from ..optimizer_delayed import DelayedStep
+from ..ref_opt_adabelief import AdaBelief
+
+SHAPES = [(8, 4), (4,)]
+STEPS = 4
+
+
+def make_params():
+    generator = torch.Generator().manual_seed(0)
+    return [torch.nn.Parameter(torch.randn(shape, generator=generator)) for shape in SHAPES]
+
+
+def make_grads():
+    generator = torch.Generator().manual_seed(1)
+    return [[torch.randn(shape, generator=generator) for shape in SHAPES] for _ in range(STEPS)]
+
+
+def serial_trajectory(grads):
+    r"""Params after 0, 1, ... len(grads) serial steps."""
+    params = make_params()
+    optimizer = AdaBelief(params, lr=1e-2)
+    trajectory = [[p.detach().clone() for p in params]]
+    for step_grads in grads:
+        for p, grad in zip(params, step_grads):
+            p.grad = grad.clone()
+        optimizer.step()
+        trajectory.append([p.detach().clone() for p in params])
+    return trajectory
+
+
+def assert_params_equal(params, expected):
+    for p, p_expected in zip(params, expected):
+        torch.testing.assert_close(p.detach(), p_expected, rtol=0, atol=0)
+
+
+def test_updates_land_one_step_late():
+    grads = make_grads()
+    trajectory = serial_trajectory(grads)
+    params = make_params()
+    delayed = DelayedStep(AdaBelief(params, lr=1e-2))
+
+    for t, step_grads in enumerate(grads, start=1):
+        for p, grad in zip(params, step_grads):
+            p.grad = grad.clone()
+        delayed.step()
+        delayed.zero_grad()
+        assert_params_equal(params, trajectory[t - 1])
+
+    delayed.close()
+    assert_params_equal(params, trajectory[STEPS])
+    assert 0.0 <= delayed.overlap_efficiency <= 1.0
+    assert len(delayed.step_times) == STEPS
+
+
+def test_zero_grad_leaves_the_running_snapshot_alone():
+    grads = make_grads()
+    trajectory = serial_trajectory(grads)
+    params = make_params()
+    delayed = DelayedStep(AdaBelief(params, lr=1e-2))
+
+    # Gradients accumulate into the same tensors, zeroed in place while the previous step may still be reading
+    for p, grad in zip(params, grads[0]):
+        p.grad = grad.clone()
+    for step_grads in grads[1:] + [None]:
+        delayed.step()
+        delayed.zero_grad(set_to_none=False)
+        assert all(p.grad is not None and (p.grad == 0).all() for p in params)
+        if step_grads is not None:
+            for p, grad in zip(params, step_grads):
+                p.grad.add_(grad)
+    delayed.close()
+
+    assert_params_equal(params, trajectory[STEPS])
+    assert 0.0 <= delayed.overlap_efficiency <= 1.0
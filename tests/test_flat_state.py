@@ -0,0 +1,85 @@
+"""flat_state: state kept in contiguous per-group buffers trains exactly like per-param state."""
+
+import copy
+
+import pytest
+import torch
+
+from .. import ref_opt_adabelief, ref_opt_came, ref_opt_ocgopt
+
+OPTIMIZERS = {
+    'AdaBelief': (ref_opt_adabelief.AdaBelief, ['exp_avg', 'exp_avg_var']),
+    'CAME': (ref_opt_came.CAME, ['exp_avg']),
+    'OCGOpt': (ref_opt_ocgopt.OCGOpt, ['value_momentum', 'centralized_momentum']),
+}
+KWARGS = {'OCGOpt': {'spectral_clip_compile': False}}
+SHAPES = [(8, 6), (6,), (5, 4)]
+STEPS = 4
+# Steps where the last param gets no gradient, which leaves its slice of the buffers alone
+NO_GRAD = {2}
+
+
+def run(optimizer_id, steps=STEPS, **kwargs):
+    r"""Train a few params on random gradients, returning the params and the optimizer."""
+    optimizer_cls, _ = OPTIMIZERS[optimizer_id]
+    generator = torch.Generator().manual_seed(0)
+    params = [torch.nn.Parameter(torch.randn(shape, generator=generator)) for shape in SHAPES]
+    optimizer = optimizer_cls(params, lr=1e-2, **KWARGS.get(optimizer_id, {}), **kwargs)
+    for step in range(steps):
+        for i, p in enumerate(params):
+            grad = torch.randn(p.shape, generator=generator)
+            p.grad = None if i == len(params) - 1 and step in NO_GRAD else grad
+        optimizer.step()
+    return params, optimizer
+
+
+@pytest.mark.parametrize('optimizer_id', OPTIMIZERS)
+def test_flat_state_matches_per_param_state(optimizer_id):
+    params, optimizer = run(optimizer_id)
+    params_flat, optimizer_flat = run(optimizer_id, flat_state=True)
+
+    for p, p_flat in zip(params, params_flat):
+        torch.testing.assert_close(p_flat, p, rtol=0, atol=0)
+        state, state_flat = optimizer.state[p], optimizer_flat.state[p_flat]
+        assert state.keys() == state_flat.keys()
+        for key, value in state.items():
+            if isinstance(value, torch.Tensor):
+                torch.testing.assert_close(state_flat[key], value, rtol=0, atol=0)
+
+
+@pytest.mark.parametrize('optimizer_id', OPTIMIZERS)
+def test_state_is_a_view_into_one_buffer_per_key(optimizer_id):
+    _, keys = OPTIMIZERS[optimizer_id]
+    params, optimizer = run(optimizer_id, flat_state=True)
+
+    for key in keys:
+        views = [optimizer.state[p][key] for p in params]
+        base = views[0].untyped_storage().data_ptr()
+        assert all(view.untyped_storage().data_ptr() == base for view in views), key
+        assert all(view.shape == p.shape for view, p in zip(views, params))
+
+
+@pytest.mark.parametrize('optimizer_id', OPTIMIZERS)
+def test_loaded_state_is_moved_into_the_buffers(optimizer_id):
+    params, optimizer = run(optimizer_id, flat_state=True)
+    params_resumed, optimizer_resumed = run(optimizer_id, steps=0, flat_state=True)
+    with torch.no_grad():
+        for p, p_resumed in zip(params, params_resumed):
+            p_resumed.copy_(p)
+    # A deep copy, as load_state_dict keeps tensors that are already on the right device
+    optimizer_resumed.load_state_dict(copy.deepcopy(optimizer.state_dict()))
+
+    generator = torch.Generator().manual_seed(1)
+    for _ in range(2):
+        for p, p_resumed in zip(params, params_resumed):
+            p.grad = torch.randn(p.shape, generator=generator)
+            p_resumed.grad = p.grad.clone()
+        optimizer.step()
+        optimizer_resumed.step()
+
+    _, keys = OPTIMIZERS[optimizer_id]
+    for p, p_resumed in zip(params, params_resumed):
+        torch.testing.assert_close(p_resumed, p, rtol=0, atol=0)
+    for key in keys:
+        base = optimizer_resumed.state[params_resumed[0]][key].untyped_storage().data_ptr()
+        assert all(optimizer_resumed.state[p][key].untyped_storage().data_ptr() == base for p in params_resumed)
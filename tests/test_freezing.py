@@ -0,0 +1,54 @@
+"""LayerFreezer: freezing a param that stopped moving, re-probing it, and non-finite updates."""
+
+import pytest
+import torch
+
+from ..optimizer_freezing import LayerFreezer
+from ..ref_opt_adabelief import AdaBelief
+
+WINDOW, REPROBE_EVERY, INTERVAL = 4, 8, 2
+
+
+def test_reprobe_every_must_be_a_multiple_of_window():
+    with pytest.raises(ValueError, match='reprobe_every'):
+        LayerFreezer(window=4, reprobe_every=6, interval=2)
+
+
+def test_still_param_freezes_and_thaws():
+    generator = torch.Generator().manual_seed(0)
+    still, moving = torch.nn.Parameter(torch.randn(4, 4)), torch.nn.Parameter(torch.randn(4, 4))
+    optimizer = AdaBelief([still, moving], lr=1e-2)
+    freezer = LayerFreezer(threshold=1e-6, window=WINDOW, reprobe_every=REPROBE_EVERY, interval=INTERVAL)
+    freezer.attach(optimizer)
+
+    frozen_steps = []
+    for step in range(1, 3 * WINDOW + 1):
+        if still.requires_grad:
+            still.grad = torch.zeros_like(still)
+        moving.grad = torch.randn(moving.shape, generator=generator)
+        optimizer.step()
+        if not still.requires_grad:
+            assert still.grad is None
+            frozen_steps.append(step)
+
+    # Frozen at the end of the first window, thawed REPROBE_EVERY steps later
+    assert frozen_steps == list(range(WINDOW, WINDOW + REPROBE_EVERY))
+    assert moving.requires_grad
+    assert freezer.frozen == {}
+
+
+def test_non_finite_update_never_freezes():
+    p = torch.nn.Parameter(torch.ones(4))
+    freezer = LayerFreezer(threshold=1e-6, window=WINDOW, reprobe_every=REPROBE_EVERY, interval=INTERVAL)
+    freezer.attach(AdaBelief([p]))
+
+    for step in range(1, 2 * WINDOW + 1):
+        freezer.begin_step()
+        if freezer.active:
+            freezer.record(p, 'update_rms', float('nan') if step == INTERVAL else 0.0)
+        freezer.end_step()
+        if step == WINDOW:
+            assert p.requires_grad
+
+    # The next window has only zero updates
+    assert not p.requires_grad
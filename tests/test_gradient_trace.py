@@ -0,0 +1,55 @@
+"""Gradient traces: a recorded run replays bit for bit, and a trace cut short stays readable."""
+
+import torch
+
+from ..gradient_trace import GradientRecorder, GradientTrace, replay
+from ..optimizer_registry import create_optimizer
+
+SHAPES = {'weight': (6, 4), 'bias': (4,)}
+STEPS = 5
+# Steps where the bias gets no gradient
+NO_BIAS_GRAD = {2}
+
+
+def record_run(path, flush_every=100, close=True):
+    r"""Train with AdaBelief while recording, returning the final params."""
+    generator = torch.Generator().manual_seed(0)
+    named = [(name, torch.nn.Parameter(torch.randn(shape, generator=generator))) for name, shape in SHAPES.items()]
+    params = [p for _, p in named]
+    optimizer = create_optimizer('AdaBelief', params, lr=1e-2)
+    recorder = GradientRecorder(str(path), named, flush_every=flush_every)
+    for step in range(STEPS):
+        for name, p in named:
+            p.grad = None if name == 'bias' and step in NO_BIAS_GRAD else torch.randn(p.shape, generator=generator)
+        recorder.record()
+        optimizer.step()
+    if close:
+        recorder.close()
+    return [p.detach() for p in params]
+
+
+def test_replay_reproduces_the_recorded_run(tmp_path):
+    recorded = record_run(tmp_path)
+    trace = GradientTrace(str(tmp_path))
+    assert trace.steps == STEPS
+    assert trace.missing == {step: {1} for step in NO_BIAS_GRAD}
+
+    params = trace.initial_params()
+    optimizer = create_optimizer('AdaBelief', params, lr=1e-2)
+    for step in range(trace.steps):
+        for p, grad in zip(params, trace.grads(step)):
+            p.grad = None if grad is None else grad.clone()
+        optimizer.step()
+
+    for p, p_recorded in zip(params, recorded):
+        torch.testing.assert_close(p.detach(), p_recorded, rtol=0, atol=0)
+
+    results = replay(trace, [('a', 'AdaBelief', {'lr': 1e-2}), ('b', 'AdaBelief', {'lr': 1e-2})], compare_every=2)
+    assert [distance for _, distance in results['b']['divergence']] == [0.0, 0.0, 0.0]
+
+
+def test_unflushed_steps_of_a_crashed_run_are_ignored(tmp_path):
+    record_run(tmp_path, flush_every=2, close=False)
+    trace = GradientTrace(str(tmp_path))
+    assert trace.steps == 4
+    assert trace.missing == {step: {1} for step in NO_BIAS_GRAD}
@@ -0,0 +1,87 @@
+"""StateHibernation: the state of idle params moves off the device and comes back unchanged."""
+
+import os
+
+import pytest
+import torch
+
+from .. import ref_opt_adabelief, ref_opt_came, ref_opt_ocgopt
+from ..utils import StateHibernation
+
+OPTIMIZERS = {
+    'AdaBelief': ref_opt_adabelief.AdaBelief,
+    'CAME': ref_opt_came.CAME,
+    'OCGOpt': ref_opt_ocgopt.OCGOpt,
+}
+KWARGS = {'OCGOpt': {'spectral_clip_compile': False}}
+SHAPES = [(8, 6), (6,)]
+AFTER = 2
+# Steps where the weight gets no gradient, long enough to be hibernated for a while
+IDLE = range(2, 7)
+STEPS = 9
+
+
+def run(optimizer_id, on_step=None, **kwargs):
+    r"""Train a weight that is idle for a few steps and a bias, returning the params and the optimizer."""
+    generator = torch.Generator().manual_seed(0)
+    params = [torch.nn.Parameter(torch.randn(shape, generator=generator)) for shape in SHAPES]
+    optimizer = OPTIMIZERS[optimizer_id](params, lr=1e-2, **KWARGS.get(optimizer_id, {}), **kwargs)
+    for step in range(STEPS):
+        grads = [torch.randn(p.shape, generator=generator) for p in params]
+        for i, (p, grad) in enumerate(zip(params, grads)):
+            p.grad = None if i == 0 and step in IDLE else grad
+        optimizer.step()
+        if on_step is not None:
+            on_step(step, params, optimizer)
+    return params, optimizer
+
+
+def state_bytes(state):
+    return sum(value.numel() * value.element_size() for value in state.values() if isinstance(value, torch.Tensor))
+
+
+@pytest.mark.parametrize('optimizer_id', OPTIMIZERS)
+def test_disk_hibernation_restores_state_bitwise(optimizer_id):
+    snapshots = {}
+
+    def on_step(step, params, optimizer):
+        hibernation, state = optimizer.hibernation, optimizer.state[params[0]]
+        if step == IDLE.start:
+            snapshots['state'] = {key: value.clone() for key, value in state.items() if isinstance(value, torch.Tensor)}
+        if step == IDLE.stop - 1:
+            # Hibernated at the start of the step after AFTER idle ones, and still in the optimizer's state
+            assert list(hibernation.hibernated) == [params[0]]
+            assert hibernation.hibernated_bytes == state_bytes(state)
+            assert len(os.listdir(hibernation._directory)) == 1
+            snapshots['state_dict'] = optimizer.state_dict()
+            for key, value in snapshots['state'].items():
+                torch.testing.assert_close(state[key], value, rtol=0, atol=0)
+        if step == IDLE.stop:
+            assert hibernation.hibernated == {}
+            assert hibernation.hibernated_bytes == 0
+            assert hibernation.wakes == 1
+            assert os.listdir(hibernation._directory) == []
+
+    params, optimizer = run(optimizer_id, on_step, hibernate_after=AFTER, hibernate_to='disk')
+    assert optimizer.hibernation.wakes == 1
+    assert 0 in snapshots['state_dict']['state']
+
+    params_awake, optimizer_awake = run(optimizer_id)
+    for p, p_awake in zip(params, params_awake):
+        torch.testing.assert_close(p, p_awake, rtol=0, atol=0)
+        for key, value in optimizer_awake.state[p_awake].items():
+            if isinstance(value, torch.Tensor):
+                torch.testing.assert_close(optimizer.state[p][key], value, rtol=0, atol=0)
+
+
+def test_cpu_params_are_not_hibernated_to_cpu():
+    _, optimizer = run('AdaBelief', hibernate_after=AFTER, hibernate_to='cpu')
+    assert optimizer.hibernation.hibernated == {}
+    assert optimizer.hibernation.wakes == 0
+
+
+def test_invalid_arguments_are_rejected():
+    with pytest.raises(ValueError, match='hibernate_after'):
+        StateHibernation(0)
+    with pytest.raises(ValueError, match='hibernate target'):
+        StateHibernation(1, target='tape')
@@ -0,0 +1,88 @@
+"""bf16_mode='kahan': compensated writes of updates into 16-bit params."""
+
+import pytest
+import torch
+
+from .. import ref_opt_adabelief, ref_opt_came, ref_opt_ocgopt
+from ..utils import copy_kahan_, write_param_
+
+OPTIMIZERS = {
+    'AdaBelief': ref_opt_adabelief.AdaBelief,
+    'CAME': ref_opt_came.CAME,
+    'OCGOpt': ref_opt_ocgopt.OCGOpt,
+}
+KWARGS = {'OCGOpt': {'spectral_clip_compile': False}}
+SHAPES = [(16, 8), (8,)]
+
+
+def run(optimizer_id, dtype, steps=3, lr=1e-2, **kwargs):
+    r"""Train params of the given dtype on random bf16-representable values, returning the params and the optimizer."""
+    generator = torch.Generator().manual_seed(0)
+    params = [torch.nn.Parameter(torch.randn(shape, generator=generator).bfloat16().to(dtype)) for shape in SHAPES]
+    optimizer = OPTIMIZERS[optimizer_id](params, lr=lr, **KWARGS.get(optimizer_id, {}), **kwargs)
+    for _ in range(steps):
+        for p in params:
+            p.grad = torch.randn(p.shape, generator=generator).bfloat16().to(dtype)
+        optimizer.step()
+    return params, optimizer
+
+
+def test_increments_below_half_an_ulp_accumulate():
+    target = torch.ones(4, dtype=torch.bfloat16)
+    compensation = torch.zeros_like(target)
+    for _ in range(100):
+        copy_kahan_(target, target.float() + 1e-3, compensation)
+
+    # Round to nearest would stay at 1, an ulp of bfloat16 at 1 is 2^-7
+    assert (target > 1.0).all()
+    torch.testing.assert_close(target.float() + compensation.float(), torch.full((4,), 1.1), rtol=0, atol=2**-9)
+    assert (compensation.float().abs() <= 2**-8).all()
+
+
+def test_row_writes_match_dense_writes():
+    generator = torch.Generator().manual_seed(0)
+    p = torch.randn(6, 4, generator=generator).bfloat16()
+    source = p.float() + torch.randn(6, 4, generator=generator) * 1e-3
+    rows = torch.tensor([1, 4])
+
+    dense, dense_state = p.clone(), {}
+    write_param_(dense, source, dense_state, 'kahan')
+    sparse, sparse_state = p.clone(), {}
+    write_param_(sparse, source[rows], sparse_state, 'kahan', rows=rows)
+
+    torch.testing.assert_close(sparse[rows], dense[rows], rtol=0, atol=0)
+    torch.testing.assert_close(sparse_state['kahan_comp'][rows], dense_state['kahan_comp'][rows], rtol=0, atol=0)
+    mask = torch.ones(6, dtype=torch.bool)
+    mask[rows] = False
+    torch.testing.assert_close(sparse[mask], p[mask], rtol=0, atol=0)
+    assert (sparse_state['kahan_comp'][mask] == 0).all()
+
+
+@pytest.mark.parametrize('optimizer_id', OPTIMIZERS)
+def test_compensation_is_only_kept_for_16_bit_params(optimizer_id):
+    params, optimizer = run(optimizer_id, torch.bfloat16, bf16_mode='kahan')
+    for p in params:
+        assert optimizer.state[p]['kahan_comp'].dtype == torch.bfloat16
+        assert p.isfinite().all()
+
+    params, optimizer = run(optimizer_id, torch.float32, bf16_mode='kahan')
+    params_stochastic, _ = run(optimizer_id, torch.float32)
+    for p, p_stochastic in zip(params, params_stochastic):
+        assert 'kahan_comp' not in optimizer.state[p]
+        torch.testing.assert_close(p, p_stochastic, rtol=0, atol=0)
+
+
+def test_tiny_updates_track_the_fp32_run():
+    # Updates of lr=1e-4 are well below an ulp of the params, which round to nearest would drop entirely. The moments
+    # are kept in fp32, so the param writes are the only difference to the fp32 run
+    steps, lr = 20, 1e-4
+    state_dtypes = {'exp_avg': 'fp32', 'exp_avg_var': 'fp32'}
+    reference, _ = run('AdaBelief', torch.float32, steps=steps, lr=lr)
+    kahan, optimizer = run('AdaBelief', torch.bfloat16, steps=steps, lr=lr, bf16_mode='kahan', state_dtypes=state_dtypes)
+    stochastic, _ = run('AdaBelief', torch.bfloat16, steps=steps, lr=lr, state_dtypes=state_dtypes)
+
+    for p, p_stochastic, p_reference in zip(kahan, stochastic, reference):
+        tracked = p.float() + optimizer.state[p]['kahan_comp'].float()
+        error = (tracked - p_reference).abs().max()
+        assert error < (p_stochastic.float() - p_reference).abs().max() / 10
+        assert error < steps * lr / 10
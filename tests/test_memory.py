@@ -0,0 +1,103 @@
+"""State memory: the cost formulas match the state the optimizers allocate, and cached preconditioners are reused."""
+
+import pytest
+import torch
+
+from .. import ref_opt_adabelief, ref_opt_came, ref_opt_ocgopt
+from ..optimizer_memory import STATE_COST_FORMULAS, estimate_state_bytes, measure_state_bytes, state_bytes_by_key
+
+OPTIMIZERS = {
+    'AdaBelief': ref_opt_adabelief.AdaBelief,
+    'CAME': ref_opt_came.CAME,
+    'OCGOpt': ref_opt_ocgopt.OCGOpt,
+}
+KWARGS = {'OCGOpt': {'spectral_clip_compile': False}}
+SHAPES = [(8, 6), (6,), (2, 3, 4), ()]
+INTERVAL = {'precondition_interval': 3}
+
+CASES = [
+    ('AdaBelief', {}, torch.float32),
+    ('AdaBelief', {'ams_bound': True, 'adanorm': True}, torch.float32),
+    ('AdaBelief', {'factored': True, 'ams_bound': True}, torch.float32),
+    ('AdaBelief', {'projection_rank': 2, 'ams_bound': True}, torch.float32),
+    ('AdaBelief', {'state_dtypes': {'exp_avg': 'bf16'}, 'bf16_mode': 'kahan'}, torch.bfloat16),
+    ('CAME', {}, torch.float32),
+    ('CAME', {'ams_bound': True}, torch.float32),
+    ('CAME', INTERVAL, torch.float32),
+    ('CAME', {**INTERVAL, 'precondition_min_numel': 30}, torch.float32),
+    ('CAME', {**INTERVAL, 'bf16_mode': 'kahan'}, torch.bfloat16),
+    ('OCGOpt', {}, torch.float32),
+    ('OCGOpt', INTERVAL, torch.float32),
+    ('OCGOpt', {**INTERVAL, 'precondition_min_numel': 30}, torch.float32),
+    ('OCGOpt', {**INTERVAL, 'spectral_clip_dtype': torch.bfloat16}, torch.float32),
+    ('OCGOpt', {**INTERVAL, 'spectral_clip_dtype': torch.bfloat16, 'spectral_clip_refine_steps': 1}, torch.float32),
+    ('OCGOpt', {**INTERVAL, 'projection_rank': 2}, torch.float32),
+    ('OCGOpt', {'bf16_mode': 'kahan', 'state_dtypes': {'value_momentum': 'fp32'}}, torch.bfloat16),
+]
+
+
+def run(optimizer_id, args, dtype=torch.float32, steps=4, shapes=SHAPES):
+    r"""Train params of the given shapes on random gradients, returning the params and the optimizer."""
+    generator = torch.Generator().manual_seed(0)
+    params = [torch.nn.Parameter(torch.randn(shape, generator=generator).to(dtype)) for shape in shapes]
+    optimizer = OPTIMIZERS[optimizer_id](params, lr=1e-2, **KWARGS.get(optimizer_id, {}), **args)
+    for _ in range(steps):
+        for p in params:
+            p.grad = torch.randn(p.shape, generator=generator).to(dtype)
+        optimizer.step()
+    return params, optimizer
+
+
+def test_every_formula_is_covered():
+    assert set(OPTIMIZERS) <= set(STATE_COST_FORMULAS)
+    keys = {(optimizer_id, term['key']) for optimizer_id in OPTIMIZERS for term in STATE_COST_FORMULAS[optimizer_id]}
+    covered = set()
+    for optimizer_id, args, dtype in CASES:
+        covered |= {(optimizer_id, key) for key in state_bytes_by_key(optimizer_id, args, SHAPES, dtype)}
+    assert keys == covered
+
+
+@pytest.mark.parametrize(('optimizer_id', 'args', 'dtype'), CASES)
+def test_estimate_matches_allocated_state(optimizer_id, args, dtype):
+    params, optimizer = run(optimizer_id, args, dtype)
+    assert all(p.isfinite().all() for p in params)
+
+    measured = measure_state_bytes(optimizer)
+    assert measured == state_bytes_by_key(optimizer_id, args, SHAPES, dtype)
+    assert sum(sum(by_dtype.values()) for by_dtype in measured.values()) == estimate_state_bytes(
+        optimizer_id, args, SHAPES, dtype
+    )
+
+
+def test_ocgopt_reuses_the_orthogonal_factor_between_refreshes():
+    calls = []
+    _, optimizer = run('OCGOpt', INTERVAL, steps=0, shapes=[(8, 6)])
+    factor_func = optimizer.factor_func
+    optimizer.factor_func = lambda *args, **kwargs: calls.append(optimizer.param_groups[0]['step']) or factor_func(
+        *args, **kwargs
+    )
+
+    p = optimizer.param_groups[0]['params'][0]
+    generator = torch.Generator().manual_seed(1)
+    for _ in range(7):
+        p.grad = torch.randn(p.shape, generator=generator)
+        optimizer.step()
+
+    # Computed on the first step, then refreshed every third step
+    assert calls == [1, 3, 6]
+
+
+def test_came_refreshes_its_statistics_every_interval():
+    _, optimizer = run('CAME', INTERVAL, steps=0, shapes=[(8, 6)])
+    p = optimizer.param_groups[0]['params'][0]
+    generator = torch.Generator().manual_seed(1)
+
+    refreshed = []
+    for step in range(1, 8):
+        p.grad = torch.randn(p.shape, generator=generator)
+        before = optimizer.state[p]['exp_avg_sq_row'].clone() if step > 1 else None
+        optimizer.step()
+        if before is None or not torch.equal(before, optimizer.state[p]['exp_avg_sq_row']):
+            refreshed.append(step)
+
+    assert refreshed == [1, 3, 6]
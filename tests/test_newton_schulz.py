@@ -0,0 +1,76 @@
+"""Mixed-precision Newton-Schulz: low-precision iterations with the last ones refined in fp32."""
+
+import pytest
+import torch
+
+from ..ref_opt_ocgopt import NS_COEFFS, OCGOpt, apply_orthogonal_factor, orthogonal_factor, orthogonalize
+
+SHAPE = (64, 32)
+REFINE_STEPS = 2
+
+
+def matrix(shape=SHAPE):
+    return torch.randn(shape, generator=torch.Generator().manual_seed(0))
+
+
+def error(M, reference):
+    return (torch.linalg.norm(M.float() - reference) / torch.linalg.norm(reference)).item()
+
+
+@pytest.mark.parametrize('transpose', [False, True])
+def test_refined_bf16_is_closer_to_fp32(transpose):
+    M = matrix().T if transpose else matrix()
+    reference = orthogonalize(M, ortho_dtype=torch.float32)
+    results = [orthogonalize(M, ortho_dtype=torch.bfloat16, refine_steps=steps) for steps in range(len(NS_COEFFS) + 1)]
+
+    assert all(result.dtype == M.dtype and result.shape == M.shape for result in results)
+    # Every iteration moved to fp32 helps, refining all of them only leaves the error of the bf16 input
+    errors = [error(result, reference) for result in results]
+    assert errors == sorted(errors, reverse=True)
+    assert errors[REFINE_STEPS] < errors[0]
+    assert errors[-1] < errors[0] / 4
+
+
+def test_refinement_is_a_no_op_in_fp32():
+    M = matrix()
+    torch.testing.assert_close(
+        orthogonalize(M, ortho_dtype=torch.float32, refine_steps=REFINE_STEPS),
+        orthogonalize(M, ortho_dtype=torch.float32),
+        rtol=0,
+        atol=0,
+    )
+
+
+def test_refined_factor_is_kept_in_fp32():
+    M = matrix()
+    reference = orthogonalize(M, ortho_dtype=torch.float32)
+    Q = orthogonal_factor(M, ortho_dtype=torch.bfloat16, refine_steps=REFINE_STEPS)
+    Q_bf16 = orthogonal_factor(M, ortho_dtype=torch.bfloat16)
+
+    assert Q.dtype == torch.float32
+    assert Q_bf16.dtype == torch.bfloat16
+    refined = apply_orthogonal_factor(M, Q)
+    assert refined.dtype == M.dtype
+    assert error(refined, reference) < error(apply_orthogonal_factor(M, Q_bf16), reference)
+
+
+@pytest.mark.parametrize('precondition_interval', [1, 3])
+def test_ocgopt_trains_with_a_refined_bf16_schedule(precondition_interval):
+    generator = torch.Generator().manual_seed(0)
+    p = torch.nn.Parameter(torch.randn(SHAPE, generator=generator))
+    optimizer = OCGOpt(
+        [p],
+        lr=1e-2,
+        spectral_clip_compile=False,
+        spectral_clip_dtype=torch.bfloat16,
+        spectral_clip_refine_steps=REFINE_STEPS,
+        precondition_interval=precondition_interval,
+    )
+    for _ in range(4):
+        p.grad = torch.randn(p.shape, generator=generator)
+        optimizer.step()
+
+    assert p.dtype == torch.float32
+    assert p.isfinite().all()
+    if precondition_interval > 1:
+        assert optimizer.state[p]['ortho_factor'].dtype == torch.float32
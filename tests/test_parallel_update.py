@@ -0,0 +1,55 @@
+"""Thread-pool parameter updates (num_workers): results independent of the worker count, and thread count handling."""
+
+import pytest
+import torch
+
+from ..ref_opt_adabelief import AdaBelief
+from ..ref_opt_came import CAME
+from ..ref_opt_ocgopt import OCGOpt
+from ..utils import parallel_param_update
+
+OPTIMIZERS = {
+    'AdaBelief': (AdaBelief, {}),
+    'CAME': (CAME, {}),
+    'OCGOpt': (OCGOpt, {'spectral_clip_compile': False}),
+}
+SHAPES = [(16, 8), (8,), (12, 12), (4, 20), (20,), (6, 6, 2)]
+
+
+def run(optimizer_id, num_workers, steps=3, **kwargs):
+    r"""Train bf16 params of SHAPES on random gradients, returning the params."""
+    optimizer_cls, defaults = OPTIMIZERS[optimizer_id]
+    generator = torch.Generator().manual_seed(0)
+    params = [torch.nn.Parameter(torch.randn(shape, generator=generator).bfloat16()) for shape in SHAPES]
+    optimizer = optimizer_cls(params, lr=1e-2, num_workers=num_workers, **defaults, **kwargs)
+    torch.manual_seed(1)
+    for _ in range(steps):
+        for p in params:
+            p.grad = torch.randn(p.shape, generator=generator).bfloat16()
+        optimizer.step()
+    return [p.detach() for p in params]
+
+
+@pytest.mark.parametrize('bf16_mode', ['stochastic', 'kahan'])
+@pytest.mark.parametrize('optimizer_id', OPTIMIZERS)
+def test_workers_match_serial_bf16(optimizer_id, bf16_mode):
+    serial = run(optimizer_id, 1, bf16_mode=bf16_mode)
+    for num_workers in (2, 4):
+        for p, p_parallel in zip(serial, run(optimizer_id, num_workers, bf16_mode=bf16_mode)):
+            torch.testing.assert_close(p_parallel, p, rtol=0, atol=0)
+
+
+def test_thread_count_restored_when_an_update_raises():
+    def update(p, generator=None):
+        assert torch.get_num_threads() == 2
+        if p.numel() == 3:
+            raise RuntimeError('update failed')
+
+    threads = torch.get_num_threads()
+    torch.set_num_threads(4)
+    try:
+        with pytest.raises(RuntimeError, match='update failed'):
+            parallel_param_update(update, [torch.zeros(n) for n in (1, 2, 3, 4)], num_workers=2)
+        assert torch.get_num_threads() == 4
+    finally:
+        torch.set_num_threads(threads)
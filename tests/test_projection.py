@@ -0,0 +1,117 @@
+"""Low-rank projected state (projection_rank) and its interplay with cached factors and the non-finite guard."""
+
+import pytest
+import torch
+
+from ..ref_opt_adabelief import AdaBelief
+from ..ref_opt_ocgopt import OCGOpt
+
+OPTIMIZERS = {
+    'AdaBelief': (AdaBelief, {}),
+    'OCGOpt': (OCGOpt, {'spectral_clip_compile': False}),
+}
+SHAPE = (12, 8)
+
+
+def run(optimizer_id, grads, **kwargs):
+    r"""Step a SHAPE weight through the given gradients, returning the param and the optimizer."""
+    optimizer_cls, defaults = OPTIMIZERS[optimizer_id]
+    p = torch.nn.Parameter(torch.randn(SHAPE, generator=torch.Generator().manual_seed(0)))
+    optimizer = optimizer_cls([p], lr=1e-2, **defaults, **kwargs)
+    for grad in grads:
+        p.grad = grad.clone()
+        optimizer.step()
+    return p, optimizer
+
+
+def random_grads(steps):
+    generator = torch.Generator().manual_seed(1)
+    return [torch.randn(SHAPE, generator=generator) for _ in range(steps)]
+
+
+@pytest.mark.parametrize('optimizer_id', OPTIMIZERS)
+def test_rank_at_least_min_dim_is_unprojected(optimizer_id):
+    grads = random_grads(4)
+    p, optimizer = run(optimizer_id, grads)
+    p_full_rank, optimizer_full_rank = run(optimizer_id, grads, projection_rank=min(SHAPE), projection_interval=2)
+
+    torch.testing.assert_close(p_full_rank, p, rtol=0, atol=0)
+    assert 'projector' not in optimizer_full_rank.state[p_full_rank]
+
+
+def test_ocgopt_refits_cached_factor_with_projector():
+    _, optimizer = run('OCGOpt', [], projection_rank=4, projection_interval=3, precondition_interval=100)
+    factor_func = optimizer.factor_func
+    calls = []
+
+    def counting_factor_func(*args, **kwargs):
+        calls.append(optimizer.param_groups[0]['step'])
+        return factor_func(*args, **kwargs)
+
+    optimizer.factor_func = counting_factor_func
+    p = optimizer.param_groups[0]['params'][0]
+    for grad in random_grads(6):
+        p.grad = grad
+        optimizer.step()
+
+    # The projector is fitted on the first step and refitted every third
+    assert calls == [1, 3, 6]
+
+
+@pytest.mark.parametrize('optimizer_id', OPTIMIZERS)
+def test_skipped_refresh_rolls_back_projection_step(optimizer_id):
+    grads = random_grads(3)
+    grads[1][0, 0] = float('nan')
+    p, optimizer = run(optimizer_id, grads[:2], projection_rank=4, projection_interval=2, skip_non_finite=True)
+    state = optimizer.state[p]
+
+    # Step 2 was due for a refit, which the skipped step must not count once its verdict is read
+    optimizer.non_finite.resolve()
+    assert state['projection_step'] == 1
+    assert optimizer.non_finite.skipped_steps.item() == 1
+
+
+@pytest.mark.parametrize('optimizer_id', OPTIMIZERS)
+def test_projector_first_fitted_on_skipped_step_is_refitted(optimizer_id):
+    grads = random_grads(2)
+    grads[0][0, 0] = float('inf')
+    p, optimizer = run(optimizer_id, grads[:1], projection_rank=4, projection_interval=100, skip_non_finite=True)
+    state = optimizer.state[p]
+    assert (state['projector'] == 0).all()
+
+    # The next step reads the verdict first and refits
+    p.grad = grads[1]
+    optimizer.step()
+    assert state['projection_step'] == 2
+    assert state['projector'].abs().sum() > 0
+    assert p.isfinite().all()
+
+
+@pytest.mark.parametrize('optimizer_id', OPTIMIZERS)
+def test_skipped_refresh_step_does_not_sync(optimizer_id, monkeypatch):
+    optimizer_cls, defaults = OPTIMIZERS[optimizer_id]
+    generator = torch.Generator().manual_seed(0)
+    params = [torch.nn.Parameter(torch.randn(SHAPE, generator=generator)) for _ in range(4)]
+    optimizer = optimizer_cls(params, lr=1e-2, projection_rank=4, projection_interval=2, skip_non_finite=True,
+                              **defaults)
+
+    item = torch.Tensor.item
+    calls = []
+
+    def counting_item(self):
+        calls.append(self)
+        return item(self)
+
+    for step in range(1, 5):
+        for p in params:
+            p.grad = torch.randn(SHAPE, generator=generator)
+        if step == 2:
+            params[0].grad[0, 0] = float('nan')
+            monkeypatch.setattr(torch.Tensor, 'item', counting_item)
+        optimizer.step()
+        if step == 3:
+            monkeypatch.undo()
+
+    # Steps 2 and 3 each refit half of the params (staggered), the skipped one included
+    assert calls == []
+    assert [optimizer.state[p]['projection_step'] for p in params] == [4, 3, 4, 3]
@@ -0,0 +1,57 @@
+"""ShardedOptimizer on two gloo CPU ranks, against an unsharded optimizer."""
+
+import pytest
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from ..optimizer_registry import create_optimizer
+from ..optimizer_sharding import ShardedOptimizer
+
+WORLD_SIZE = 2
+STEPS = 3
+
+
+def train(shapes, make_optimizer):
+    r"""Params of shapes after STEPS steps on seeded gradients (identical on every rank), and the optimizer."""
+    generator = torch.Generator().manual_seed(0)
+    params = [torch.nn.Parameter(torch.randn(shape, generator=generator)) for shape in shapes]
+    optimizer = make_optimizer(params)
+    for _ in range(STEPS):
+        for p in params:
+            p.grad = torch.randn(p.shape, generator=generator)
+        optimizer.step()
+    return params, optimizer
+
+
+def worker(rank, init_file):
+    dist.init_process_group('gloo', init_method=f"file://{init_file}", rank=rank, world_size=WORLD_SIZE)
+    try:
+        shapes = [(8, 4), (4,), (16, 2), (2,), (3, 3)]
+        params, optimizer = train(shapes, lambda params: ShardedOptimizer(params, 'AdaBelief', lr=1e-2))
+        reference, _ = train(shapes, lambda params: create_optimizer('AdaBelief', params, lr=1e-2))
+        for p, p_reference in zip(params, reference):
+            torch.testing.assert_close(p, p_reference, rtol=0, atol=0)
+
+        owned = {p for p in params if optimizer.owners[p] == rank}
+        assert 0 < len(owned) < len(params)
+        assert set(optimizer.state) == owned
+
+        state_dict = optimizer.state_dict()
+        optimizer.load_state_dict(state_dict)
+        state_dict['shard'] = {'rank': rank, 'world_size': WORLD_SIZE + 1}
+        with pytest.raises(ValueError, match='world_size'):
+            optimizer.load_state_dict(state_dict)
+
+        # More ranks than params: one rank's wrapped optimizer gets only empty groups
+        params, optimizer = train([(4, 4)], lambda params: ShardedOptimizer(params, 'AdaBelief', lr=1e-2))
+        reference, _ = train([(4, 4)], lambda params: create_optimizer('AdaBelief', params, lr=1e-2))
+        torch.testing.assert_close(params[0], reference[0], rtol=0, atol=0)
+        assert len(optimizer.state) == (1 if optimizer.owners[params[0]] == rank else 0)
+    finally:
+        dist.destroy_process_group()
+
+
+@pytest.mark.skipif(not dist.is_available(), reason="torch.distributed is not available")
+def test_sharded_matches_unsharded(tmp_path):
+    mp.spawn(worker, args=(str(tmp_path / 'init'),), nprocs=WORLD_SIZE)
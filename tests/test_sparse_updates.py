@@ -0,0 +1,92 @@
+"""Lazy sparse-row updates against the dense path with zero gradients for the skipped rows.
+
+The lazy path doesn't move the params of skipped rows along their decaying momentum, and CAME and OCGOpt only factor
+or orthogonalize the touched sub-matrix, so the comparisons are limited to what both paths define the same way.
+"""
+
+import torch
+
+from ..ref_opt_adabelief import AdaBelief
+from ..ref_opt_came import CAME
+from ..ref_opt_ocgopt import OCGOpt
+
+NUM_ROWS, DIM = 6, 4
+TOUCHED = torch.tensor([0, 1, 2])
+SKIPPED = torch.tensor([3, 4, 5])
+ALL_ROWS = torch.arange(NUM_ROWS)
+
+
+def run(optimizer_cls, schedule, sparse: bool, **kwargs):
+    r"""Train a (NUM_ROWS, DIM) embedding, feeding rows listed in `schedule` gradients and the others zero.
+
+    Each step of the schedule is (rows, zero_rows): rows get random gradients, zero_rows are touched with zeros.
+    """
+    generator = torch.Generator().manual_seed(0)
+    p = torch.nn.Parameter(torch.randn(NUM_ROWS, DIM, generator=generator))
+    optimizer = optimizer_cls([p], **kwargs)
+    for rows, zero_rows in schedule:
+        values = torch.zeros(NUM_ROWS, DIM)
+        values[rows] = torch.randn(len(rows), DIM, generator=generator)
+        if sparse:
+            touched = torch.cat([rows, zero_rows]).sort().values
+            p.grad = torch.sparse_coo_tensor(touched[None], values[touched], (NUM_ROWS, DIM), check_invariants=True)
+        else:
+            p.grad = values
+        optimizer.step()
+    return p.detach(), optimizer.state[p]
+
+
+def test_adabelief_lazy_matches_dense():
+    # Without momentum the dense path leaves zero-gradient rows alone too, apart from weight decay
+    schedule = [(ALL_ROWS, SKIPPED[:0])] + [(TOUCHED, SKIPPED[:0])] * 3 + [(TOUCHED, SKIPPED)]
+    kwargs = {'lr': 1e-2, 'betas': (0.0, 0.999), 'weight_decay': 0.1}
+    p_lazy, lazy = run(AdaBelief, schedule, sparse=True, **kwargs)
+    p_dense, dense = run(AdaBelief, schedule, sparse=False, **kwargs)
+
+    torch.testing.assert_close(p_lazy, p_dense)
+    torch.testing.assert_close(lazy['exp_avg_var'], dense['exp_avg_var'])
+
+
+def test_adabelief_lazy_moments_match_dense():
+    schedule = [(ALL_ROWS, SKIPPED[:0])] + [(TOUCHED, SKIPPED[:0])] * 3 + [(TOUCHED, SKIPPED)]
+    kwargs = {'lr': 1e-2, 'betas': (0.9, 0.999)}
+    _, lazy = run(AdaBelief, schedule, sparse=True, **kwargs)
+    _, dense = run(AdaBelief, schedule, sparse=False, **kwargs)
+
+    for key in ('exp_avg', 'exp_avg_var'):
+        torch.testing.assert_close(lazy[key], dense[key])
+
+
+def test_came_lazy_row_statistics_match_dense():
+    # Row statistics of zero-gradient rows don't depend on the column statistics, so the closed-form catch-up of the
+    # skipped rows must land where the dense path's zero-gradient steps do. A large eps2 and a fast beta3 make eps2's
+    # share visible.
+    schedule = [(ALL_ROWS, SKIPPED[:0])] + [(TOUCHED, SKIPPED[:0])] * 3 + [(TOUCHED, SKIPPED)]
+    kwargs = {'lr': 1e-2, 'betas': (0.9, 0.999, 0.9), 'eps2': 1e-2, 'weight_decay': 0.1}
+    _, lazy = run(CAME, schedule, sparse=True, **kwargs)
+    _, dense = run(CAME, schedule, sparse=False, **kwargs)
+
+    for key in ('exp_avg', 'exp_avg_sq_row', 'exp_avg_res_row'):
+        torch.testing.assert_close(lazy[key][SKIPPED], dense[key][SKIPPED])
+
+
+def test_came_one_dim_update_leaves_momentum_alone():
+    p = torch.nn.Parameter(torch.randn(DIM))
+    optimizer = CAME([p], lr=0.5)
+    p.grad = torch.randn(DIM)
+    optimizer.step()
+
+    beta1 = optimizer.param_groups[0]['betas'][0]
+    exp_avg = optimizer.state[p]['exp_avg']
+    # The first update is the clipped gradient scaled by the rsqrt of its square, i.e. about sign(grad)
+    assert torch.all(exp_avg.abs() > 0.5 * (1.0 - beta1))
+
+
+def test_ocgopt_lazy_weight_decay_matches_dense():
+    # Rows that never see a gradient keep zero momenta, so the dense path only decays them
+    schedule = [(TOUCHED, SKIPPED[:0])] * 4 + [(TOUCHED, SKIPPED)]
+    kwargs = {'lr': 1e-2, 'weight_decay': 0.5, 'weight_decay_rate': 1.0, 'spectral_clip_compile': False}
+    p_lazy, _ = run(OCGOpt, schedule, sparse=True, **kwargs)
+    p_dense, _ = run(OCGOpt, schedule, sparse=False, **kwargs)
+
+    torch.testing.assert_close(p_lazy[SKIPPED], p_dense[SKIPPED])
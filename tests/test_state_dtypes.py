@@ -0,0 +1,109 @@
+"""State dtype policies (state_dtypes): packing helpers, allocation and the memory estimate."""
+
+import pytest
+import torch
+
+from .. import ref_opt_adabelief, ref_opt_came, ref_opt_ocgopt
+from ..optimizer_memory import measure_state_bytes, state_bytes_by_key
+from ..utils import pack_state_, unpack_state
+
+OPTIMIZERS = {
+    'AdaBelief': (ref_opt_adabelief.AdaBelief, ref_opt_adabelief.STATE_DTYPE_KEYS),
+    'CAME': (ref_opt_came.CAME, ref_opt_came.STATE_DTYPE_KEYS),
+    'OCGOpt': (ref_opt_ocgopt.OCGOpt, ref_opt_ocgopt.STATE_DTYPE_KEYS),
+}
+KWARGS = {'OCGOpt': {'spectral_clip_compile': False}}
+SHAPES = [(8, 6), (6,)]
+
+
+def run(optimizer_id, steps=3, **kwargs):
+    r"""Train an (8, 6) weight and a (6,) bias on random gradients, returning the params and the optimizer."""
+    optimizer_cls, _ = OPTIMIZERS[optimizer_id]
+    generator = torch.Generator().manual_seed(0)
+    params = [torch.nn.Parameter(torch.randn(shape, generator=generator)) for shape in SHAPES]
+    optimizer = optimizer_cls(params, lr=1e-2, **KWARGS.get(optimizer_id, {}), **kwargs)
+    for _ in range(steps):
+        for p in params:
+            p.grad = torch.randn(p.shape, generator=generator)
+        optimizer.step()
+    return params, optimizer
+
+
+def test_unpack_state_returns_matching_dtype_as_is():
+    value = torch.randn(4)
+    assert unpack_state(value, torch.float32) is value
+    assert unpack_state(value.bfloat16(), torch.float32).dtype == torch.float32
+
+
+def test_pack_state_round_trips_representable_values():
+    target = torch.randn(64).bfloat16()
+    source = unpack_state(target, torch.float32)
+    pack_state_(target, source * 2, generator=torch.Generator().manual_seed(0))
+    torch.testing.assert_close(target, (source * 2).bfloat16(), rtol=0, atol=0)
+
+
+def test_pack_state_rounds_to_a_neighbor_without_bias():
+    source = torch.full((100_000,), 1.0 + 2**-10)
+    target = torch.empty(source.shape, dtype=torch.bfloat16)
+    pack_state_(target, source, generator=torch.Generator().manual_seed(0))
+
+    # 1 + 2^-10 lies an eighth of the way from 1 to the next bfloat16, 1 + 2^-7
+    assert set(target.float().unique().tolist()) == {1.0, 1.0 + 2**-7}
+    assert target.float().mean().item() == pytest.approx(1.0 + 2**-10, abs=2e-5)
+
+    pack_state_(target, source, stochastic=False)
+    assert (target == 1.0).all()
+
+
+@pytest.mark.parametrize('optimizer_id', OPTIMIZERS)
+def test_fp32_policy_matches_no_policy(optimizer_id):
+    _, keys = OPTIMIZERS[optimizer_id]
+    params, optimizer = run(optimizer_id)
+    params_fp32, optimizer_fp32 = run(optimizer_id, state_dtypes={key: 'fp32' for key in keys})
+
+    for p, p_fp32 in zip(params, params_fp32):
+        torch.testing.assert_close(p, p_fp32, rtol=0, atol=0)
+        state, state_fp32 = optimizer.state[p], optimizer_fp32.state[p_fp32]
+        assert state.keys() == state_fp32.keys()
+        for key, value in state.items():
+            if isinstance(value, torch.Tensor):
+                torch.testing.assert_close(value, state_fp32[key], rtol=0, atol=0)
+
+
+@pytest.mark.parametrize('optimizer_id', OPTIMIZERS)
+def test_bf16_policy_allocates_and_estimates_bf16_state(optimizer_id):
+    _, keys = OPTIMIZERS[optimizer_id]
+    state_dtypes = {key: 'bf16' for key in keys}
+    params, optimizer = run(optimizer_id, state_dtypes=state_dtypes)
+
+    for p in params:
+        for key, value in optimizer.state[p].items():
+            if key in state_dtypes:
+                assert value.dtype == torch.bfloat16, key
+        assert p.isfinite().all()
+
+    measured = measure_state_bytes(optimizer)
+    estimated = state_bytes_by_key(optimizer_id, {'state_dtypes': state_dtypes}, SHAPES)
+    assert {key: measured[key] for key in estimated} == estimated
+
+
+def test_ocgopt_fp32_state_of_bf16_params_is_kept_in_fp32():
+    # The momenta only depend on the gradients, so with bf16-representable gradients an fp32 run is the reference
+    generator = torch.Generator().manual_seed(0)
+    init = [torch.randn(shape, generator=generator).bfloat16() for shape in SHAPES]
+    grads = [[torch.randn(shape, generator=generator).bfloat16() for shape in SHAPES] for _ in range(3)]
+    state_dtypes = {key: 'fp32' for key in OPTIMIZERS['OCGOpt'][1]}
+
+    def momenta(dtype, **kwargs):
+        params = [torch.nn.Parameter(value.to(dtype)) for value in init]
+        optimizer = ref_opt_ocgopt.OCGOpt(params, lr=1e-2, spectral_clip_compile=False, **kwargs)
+        for step_grads in grads:
+            for p, grad in zip(params, step_grads):
+                p.grad = grad.to(dtype)
+            optimizer.step()
+        return [optimizer.state[p][key] for p in params for key in ('value_momentum', 'centralized_momentum')]
+
+    reference = momenta(torch.float32)
+    for value, expected in zip(momenta(torch.bfloat16, stochastic_fp=False, state_dtypes=state_dtypes), reference):
+        assert value.dtype == torch.float32
+        torch.testing.assert_close(value, expected, rtol=1e-6, atol=1e-7)
@@ -0,0 +1,60 @@
+"""SweepOptimizer's batched steps against K separate optimizers from create_optimizer."""
+
+import pytest
+import torch
+
+from ..optimizer_registry import create_optimizer
+from ..optimizer_sweep import SweepOptimizer
+
+SHAPES = {'weight': (6, 4), 'bias': (4,), 'conv': (3, 2, 2)}
+STEPS = 5
+
+# Per optimizer: options shared by every replica, and the per-replica configs
+SWEEPS = {
+    'AdaBelief': ({'lr': 1e-2}, [
+        {},
+        {'lr': 3e-2, 'betas': (0.8, 0.99)},
+        {'cautious': True, 'weight_decay': 0.1},
+        {'rectify': True, 'eps': 1e-8},
+    ]),
+    'CAME': ({'lr': 1e-2}, [
+        {},
+        {'update_strategy': 'grams'},
+        {'update_strategy': 'cautious', 'weight_decay': 0.1},
+        {'cautious': True, 'betas': (0.8, 0.99, 0.999), 'clip_threshold': 0.5},
+    ]),
+    'OCGOpt': ({'lr': 1e-2, 'spectral_clip_compile': False}, [
+        {},
+        {'betas': (0.9, 0.999, 0.999)},
+        {'cautious_min': 0.5, 'centralization': 0.5},
+        {'weight_decay': 0.1, 'adaptive_min': 0.5},
+    ]),
+}
+
+
+@pytest.mark.parametrize('optimizer_id', SWEEPS)
+def test_sweep_matches_separate_optimizers(optimizer_id):
+    shared, configs = SWEEPS[optimizer_id]
+    generator = torch.Generator().manual_seed(0)
+    init = {name: torch.randn(shape, generator=generator) for name, shape in SHAPES.items()}
+
+    named = [(name, torch.nn.Parameter(value.clone())) for name, value in init.items()]
+    sweep = SweepOptimizer(named, optimizer_id, configs, **shared)
+    separate = []
+    for config in configs:
+        params = [torch.nn.Parameter(value.clone()) for value in init.values()]
+        separate.append((params, create_optimizer(optimizer_id, params, **{**shared, **config})))
+
+    for _ in range(STEPS):
+        grads = [torch.randn(len(configs), *shape, generator=generator) for shape in SHAPES.values()]
+        for replica, grad in zip(sweep.replicas, grads):
+            replica.grad = grad.clone()
+        sweep.step()
+        for k, (params, optimizer) in enumerate(separate):
+            for p, grad in zip(params, grads):
+                p.grad = grad[k].clone()
+            optimizer.step()
+
+    for k, (params, _) in enumerate(separate):
+        for name, replica, p in zip(sweep.names, sweep.replicas, params):
+            torch.testing.assert_close(replica[k].detach(), p.detach(), rtol=1e-5, atol=1e-6, msg=f"{k} {name}")
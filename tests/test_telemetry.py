@@ -0,0 +1,85 @@
+"""OptimizerTelemetry: recorded statistics reach the log, which can be tailed while it grows."""
+
+import math
+
+import pytest
+import torch
+
+from ..optimizer_telemetry import OptimizerTelemetry, read_telemetry
+from ..ref_opt_adabelief import AdaBelief
+
+NAMES = ['weight', 'bias']
+SHAPES = [(8, 4), (4,)]
+STEPS, INTERVAL, FLUSH_EVERY = 8, 2, 2
+
+
+def rms(tensor):
+    return tensor.double().pow(2).mean().sqrt().item()
+
+
+def run(path=None, on_step=None):
+    r"""Train with AdaBelief, returning the params and the update and gradient RMS of every step."""
+    generator = torch.Generator().manual_seed(0)
+    params = [torch.nn.Parameter(torch.randn(shape, generator=generator)) for shape in SHAPES]
+    optimizer = AdaBelief(params, lr=1e-2)
+    telemetry = None
+    if path is not None:
+        telemetry = OptimizerTelemetry(str(path), names=NAMES, flush_every=FLUSH_EVERY, interval=INTERVAL)
+        telemetry.attach(optimizer)
+
+    stats = {}
+    for step in range(1, STEPS + 1):
+        before = [p.detach().clone() for p in params]
+        for p in params:
+            p.grad = torch.randn(p.shape, generator=generator)
+        optimizer.step()
+        stats[step] = {
+            name: {'update_rms': rms(p_before - p.detach()), 'grad_rms': rms(p.grad)}
+            for name, p, p_before in zip(NAMES, params, before)
+        }
+        if on_step is not None:
+            on_step(step)
+    if telemetry is not None:
+        telemetry.close()
+    return params, stats
+
+
+def test_log_holds_the_sampled_steps(tmp_path):
+    path = tmp_path / 'telemetry.bin'
+    params, stats = run(path)
+
+    header, records, _ = read_telemetry(str(path))
+    assert header['names'] == NAMES
+    assert [step for step, _ in records] == list(range(INTERVAL, STEPS + 1, INTERVAL))
+    for step, values in records:
+        for name in NAMES:
+            for metric, expected in stats[step][name].items():
+                assert values[name][metric] == pytest.approx(expected, rel=1e-4)
+            # AdaBelief doesn't clip
+            assert math.isnan(values[name]['clip_factor'])
+
+    # Recording doesn't change the updates
+    for p, p_plain in zip(params, run()[0]):
+        torch.testing.assert_close(p, p_plain, rtol=0, atol=0)
+
+
+def test_log_can_be_tailed(tmp_path):
+    path = tmp_path / 'telemetry.bin'
+    tailed = []
+    offset = 0
+
+    def on_step(step):
+        nonlocal offset
+        _, records, offset = read_telemetry(str(path), offset)
+        tailed.extend(step for step, _ in records)
+
+    run(path, on_step)
+    _, records, _ = read_telemetry(str(path), offset)
+    tailed.extend(step for step, _ in records)
+    assert tailed == list(range(INTERVAL, STEPS + 1, INTERVAL))
+
+
+def test_names_must_match_the_params(tmp_path):
+    optimizer = AdaBelief([torch.nn.Parameter(torch.zeros(2))])
+    with pytest.raises(ValueError, match='names'):
+        OptimizerTelemetry(str(tmp_path / 'telemetry.bin'), names=NAMES).attach(optimizer)
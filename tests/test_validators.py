@@ -0,0 +1,38 @@
+"""The generated validators against the constructors they build kwargs for."""
+
+import json
+from pathlib import Path
+
+import pytest
+import torch
+
+from ..optimizer_registry import _REGISTRY, available
+from ..optimizer_validators import create_validated_optimizer, validate_optimizer_args
+
+SCHEMA_DIR = Path(__file__).resolve().parents[1] / 'web' / 'public' / 'optimizers'
+
+
+def schema(optimizer_id):
+    return json.loads((SCHEMA_DIR / f"{optimizer_id}.json").read_text())
+
+
+@pytest.mark.parametrize('optimizer_id', available())
+def test_schema_defaults_build_the_optimizer(optimizer_id):
+    module = _REGISTRY[optimizer_id][0]
+    if not module.startswith('.'):
+        pytest.importorskip(module.split('.')[0])
+
+    args = {arg['name']: arg['default'] for arg in schema(optimizer_id)['args']}
+    p = torch.nn.Parameter(torch.randn(4, 3))
+    optimizer = create_validated_optimizer(optimizer_id, [p], args)
+
+    p.grad = torch.randn(4, 3)
+    optimizer.step()
+    assert p.isfinite().all()
+
+
+def test_epsilon_is_passed_as_eps():
+    kwargs = validate_optimizer_args('AdamW', {'epsilon': 1e-6, 'beta2': 0.99})
+    assert kwargs == {'eps': 1e-6, 'betas': (0.9, 0.99)}
+    optimizer = create_validated_optimizer('AdamW', [torch.nn.Parameter(torch.zeros(2))], {'epsilon': 1e-6})
+    assert optimizer.defaults['eps'] == 1e-6
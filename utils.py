@@ -0,0 +1,658 @@
+import heapq
+import math
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Literal
+
+import torch
+
+UPDATE_STRATEGY = Literal['unmodified', 'cautious', 'grams']
+
+
+def copy_stochastic_(target: torch.Tensor, source: torch.Tensor, generator: torch.Generator = None):
+    # thanks to Nerogar for fast stochastic pytorch implementation
+    # https://github.com/pytorch/pytorch/issues/120376#issuecomment-1974828905
+    with torch.no_grad():
+        # create a random 16 bit integer
+        if generator is None:
+            result = torch.randint_like(
+                source,
+                dtype=torch.int32,
+                low=0,
+                high=(1 << 16),
+            )
+        else:
+            result = torch.randint(
+                0, 1 << 16, source.shape, generator=generator, dtype=torch.int32, device=source.device
+            )
+
+        # add the random number to the lower 16 bit of the mantissa
+        result.add_(source.view(dtype=torch.int32))
+
+        # mask off the lower 16 bit of the mantissa
+        result.bitwise_and_(-65536)  # -65536 = FFFF0000 as a signed int32
+
+        # copy the higher 16 bit into the target tensor
+        target.copy_(result.view(dtype=torch.float32))
+
+
+# How the fp32 result of an update is written back into a 16-bit param
+BF16_MODES = ('stochastic', 'kahan')
+
+
+def copy_kahan_(target: torch.Tensor, source: torch.Tensor, compensation: torch.Tensor):
+    r"""Round source into the 16-bit target with Kahan-compensated summation.
+
+    compensation (same dtype as target) carries the rounding error of earlier writes and is added back before
+    rounding, so updates smaller than half an ulp of the param accumulate instead of being lost, without random
+    numbers or an fp32 master copy. source must have been computed from target's current value.
+    """
+    with torch.no_grad():
+        exact = source + compensation
+        target.copy_(exact)
+        compensation.copy_(exact.sub_(target))
+
+
+def write_param_(p: torch.Tensor, source: torch.Tensor, state, bf16_mode: str, generator: torch.Generator = None,
+                 rows: torch.Tensor = None):
+    r"""Write the fp32 result of an update back into a 16-bit param, rounded as selected by bf16_mode.
+
+    'kahan' keeps the rounding error in ``state['kahan_comp']``, allocated on first use. With rows, source holds only
+    those rows of a row-sparse update, and params of other dtypes are copied as is.
+    """
+    if bf16_mode != 'kahan' or p.dtype not in {torch.float16, torch.bfloat16}:
+        if rows is None:
+            copy_stochastic_(p, source, generator=generator)
+        else:
+            index_copy_rows_(p, rows, source, generator)
+        return
+
+    if 'kahan_comp' not in state:
+        state['kahan_comp'] = torch.zeros_like(p)
+    compensation = state['kahan_comp']
+    if rows is None:
+        copy_kahan_(p, source, compensation)
+        return
+
+    compensation_rows = compensation.index_select(0, rows)
+    p_rows = torch.empty_like(compensation_rows)
+    copy_kahan_(p_rows, source, compensation_rows)
+    p.index_copy_(0, rows, p_rows)
+    compensation.index_copy_(0, rows, compensation_rows)
+
+
+# Dtypes a state dtype policy may assign, by name and short alias
+STATE_DTYPES = {
+    'float32': torch.float32, 'fp32': torch.float32,
+    'bfloat16': torch.bfloat16, 'bf16': torch.bfloat16,
+    'float16': torch.float16, 'fp16': torch.float16,
+}
+
+
+def parse_state_dtypes(state_dtypes, keys):
+    r"""Normalize a state dtype policy, {state key: dtype}, to torch dtypes.
+
+    Dtypes may be torch dtypes or names ('bfloat16', 'bf16', 'torch.bfloat16'). keys are the state tensors the
+    optimizer lets a policy override, anything else is rejected.
+    """
+    if not state_dtypes:
+        return {}
+
+    policy = {}
+    for key, dtype in state_dtypes.items():
+        if key not in keys:
+            raise ValueError("Invalid state dtype key: {} (one of {})".format(key, ', '.join(keys)))
+        if not isinstance(dtype, torch.dtype):
+            dtype = STATE_DTYPES.get(str(dtype).split('.')[-1])
+        if dtype not in STATE_DTYPES.values():
+            raise ValueError("Invalid state dtype for {}: {}".format(key, state_dtypes[key]))
+        policy[key] = dtype
+    return policy
+
+
+def state_dtype(group, key: str, default: torch.dtype) -> torch.dtype:
+    r"""Dtype state tensor `key` is stored in under the group's state dtype policy, default if it doesn't set one."""
+    policy = group.get('state_dtypes')
+    dtype = policy.get(key) if policy else None
+    if dtype is None:
+        return default
+    # Param groups added later may spell the dtype by name
+    return dtype if isinstance(dtype, torch.dtype) else STATE_DTYPES[str(dtype).split('.')[-1]]
+
+
+def zeros_state(group, key: str, p: torch.Tensor, shape=None, default: torch.dtype = None) -> torch.Tensor:
+    r"""Zero-initialized state tensor `key` for p, shaped like p unless shape is given, in the dtype of the policy.
+
+    default is the dtype without a policy entry, the param's own dtype if None.
+    """
+    dtype = state_dtype(group, key, p.dtype if default is None else default)
+    return torch.zeros(p.shape if shape is None else shape, dtype=dtype, device=p.device)
+
+
+def unpack_state(value: torch.Tensor, dtype: torch.dtype) -> torch.Tensor:
+    r"""State tensor in the dtype the update is computed in.
+
+    Returns value itself when it already has that dtype, so in-place ops update the state directly and pack_state_ has
+    nothing to write back.
+    """
+    return value if value.dtype == dtype else value.to(dtype)
+
+
+def pack_state_(target: torch.Tensor, source: torch.Tensor, generator: torch.Generator = None,
+                stochastic: bool = True):
+    r"""Write an unpacked state tensor back into its storage, with stochastic rounding for fp32 into 16-bit."""
+    if source is target:
+        return
+    if stochastic and target.dtype in {torch.float16, torch.bfloat16} and source.dtype == torch.float32:
+        copy_stochastic_(target, source, generator=generator)
+    else:
+        target.copy_(source)
+
+
+class FlatGroupState:
+    r"""Flat state buffers of a single param group, see FlatStateBuffers."""
+
+    def __init__(self, keys):
+        self.keys = tuple(keys)
+        self._buffers = {key: [] for key in keys}
+        self._views = {key: {} for key in keys}
+
+    def view(self, key: str, p: torch.Tensor) -> torch.Tensor:
+        r"""View of the flat buffer holding `key` for parameter `p`."""
+        return self._views[key][p]
+
+    def buffers(self, key: str):
+        r"""All flat buffers for `key`, one per (dtype, device)."""
+        return self._buffers[key]
+
+
+class FlatStateBuffers:
+    r"""Contiguous storage for per-parameter optimizer state.
+
+    Every (state key, dtype, device) of a param group gets one zero-initialized flat buffer covering all of the
+    group's parameters, and each parameter's state tensor is a view into it. This avoids fragmenting the allocator
+    with many small tensors, lets elementwise phases run as a single op over a whole buffer, and makes a saved
+    state_dict a handful of large storages.
+
+    State that already exists (e.g. after load_state_dict) is copied into the buffers the first time a group is
+    prepared.
+    """
+
+    def __init__(self):
+        self._groups = {}
+
+    def prepare(self, state, group, keys, dtype_of=None) -> FlatGroupState:
+        r"""Flat buffers for `keys` of a param group.
+
+        dtype_of(key, p) picks the dtype of p's state, by default the group's state dtype policy or else p's dtype.
+        """
+        keys = tuple(keys)
+        flat = self._groups.get(id(group))
+        if flat is None or flat.keys != keys or not self._is_current(state, group, flat):
+            flat = self._build(state, group, keys, dtype_of or (lambda key, p: state_dtype(group, key, p.dtype)))
+            self._groups[id(group)] = flat
+        return flat
+
+    @staticmethod
+    def _is_current(state, group, flat: FlatGroupState) -> bool:
+        # State replaced behind our back (load_state_dict, reset) no longer shares storage with the buffers
+        for key in flat.keys:
+            views = flat._views[key]
+            for p in group['params']:
+                if p not in views:
+                    return False
+                value = state[p].get(key) if p in state else None
+                if value is not None and value.data_ptr() != views[p].data_ptr():
+                    return False
+        return True
+
+    @staticmethod
+    def _build(state, group, keys, dtype_of) -> FlatGroupState:
+        flat = FlatGroupState(keys)
+        for key in keys:
+            buckets = {}
+            for p in group['params']:
+                buckets.setdefault((dtype_of(key, p), p.device), []).append(p)
+
+            for (dtype, device), params in buckets.items():
+                buffer = torch.zeros(sum(p.numel() for p in params), dtype=dtype, device=device)
+                flat._buffers[key].append(buffer)
+
+                offset = 0
+                for p in params:
+                    view = buffer[offset:offset + p.numel()].view_as(p)
+                    offset += p.numel()
+                    flat._views[key][p] = view
+
+                    if p in state and key in state[p]:
+                        view.copy_(state[p][key])
+                        state[p][key] = view
+        return flat
+
+
+# num_workers -> pool, shared by every optimizer instance stepping with that many workers
+_STEP_POOLS = {}
+
+
+def partition_by_cost(items, costs, num_chunks: int):
+    r"""Split items into at most num_chunks lists of roughly equal total cost.
+
+    Greedy longest-processing-time assignment: the most expensive item goes to the least loaded chunk. Ties are broken
+    by position, so the split only depends on the costs, and each chunk keeps the original item order.
+    """
+    loads = [(0, chunk) for chunk in range(num_chunks)]
+    assigned = [[] for _ in range(num_chunks)]
+    for index in sorted(range(len(items)), key=lambda i: (-costs[i], i)):
+        load, chunk = heapq.heappop(loads)
+        assigned[chunk].append(index)
+        heapq.heappush(loads, (load + costs[index], chunk))
+    return [[items[i] for i in sorted(indices)] for indices in assigned if indices]
+
+
+def parallel_param_update(update, params, num_workers: int = 1, cost=None):
+    r"""Call update(p, generator) for every param, on a thread pool when num_workers > 1.
+
+    Params are split into num_workers chunks of roughly equal cost (numel unless a cost function is given), and every
+    chunk runs on its own thread. Most torch kernels release the GIL, so the chunks overlap; intra-op threads are
+    divided between the workers so the two levels of parallelism don't oversubscribe the cores. The intra-op thread
+    count is process-wide with torch's native thread pool, so it is lowered once for the whole call and restored when it
+    returns or raises; torch work on other threads meanwhile (e.g. a checkpoint writer) runs with the lowered count too.
+
+    Updates must only touch their own param and state. Stochastic rounding gets a generator per param, seeded from a
+    single draw of the global RNG, so results depend neither on how the threads are scheduled nor on num_workers.
+    """
+    # Only draw when something is rounded, so fp32 training leaves the global RNG alone
+    seed = None
+    if any(p.dtype in {torch.float16, torch.bfloat16} for p in params):
+        seed = int(torch.randint(0, 1 << 62, (1,)).item())
+
+    def generator(index, p):
+        if seed is None or p.dtype not in {torch.float16, torch.bfloat16}:
+            return None
+        return torch.Generator(device=p.device).manual_seed(seed + index)
+
+    if num_workers <= 1 or len(params) < 2:
+        for index, p in enumerate(params):
+            update(p, generator(index, p))
+        return
+
+    costs = [cost(p) if cost is not None else p.numel() for p in params]
+    chunks = partition_by_cost(list(enumerate(params)), costs, num_workers)
+
+    total_threads = torch.get_num_threads()
+    intra_op_threads = max(1, total_threads // len(chunks))
+
+    # Grad mode is thread-local, so carry the caller's (no_grad inside step) over to the workers
+    grad_enabled = torch.is_grad_enabled()
+
+    def run(chunk):
+        # With OpenMP the count is kept per thread, so a worker that doesn't see the caller's sets its own
+        if torch.get_num_threads() != intra_op_threads:
+            torch.set_num_threads(intra_op_threads)
+        with torch.set_grad_enabled(grad_enabled):
+            for index, p in chunk:
+                update(p, generator(index, p))
+
+    pool = _STEP_POOLS.get(num_workers)
+    if pool is None:
+        pool = _STEP_POOLS[num_workers] = ThreadPoolExecutor(num_workers, thread_name_prefix='optimizer-step')
+
+    torch.set_num_threads(intra_op_threads)
+    try:
+        futures = [pool.submit(run, chunk) for chunk in chunks]
+        wait(futures)
+        for future in futures:
+            future.result()
+    finally:
+        torch.set_num_threads(total_threads)
+
+
+def rms(x: torch.Tensor) -> torch.Tensor:
+    r"""Root mean square as a 0-dim tensor, so it can be recorded without a device sync."""
+    return x.pow(2).mean().sqrt()
+
+
+def sparse_rows(grad: torch.Tensor):
+    r"""(rows, values) of a gradient that is sparse along its first dim only, as from nn.Embedding(sparse=True).
+
+    Returns None for other sparse layouts.
+    """
+    grad = grad.coalesce()
+    if grad.sparse_dim() != 1:
+        return None
+    return grad.indices()[0], grad.values()
+
+
+def lazy_skipped_steps(state, p: torch.Tensor, rows: torch.Tensor, step: int) -> torch.Tensor:
+    r"""Number of steps each touched row was skipped for, marking the rows as updated at `step`.
+
+    Rows start out as last updated the step before their first sparse update, so a param that switches from dense to
+    sparse gradients doesn't catch up on steps it already took.
+    """
+    if 'last_step' not in state:
+        state['last_step'] = torch.full((p.shape[0],), step - 1, dtype=torch.int64, device=p.device)
+    last_step = state['last_step']
+    skipped = (step - 1 - last_step[rows]).to(torch.float32)
+    last_step[rows] = step
+    return skipped
+
+
+def lazy_ema_weights(beta1: float, beta2: float, skipped: torch.Tensor):
+    r"""Closed-form catch-up of rows that saw `skipped` zero-gradient steps.
+
+    Returns (beta1^k, beta2^k, sum_{j=1..k} beta2^(k-j) * beta1^(2j)): the decay of a first moment, the decay of a
+    second moment, and the weight the first moment's square carries in a second moment of (grad - first moment)^2.
+    """
+    decay1 = torch.pow(beta1, skipped)
+    decay2 = torch.pow(beta2, skipped)
+    beta1_sq = beta1 ** 2
+    if math.isclose(beta2, beta1_sq):
+        residual = skipped * decay2
+    else:
+        residual = beta1_sq * (decay2 - decay1.square()) / (beta2 - beta1_sq)
+    return decay1, decay2, residual
+
+
+def expand_rows(x: torch.Tensor, like: torch.Tensor) -> torch.Tensor:
+    r"""View a per-row vector so it broadcasts against `like`'s rows."""
+    return x.view(-1, *([1] * (like.ndim - 1)))
+
+
+def index_copy_rows_(target: torch.Tensor, rows: torch.Tensor, source: torch.Tensor, generator: torch.Generator = None):
+    r"""target[rows] = source, with stochastic rounding for 16-bit targets."""
+    if target.dtype in {torch.float16, torch.bfloat16} and source.dtype == torch.float32:
+        rounded = torch.empty(source.shape, dtype=target.dtype, device=source.device)
+        copy_stochastic_(rounded, source, generator=generator)
+        source = rounded
+    target.index_copy_(0, rows, source.to(target.dtype))
+
+
+def preconditioner_due(state, step: int, offset: int, interval: int, key: str = 'precondition_step') -> int:
+    r"""Steps since a param's cached preconditioner was last refreshed if it is due this step, else 0.
+
+    Params are staggered by their `offset` (position in the group) so refreshes spread evenly over the interval instead
+    of all landing on the same step. A param without a cache is always due. `key` is the state entry holding the step
+    of the last refresh, so a param can have several caches on their own intervals.
+    """
+    last = state.get(key)
+    if last is None or interval <= 1 or (step + offset) % interval == 0:
+        state[key] = step
+        return step - last if last is not None else 1
+    return 0
+
+
+def projects(p: torch.Tensor, group) -> bool:
+    r"""Whether p keeps its state in a rank-`projection_rank` subspace of its gradient (GaLore-style).
+
+    Only matrices whose smaller side exceeds the rank and with at least `projection_min_numel` elements qualify.
+    optimizer_memory.projected_shape applies the same rule to the memory estimate.
+    """
+    rank = group['projection_rank']
+    return rank > 0 and p.ndim == 2 and min(p.shape) > rank and p.numel() >= group['projection_min_numel']
+
+
+def projected_shape(p: torch.Tensor, rank: int):
+    r"""Shape of a projected param's state: the smaller side of the matrix is reduced to the rank."""
+    return (rank, p.shape[1]) if p.shape[0] <= p.shape[1] else (p.shape[0], rank)
+
+
+def range_finder(x: torch.Tensor, rank: int, oversample: int = 8, power_iters: int = 1,
+                 generator: torch.Generator = None) -> torch.Tensor:
+    r"""Orthonormal basis (rows, rank) of the dominant column space of x, by randomized range finding, in fp32.
+
+    A Gaussian sketch of the range with `oversample` extra columns is sharpened by `power_iters` power iterations, and
+    the top singular vectors of x restricted to it are kept (Halko, Martinsson & Tropp, 2011). Costs a few matmuls with
+    x and an SVD of a (rank + oversample, cols) matrix, instead of a full SVD.
+    """
+    x = x.float()
+    sketch_size = min(rank + oversample, *x.shape)
+    device = generator.device if generator is not None else x.device
+    omega = torch.randn(x.shape[1], sketch_size, generator=generator, device=device).to(x.device)
+    basis = torch.linalg.qr(x @ omega).Q
+    for _ in range(power_iters):
+        basis = torch.linalg.qr(x @ torch.linalg.qr(x.T @ basis).Q).Q
+    u, _, _ = torch.linalg.svd(basis.T @ x, full_matrices=False)
+    return basis @ u[:, :rank]
+
+
+def refresh_projector(state, grad: torch.Tensor, rank: int, generator: torch.Generator = None):
+    r"""Fit state['projector'] to the dominant subspace of grad along its smaller side.
+
+    Returns the (rank, rank) change of basis from the previous projector to the new one, for carrying linear states
+    such as momenta over with change_basis, or None for the first projector. Non-finite entries of grad are fitted as
+    zeros, so a step NonFiniteGuard rolls back can't break the SVD.
+    """
+    grad = grad.nan_to_num(nan=0.0, posinf=0.0, neginf=0.0)
+    left = grad.shape[0] <= grad.shape[1]
+    projector = range_finder(grad if left else grad.T, rank, generator=generator)
+    previous = state.get('projector')
+    state['projector'] = projector
+    return projector.T @ previous if previous is not None else None
+
+
+def project(x: torch.Tensor, projector: torch.Tensor) -> torch.Tensor:
+    r"""x in the subspace of projector, (rank, cols) if it projects the rows of x, else (rows, rank)."""
+    projector = projector.to(x.dtype)
+    return projector.T @ x if projector.shape[0] == x.shape[0] else x @ projector
+
+
+def project_back(x: torch.Tensor, projector: torch.Tensor) -> torch.Tensor:
+    r"""Map a projected x back to the full matrix shape."""
+    projector = projector.to(x.dtype)
+    return projector @ x if x.shape[0] == projector.shape[1] else x @ projector.T
+
+
+def change_basis(x: torch.Tensor, rotation: torch.Tensor) -> torch.Tensor:
+    r"""Carry a projected linear state over to a refreshed projector, rotation as returned by refresh_projector."""
+    rotation = rotation.to(x.dtype)
+    return rotation @ x if x.shape[0] == rotation.shape[0] else x @ rotation.T
+
+
+class NonFiniteGuard:
+    r"""Skip optimizer steps whose gradients hold a NaN or Inf, decided on device like AMP's GradScaler.
+
+    check() reduces every gradient of the step to its max-abs with one fused op per device, through which NaN and Inf
+    propagate, and keeps the verdict on the device. guard() wraps a per-param update so that on a bad step the param
+    and its state tensors are put back with torch.where, so the host never waits for the verdict. skipped_steps counts
+    the skipped steps on device; read it (or copy it with non_blocking=True) whenever convenient.
+
+    The snapshots live in scratch buffers kept per worker thread, sized for the largest param and its state. Host-side
+    counters such as group['step'] still advance on a skipped step, and state tensors first created on one are left
+    zeroed. Integer entries of a param's state, the steps its cached preconditioners or projector were last refreshed
+    at, are rolled back one step late: guard() records the ones an update changed, and the next check() (or resolve())
+    reads a host copy of the verdict, copied without blocking when it was made, and puts them back if the step was
+    skipped. A cache first created on a bad step is thereby rebuilt on the next step instead of staying zeroed for a
+    whole interval.
+    """
+
+    def __init__(self):
+        self.skipped_steps = None
+        self._found = {}
+        self._scratch = threading.local()
+        self._pending = []
+        self._verdict = None
+        self._verdict_ready = None
+
+    def check(self, param_groups):
+        self.resolve()
+        grads = {}
+        for group in param_groups:
+            for p in group['params']:
+                if p.grad is not None:
+                    grad = p.grad._values() if p.grad.is_sparse else p.grad
+                    grads.setdefault(grad.device, []).append(grad)
+        if not grads:
+            self._found = {}
+            return
+
+        found = None
+        for device_grads in grads.values():
+            max_abs = torch.stack(torch._foreach_norm(device_grads, math.inf, dtype=torch.float32))
+            device_found = max_abs.isfinite().all().logical_not()
+            found = device_found if found is None else found.logical_or(device_found.to(found.device, non_blocking=True))
+
+        self._found = {device: found.to(device, non_blocking=True) for device in grads}
+        if found.is_cuda:
+            if self._verdict is None or not self._verdict.is_pinned():
+                self._verdict = torch.empty((), dtype=torch.bool, pin_memory=True)
+                self._verdict_ready = torch.cuda.Event()
+            self._verdict.copy_(found, non_blocking=True)
+            self._verdict_ready.record()
+        else:
+            self._verdict, self._verdict_ready = found, None
+        if self.skipped_steps is None:
+            self.skipped_steps = torch.zeros((), dtype=torch.int64, device=found.device)
+        self.skipped_steps.add_(found)
+
+    def resolve(self):
+        r"""Roll back the state counters the last step changed if it was skipped, see the class docstring.
+
+        check() calls it at the start of every step, call it before saving a state_dict right after a step.
+        """
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        if self._verdict_ready is not None:
+            self._verdict_ready.synchronize()
+        if not self._verdict:
+            return
+        for state, old_counters, changed in pending:
+            for key in changed:
+                if key in old_counters:
+                    state[key] = old_counters[key]
+                else:
+                    state.pop(key, None)
+
+    def _snapshot(self, tensors):
+        r"""Copies of tensors, as views into this thread's scratch buffers."""
+        sizes = {}
+        for t in tensors:
+            sizes[(t.dtype, t.device)] = sizes.get((t.dtype, t.device), 0) + t.numel()
+
+        buffers = getattr(self._scratch, 'buffers', None)
+        if buffers is None:
+            buffers = self._scratch.buffers = {}
+        for kind, numel in sizes.items():
+            if kind not in buffers or buffers[kind].numel() < numel:
+                buffers[kind] = torch.empty(numel, dtype=kind[0], device=kind[1])
+
+        offsets = dict.fromkeys(sizes, 0)
+        copies = []
+        for t in tensors:
+            kind = (t.dtype, t.device)
+            copy = buffers[kind][offsets[kind]:offsets[kind] + t.numel()].view_as(t)
+            offsets[kind] += t.numel()
+            copies.append(copy.copy_(t))
+        return copies
+
+    def guard(self, update, states):
+        r"""Wrap update(p, generator) to discard its changes to p and states[p] on device if this step is skipped."""
+
+        def guarded(p, generator=None):
+            found = self._found[(p.grad._values() if p.grad.is_sparse else p.grad).device]
+            state = states[p]
+            keys = [k for k, v in state.items() if isinstance(v, torch.Tensor)]
+            old_p, *old_state = self._snapshot([p.detach()] + [state[k] for k in keys])
+            old_state = dict(zip(keys, old_state))
+            old_counters = {k: v for k, v in state.items() if isinstance(v, int)}
+
+            update(p, generator)
+
+            changed = [k for k, v in state.items() if isinstance(v, int) and old_counters.get(k) != v]
+            if changed:
+                self._pending.append((state, old_counters, changed))
+
+            torch.where(found, old_p, p.detach(), out=p.detach())
+            for key, value in state.items():
+                if isinstance(value, torch.Tensor):
+                    old = old_state.get(key)
+                    if old is None or old.shape != value.shape or old.dtype != value.dtype:
+                        old = torch.zeros((), dtype=value.dtype, device=value.device)
+                    torch.where(found, old, value, out=value)
+
+        return guarded
+
+
+HIBERNATE_TARGETS = ('cpu', 'disk')
+
+
+class StateHibernation:
+    r"""Move the state of params that stopped receiving gradients off the device, and back once they get one again.
+
+    step() runs at the start of an optimizer step. A param that had no gradient for `after` consecutive steps has its
+    state tensors replaced by host copies: pinned memory for 'cpu', or a file in a temp directory that is mapped back
+    with mmap for 'disk', so they only take page cache. The copies stay in the optimizer's state, so state_dict() and
+    checkpoints see them as usual. The first step that finds a gradient on the param again copies its state back to the
+    param's device before the update.
+
+    Only host-side bookkeeping decides this, the device is synced once per param when its state is hibernated. Params
+    of flat_state groups are skipped, their state are views of a shared buffer, and so are CPU params with 'cpu'.
+    """
+
+    def __init__(self, after: int, target: str = 'cpu'):
+        if after < 1:
+            raise ValueError(f"Invalid hibernate_after: {after}")
+        if target not in HIBERNATE_TARGETS:
+            raise ValueError(f"Invalid hibernate target: {target}")
+
+        self.after = after
+        self.target = target
+        self.idle = {}
+        self.hibernated = {}
+        self.wakes = 0
+        self._directory = None
+
+    @property
+    def hibernated_bytes(self) -> int:
+        r"""Bytes of state held off the device right now."""
+        return sum(num_bytes for _, _, num_bytes in self.hibernated.values())
+
+    def step(self, param_groups, states):
+        for group in param_groups:
+            if group.get('flat_state'):
+                continue
+            for p in group['params']:
+                if p.grad is not None:
+                    self.idle.pop(p, None)
+                    if p in self.hibernated:
+                        self._wake(p, states[p])
+                    continue
+
+                idle = self.idle[p] = self.idle.get(p, 0) + 1
+                if idle >= self.after and p not in self.hibernated and p in states:
+                    self._hibernate(p, states[p])
+
+    def _hibernate(self, p: torch.Tensor, state):
+        tensors = {key: value for key, value in state.items() if isinstance(value, torch.Tensor)}
+        if not tensors or (self.target == 'cpu' and p.device.type == 'cpu'):
+            return
+
+        path = None
+        if self.target == 'cpu':
+            pin = torch.cuda.is_available()
+            for key, value in tensors.items():
+                state[key] = torch.empty_like(value, device='cpu', pin_memory=pin).copy_(value)
+        else:
+            if self._directory is None:
+                self._directory = tempfile.mkdtemp(prefix='optimizer-hibernation-')
+                weakref.finalize(self, shutil.rmtree, self._directory, ignore_errors=True)
+            path = os.path.join(self._directory, f'{id(p)}.pt')
+            torch.save({key: value.cpu() for key, value in tensors.items()}, path)
+            state.update(torch.load(path, mmap=True, weights_only=True))
+
+        num_bytes = sum(value.numel() * value.element_size() for value in tensors.values())
+        self.hibernated[p] = (p.device, path, num_bytes)
+
+    def _wake(self, p: torch.Tensor, state):
+        device, path, _ = self.hibernated.pop(p)
+        for key, value in state.items():
+            if isinstance(value, torch.Tensor):
+                # copy=True so CPU params don't keep updating the mapped file
+                state[key] = value.to(device, non_blocking=value.is_pinned(), copy=True)
+        if path is not None:
+            os.remove(path)
+        self.wakes += 1
@@ -3,8 +3,8 @@ import { useStore } from '../lib/store';
 import { Map, MapPinOff, Maximize, ChevronDown, ZoomIn, ZoomOut, Search, MousePointer2, Hand, Check } from 'lucide-react';
 import { AnimatePresence, motion } from 'framer-motion';
 import { CANVAS_BOUNDS } from '../lib/constants';
-import { SEARCH_INDEX } from './NodeRegistry';
-import { SearchItem } from '../lib/search-definitions';
+import { getSearchIndex, SearchItem } from '../lib/search-definitions';
+import { useOptimizerIndex, useOptimizerSchema } from '../hooks/useOptimizerCatalog';
 import { CornerDownRight, X } from 'lucide-react';
 
 interface CanvasControlsProps {
@@ -88,6 +88,12 @@ export const CanvasControls: React.FC<CanvasControlsProps> = ({ onReset }) => {
 
     // [Shiro] Context for Filtering
     const config = useStore((state) => state.config);
+    const optimizerIndex = useOptimizerIndex();
+    const optimizerSchema = useOptimizerSchema(config.optimizerType);
+    const searchIndex = React.useMemo(
+        () => getSearchIndex(optimizerIndex ?? [], optimizerSchema),
+        [optimizerIndex, optimizerSchema]
+    );
 
     useEffect(() => {
         if (!searchQuery.trim()) {
@@ -96,7 +102,7 @@ export const CanvasControls: React.FC<CanvasControlsProps> = ({ onReset }) => {
         }
         const lowerQuery = searchQuery.toLowerCase();
 
-        const results = SEARCH_INDEX.filter(item => {
+        const results = searchIndex.filter(item => {
             // [Shiro] Context Check: If item relies on specific optimizers, check if current one is valid
             if (item.validOptimizers) {
                 if (!item.validOptimizers.includes(config.optimizerType)) {
@@ -111,7 +117,7 @@ export const CanvasControls: React.FC<CanvasControlsProps> = ({ onReset }) => {
             );
         });
         setSearchResults(results);
-    }, [searchQuery, config.optimizerType]); // Re-run when query OR optimizer changes
+    }, [searchQuery, config.optimizerType, searchIndex]); // Re-run when query OR optimizer changes
 
     const handleSearchResultClick = (item: SearchItem) => {
         const node = nodes[item.nodeId];
@@ -46,7 +46,3 @@ export const GRAPH_EDGES: GraphEdge[] = [
     { source: NodeId.DATA, target: NodeId.NETWORK },
     { source: NodeId.NETWORK, target: NodeId.TRAINING },
 ];
-
-import { getSearchIndex, SearchItem } from '../lib/search-definitions';
-
-export const SEARCH_INDEX: SearchItem[] = getSearchIndex();
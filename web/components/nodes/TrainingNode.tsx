@@ -2,8 +2,10 @@ import React, { useEffect } from 'react';
 import { useStore } from '../../lib/store';
 import { Input, Select, Toggle, FieldWrapper, ToggleInput } from '../FormComponents';
 import { NodeSeparator, NodeHeader } from '../NodeStyles';
-import { OPTIMIZER_SCHEMAS, SCHEDULER_OPTIONS, OptimizerArgDef } from '../../lib/optimizer-schema';
+import { SCHEDULER_OPTIONS, OptimizerArgDef } from '../../lib/optimizer-schema';
+import { useOptimizerIndex, useOptimizerSchema } from '../../hooks/useOptimizerCatalog';
 import { TRAINING_ARGS_DEFS } from '../../lib/field-definitions';
+import { estimateStateBytes, formatBytes, REFERENCE_SHAPE } from '../../lib/optimizer-memory';
 import { HelpCircle } from 'lucide-react';
 
 export const TrainingNode: React.FC = () => {
@@ -13,7 +15,9 @@ export const TrainingNode: React.FC = () => {
     // This is a simple safety check, but for now we'll just let the user manually manage it
     // or we could clear them. For better UX, we'll keep them but they might not be used.
 
-    const currentOptimizerSchema = OPTIMIZER_SCHEMAS.find(opt => opt.id === config.optimizerType);
+    // Only the optimizer index is loaded up front, the selected optimizer's args are fetched when it is picked
+    const optimizerIndex = useOptimizerIndex();
+    const currentOptimizerSchema = useOptimizerSchema(config.optimizerType);
 
     const handleArgChange = (name: string, value: any) => {
         updateConfig({
@@ -64,6 +68,26 @@ export const TrainingNode: React.FC = () => {
                         options={arg.options?.map(opt => ({ value: opt, label: opt })) || []}
                     />
                 );
+            case 'dict':
+                // One select per key, an empty value leaves the key out so the optimizer's default applies
+                return (
+                    <React.Fragment key={arg.name}>
+                        {arg.keys?.map(key => (
+                            <Select
+                                key={`${arg.name}.${key}`}
+                                label={`${arg.label}: ${key}`}
+                                name={`${arg.name}.${key}`}
+                                value={value?.[key] ?? ''}
+                                onChange={(e) => {
+                                    const { [key]: _, ...rest } = value ?? {};
+                                    const next = e.target.value ? { ...rest, [key]: e.target.value } : rest;
+                                    handleArgChange(arg.name, Object.keys(next).length ? next : null);
+                                }}
+                                options={[{ value: '', label: 'default' }, ...(arg.options?.map(opt => ({ value: opt, label: opt })) || [])]}
+                            />
+                        ))}
+                    </React.Fragment>
+                );
             default:
                 return null;
         }
@@ -81,6 +105,18 @@ export const TrainingNode: React.FC = () => {
         });
     }, [currentOptimizerSchema]);
 
+    // Optimizer state cost, normalized to 1B params of the reference shape
+    const stateBytesPerBillion = React.useMemo(() => {
+        if (!currentOptimizerSchema) return null;
+        const args = Object.fromEntries(
+            currentOptimizerSchema.args.map(arg => [arg.name, config.optimizerArgs?.[arg.name] ?? arg.default])
+        );
+        const dtype = config.fullBf16 ? 'bfloat16' : config.fullFp16 ? 'float16' : 'float32';
+        const bytes = estimateStateBytes(currentOptimizerSchema, args, [REFERENCE_SHAPE], dtype);
+        if (bytes === null) return null;
+        return bytes / (REFERENCE_SHAPE[0] * REFERENCE_SHAPE[1]) * 1e9;
+    }, [currentOptimizerSchema, config.optimizerArgs, config.fullBf16, config.fullFp16]);
+
     // Calculate if we need a spacer
     const needsSpacer = React.useMemo(() => {
         if (!currentOptimizerSchema) return false;
@@ -104,7 +140,8 @@ export const TrainingNode: React.FC = () => {
                         // For now, we keep them in the store but the UI will only show relevant ones.
                         updateConfig({ optimizerType: e.target.value });
                     }}
-                    options={OPTIMIZER_SCHEMAS.map(opt => ({ value: opt.id, label: opt.name }))}
+                    options={optimizerIndex?.map(opt => ({ value: opt.id, label: opt.name }))
+                        ?? [{ value: config.optimizerType, label: config.optimizerType }]}
                 />
 
                 {/* Dynamic Optimizer Args */}
@@ -124,6 +161,12 @@ export const TrainingNode: React.FC = () => {
                         })}
                     </div>
                 )}
+
+                {stateBytesPerBillion !== null && (
+                    <div className="text-xs font-mono text-[#5B5680]">
+                        Optimizer state ≈ {formatBytes(stateBytesPerBillion)} per 1B params
+                    </div>
+                )}
             </div>
 
             <NodeSeparator />
@@ -0,0 +1,40 @@
+import { useEffect, useState } from 'react';
+import { OptimizerDef } from '../lib/optimizer-schema';
+import { loadOptimizerIndex, loadOptimizerSchema, OptimizerIndexEntry } from '../lib/optimizer-catalog';
+
+export const useOptimizerIndex = () => {
+    const [index, setIndex] = useState<OptimizerIndexEntry[] | null>(null);
+
+    useEffect(() => {
+        let cancelled = false;
+        loadOptimizerIndex()
+            .then(entries => { if (!cancelled) setIndex(entries); })
+            .catch(err => console.error(err));
+        return () => { cancelled = true; };
+    }, []);
+
+    return index;
+};
+
+// Loads a single optimizer's schema the first time it is selected
+export const useOptimizerSchema = (optimizerId: string | undefined) => {
+    const index = useOptimizerIndex();
+    const [schema, setSchema] = useState<OptimizerDef | null>(null);
+
+    useEffect(() => {
+        const entry = index?.find(e => e.id === optimizerId);
+        if (!entry) {
+            setSchema(null);
+            return;
+        }
+
+        let cancelled = false;
+        loadOptimizerSchema(entry)
+            .then(def => { if (!cancelled) setSchema(def); })
+            .catch(err => console.error(err));
+        return () => { cancelled = true; };
+    }, [index, optimizerId]);
+
+    // Until the newly selected optimizer's schema arrives, the previous one is stale
+    return schema?.id === optimizerId ? schema : null;
+};
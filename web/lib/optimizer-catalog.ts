@@ -0,0 +1,46 @@
+import { OptimizerDef } from './optimizer-schema';
+
+// On-demand optimizer schemas, written by `python generate_schema.py --format json`.
+// Only the small index is fetched up front; each optimizer's args are fetched when it is selected.
+const CATALOG_URL = '/optimizers';
+
+export interface OptimizerIndexEntry {
+    id: string;
+    name: string;
+    argCount: number;
+    hash: string; // Content hash of the optimizer's JSON file, used for cache busting
+}
+
+let indexPromise: Promise<OptimizerIndexEntry[]> | null = null;
+const schemaPromises = new Map<string, Promise<OptimizerDef>>();
+
+const fetchJson = async <T>(url: string): Promise<T> => {
+    const response = await fetch(url);
+    if (!response.ok) {
+        throw new Error(`Failed to load ${url}: ${response.status}`);
+    }
+    return response.json() as Promise<T>;
+};
+
+export const loadOptimizerIndex = (): Promise<OptimizerIndexEntry[]> => {
+    if (!indexPromise) {
+        indexPromise = fetchJson<OptimizerIndexEntry[]>(`${CATALOG_URL}/index.json`).catch(err => {
+            indexPromise = null; // Allow a retry
+            throw err;
+        });
+    }
+    return indexPromise;
+};
+
+export const loadOptimizerSchema = (entry: OptimizerIndexEntry): Promise<OptimizerDef> => {
+    const key = `${entry.id}@${entry.hash}`;
+    let promise = schemaPromises.get(key);
+    if (!promise) {
+        promise = fetchJson<OptimizerDef>(`${CATALOG_URL}/${entry.id}.json?v=${entry.hash}`).catch(err => {
+            schemaPromises.delete(key);
+            throw err;
+        });
+        schemaPromises.set(key, promise);
+    }
+    return promise;
+};
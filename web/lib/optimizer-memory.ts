@@ -0,0 +1,113 @@
+import { OptimizerDef, OptimizerStateTerm } from './optimizer-schema';
+
+// Mirrors optimizer_memory.py so the UI and the backend agree on state sizes.
+const DTYPE_BYTES: Record<string, number> = {
+    float64: 8,
+    float32: 4,
+    float16: 2,
+    bfloat16: 2,
+    int64: 8,
+    int32: 4,
+    uint8: 1,
+    int8: 1,
+};
+
+// Reference shape used when no model shapes are known: a large square weight,
+// where factored state is negligible next to full-size state.
+export const REFERENCE_SHAPE = [4096, 4096];
+
+const prod = (dims: number[]) => dims.reduce((acc, d) => acc * d, 1);
+
+// Shape of the low-rank state of a param with projected state (projection_rank), or null if it has none
+const projectedShape = (shape: number[], args: Record<string, any>): number[] | null => {
+    const rank = args.projection_rank ?? 0;
+    if (rank <= 0 || shape.length !== 2 || Math.min(...shape) <= rank) return null;
+    if (prod(shape) < (args.projection_min_numel ?? 0)) return null;
+    return shape[0] <= shape[1] ? [rank, shape[1]] : [shape[0], rank];
+};
+
+const termNumel = (term: OptimizerStateTerm, shape: number[], args: Record<string, any>): number => {
+    switch (term.size) {
+        case 'numel':
+            return prod(shape);
+        case 'rows':
+            return prod(shape.slice(0, -1));
+        case 'cols':
+            return prod(shape.slice(0, -2)) * shape[shape.length - 1];
+        case 'gram':
+            return shape.length > 1 && shape[0] ? Math.min(shape[0], prod(shape) / shape[0]) ** 2 : 1;
+        case 'one':
+            return 1;
+        case 'projector':
+            return Math.min(...shape) * args.projection_rank;
+    }
+};
+
+// Short aliases accepted in state dtype policies
+const DTYPE_ALIASES: Record<string, string> = { fp32: 'float32', bf16: 'bfloat16', fp16: 'float16' };
+
+const termBytes = (term: OptimizerStateTerm, paramDtype: string, args: Record<string, any>): number => {
+    // An entry in the state dtype policy wins over the formula's dtype
+    const override = args.state_dtypes?.[term.key];
+    if (override) {
+        const name = String(override).split('.').pop()!;
+        return DTYPE_BYTES[DTYPE_ALIASES[name] ?? name];
+    }
+    if (term.dtype === 'param') return DTYPE_BYTES[paramDtype];
+    if (term.dtype === 'grad') return Math.max(DTYPE_BYTES[paramDtype], 4);
+    let dtype = term.dtype;
+    const arg = term.dtypeArg ? args[term.dtypeArg] : null;
+    if (arg) {
+        const name = String(arg).split('.').pop()!;
+        dtype = DTYPE_ALIASES[name] ?? name;
+    }
+    // e.g. a cached factor computed with fp32 refinement steps is kept in fp32
+    if (term.upcastAtLeast && (args[term.upcastAtLeast[0]] ?? 0) >= term.upcastAtLeast[1]) {
+        return Math.max(DTYPE_BYTES[dtype], 4);
+    }
+    return DTYPE_BYTES[dtype];
+};
+
+/**
+ * Exact optimizer state size for a set of parameter shapes.
+ * Returns null when the optimizer has no state cost formula.
+ */
+export const estimateStateBytes = (
+    schema: OptimizerDef,
+    args: Record<string, any>,
+    paramShapes: number[][],
+    dtype: string = 'float32'
+): number | null => {
+    if (!schema.stateCost) return null;
+
+    let total = 0;
+    for (const shape of paramShapes) {
+        const projected = projectedShape(shape, args);
+        for (const term of schema.stateCost) {
+            const when = typeof term.when === 'string' ? [term.when] : term.when ?? [];
+            if (when.some(arg => !args[arg])) continue;
+            if (term.unless && args[term.unless]) continue;
+            if (term.minNdim !== undefined && shape.length < term.minNdim) continue;
+            if (term.maxNdim !== undefined && shape.length > term.maxNdim) continue;
+            if (term.atLeast && (args[term.atLeast[0]] ?? 0) < term.atLeast[1]) continue;
+            if (term.numelAtLeast && prod(shape) < (args[term.numelAtLeast] ?? 0)) continue;
+            if (term.equals && args[term.equals[0]] !== term.equals[1]) continue;
+            if (term.paramDtypes && !term.paramDtypes.includes(dtype)) continue;
+            if (term.projected && !projected) continue;
+            const termShape = projected && term.projectable ? projected : shape;
+            total += termNumel(term, termShape, args) * termBytes(term, dtype, args);
+        }
+    }
+    return total;
+};
+
+export const formatBytes = (bytes: number): string => {
+    const units = ['B', 'KiB', 'MiB', 'GiB', 'TiB'];
+    let value = bytes;
+    let unit = 0;
+    while (value >= 1024 && unit < units.length - 1) {
+        value /= 1024;
+        unit++;
+    }
+    return `${value.toFixed(unit === 0 ? 0 : 2)} ${units[unit]}`;
+};